@@ -3,13 +3,21 @@
 from .documentation_agent import (
     AgentOrchestrator,
     DocumentationType,
+    GraphRegistry,
     get_agent_orchestrator,
-    build_documentation_agent
+    build_documentation_agent,
+    build_hierarchy_agent
 )
+from .hierarchy import HierarchicalDocumenter, ModuleNode, build_module_tree
 
 __all__ = [
     "AgentOrchestrator",
     "DocumentationType",
+    "GraphRegistry",
     "get_agent_orchestrator",
-    "build_documentation_agent"
+    "build_documentation_agent",
+    "build_hierarchy_agent",
+    "HierarchicalDocumenter",
+    "ModuleNode",
+    "build_module_tree"
 ]
@@ -0,0 +1,361 @@
+"""
+Durable Agent Checkpoints
+LangGraph checkpoint saver on SQLAlchemy (Postgres, or SQLite locally) with one thread
+per DocumentationJob, zlib-compressed snapshots and retention-based pruning
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+import os
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Separate checkpoint store (e.g. sqlite+aiosqlite:///./checkpoints.db); empty uses DATABASE_URL
+CHECKPOINT_URL = os.getenv("AGENT_CHECKPOINT_URL", "")
+CHECKPOINT_RETENTION_HOURS = float(os.getenv("AGENT_CHECKPOINT_RETENTION_HOURS", "72"))
+CHECKPOINT_PRUNE_INTERVAL = float(os.getenv("AGENT_CHECKPOINT_PRUNE_INTERVAL", "3600"))
+CHECKPOINT_COMPRESSION_LEVEL = int(os.getenv("AGENT_CHECKPOINT_COMPRESSION", "6"))
+
+def _thread_config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+class SQLCheckpointSaver(BaseCheckpointSaver):
+    """
+    Async LangGraph checkpointer backed by the agent_checkpoints tables.
+
+    Each checkpoint is stored as one compressed snapshot including its channel
+    values, so resuming a thread needs a single row plus its pending writes.
+    Superseded snapshots are dropped when a run finishes (finish) and whole
+    threads expire after CHECKPOINT_RETENTION_HOURS (prune_expired).
+
+    Without a reachable database (No-DB mode) it degrades to an in-memory
+    saver: runs still work, they just cannot resume after a restart.
+    """
+
+    def __init__(self, session_factory: Any = None, engine: Any = None,
+                 compression_level: int = CHECKPOINT_COMPRESSION_LEVEL):
+        super().__init__()
+        self._sessions = session_factory
+        self._engine = engine
+        self.compression_level = compression_level
+        self.fallback = MemorySaver(serde=self.serde)
+        self._available: Optional[bool] = None if session_factory is not None else False
+        self._last_prune = 0.0
+
+    # ------------------------------------------------------------------------
+    # Setup / serialization
+    # ------------------------------------------------------------------------
+
+    async def setup(self) -> bool:
+        """Create the checkpoint tables if needed; False when the database is unreachable"""
+        if self._sessions is None:
+            self._available = False
+            return False
+        try:
+            from db.models import Base, AgentCheckpoint, AgentCheckpointWrite
+
+            async with self._engine.begin() as conn:
+                await conn.run_sync(
+                    Base.metadata.create_all,
+                    tables=[AgentCheckpoint.__table__, AgentCheckpointWrite.__table__]
+                )
+            self._available = True
+        except Exception as e:
+            logger.warning(f"Checkpoint store unavailable, agent runs will not survive a restart: {e}")
+            self._available = False
+        return self._available
+
+    @property
+    def durable(self) -> bool:
+        return bool(self._available)
+
+    async def _durable(self) -> bool:
+        if self._available is None:
+            await self.setup()
+        return self._available
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        return type_, zlib.compress(data, self.compression_level)
+
+    def _load(self, type_: str, blob: bytes) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(blob)))
+
+    async def _to_tuple(self, session: Any, row: Any) -> CheckpointTuple:
+        from sqlalchemy import select
+        from db.models import AgentCheckpointWrite
+
+        writes = (await session.execute(
+            select(AgentCheckpointWrite).where(
+                AgentCheckpointWrite.thread_id == row.thread_id,
+                AgentCheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                AgentCheckpointWrite.checkpoint_id == row.checkpoint_id
+            )
+        )).scalars().all()
+        # Replay order of one super-step: task path, task id, write index
+        writes = sorted(writes, key=lambda w: (w.task_path, w.task_id, w.idx))
+        return CheckpointTuple(
+            config=_thread_config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self._load(row.type, row.checkpoint),
+            metadata=self._load(row.metadata_type, row.checkpoint_metadata),
+            parent_config=(
+                _thread_config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id)
+                if row.parent_checkpoint_id else None
+            ),
+            pending_writes=[(w.task_id, w.channel, self._load(w.type, w.value)) for w in writes]
+        )
+
+    # ------------------------------------------------------------------------
+    # BaseCheckpointSaver (async API; the graphs are only run with ainvoke/astream)
+    # ------------------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if not await self._durable():
+            return await self.fallback.aget_tuple(config)
+
+        from sqlalchemy import select
+        from db.models import AgentCheckpoint
+
+        configurable = config["configurable"]
+        query = select(AgentCheckpoint).where(
+            AgentCheckpoint.thread_id == configurable["thread_id"],
+            AgentCheckpoint.checkpoint_ns == configurable.get("checkpoint_ns", "")
+        )
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query = query.where(AgentCheckpoint.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(AgentCheckpoint.checkpoint_id.desc()).limit(1)
+
+        async with self._sessions() as session:
+            row = (await session.execute(query)).scalars().first()
+            if row is None:
+                return None
+            return await self._to_tuple(session, row)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        if not await self._durable():
+            async for item in self.fallback.alist(config, filter=filter, before=before, limit=limit):
+                yield item
+            return
+
+        from sqlalchemy import select
+        from db.models import AgentCheckpoint
+
+        query = select(AgentCheckpoint).order_by(AgentCheckpoint.checkpoint_id.desc())
+        if config:
+            configurable = config["configurable"]
+            query = query.where(AgentCheckpoint.thread_id == configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                query = query.where(AgentCheckpoint.checkpoint_ns == configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query = query.where(AgentCheckpoint.checkpoint_id == get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query = query.where(AgentCheckpoint.checkpoint_id < get_checkpoint_id(before))
+
+        async with self._sessions() as session:
+            rows = (await session.execute(query)).scalars().all()
+            for row in rows:
+                if limit is not None and limit <= 0:
+                    break
+                if filter:
+                    metadata = self._load(row.metadata_type, row.checkpoint_metadata)
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                if limit is not None:
+                    limit -= 1
+                yield await self._to_tuple(session, row)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        if not await self._durable():
+            return await self.fallback.aput(config, checkpoint, metadata, new_versions)
+
+        from db.models import AgentCheckpoint
+
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        type_, blob = self._dump(checkpoint)
+        metadata_type, metadata_blob = self._dump(get_checkpoint_metadata(config, metadata))
+
+        async with self._sessions() as session:
+            await session.merge(AgentCheckpoint(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=configurable.get("checkpoint_id"),
+                type=type_,
+                checkpoint=blob,
+                metadata_type=metadata_type,
+                checkpoint_metadata=metadata_blob,
+                created_at=datetime.utcnow()
+            ))
+            await session.commit()
+        return _thread_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        if not await self._durable():
+            return await self.fallback.aput_writes(config, writes, task_id, task_path)
+
+        from sqlalchemy import select
+        from db.models import AgentCheckpointWrite
+
+        configurable = config["configurable"]
+        key = dict(
+            thread_id=configurable["thread_id"],
+            checkpoint_ns=configurable.get("checkpoint_ns", ""),
+            checkpoint_id=configurable["checkpoint_id"]
+        )
+        async with self._sessions() as session:
+            existing = set((await session.execute(
+                select(AgentCheckpointWrite.idx).where(
+                    *(getattr(AgentCheckpointWrite, column) == value for column, value in key.items()),
+                    AgentCheckpointWrite.task_id == task_id
+                )
+            )).scalars().all())
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                # Regular writes are immutable once saved; special ones (errors, interrupts) are replaced
+                if write_idx >= 0 and write_idx in existing:
+                    continue
+                type_, blob = self._dump(value)
+                await session.merge(AgentCheckpointWrite(
+                    **key, task_id=task_id, idx=write_idx, channel=channel,
+                    type=type_, value=blob, task_path=task_path
+                ))
+            await session.commit()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        if not await self._durable():
+            return await self.fallback.adelete_thread(thread_id)
+        await self._delete_threads([thread_id])
+
+    # ------------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------------
+
+    async def _delete_threads(self, thread_ids: List[str]) -> None:
+        from sqlalchemy import delete
+        from db.models import AgentCheckpoint, AgentCheckpointWrite
+
+        async with self._sessions() as session:
+            await session.execute(delete(AgentCheckpointWrite).where(AgentCheckpointWrite.thread_id.in_(thread_ids)))
+            await session.execute(delete(AgentCheckpoint).where(AgentCheckpoint.thread_id.in_(thread_ids)))
+            await session.commit()
+
+    async def finish(self, thread_id: str) -> None:
+        """
+        A run completed: keep only its final snapshot (for inspection until it
+        expires). In-memory threads are dropped outright.
+        """
+        if not await self._durable():
+            await self.fallback.adelete_thread(thread_id)
+            return
+
+        from sqlalchemy import select, delete, func
+        from db.models import AgentCheckpoint, AgentCheckpointWrite
+
+        try:
+            async with self._sessions() as session:
+                latest = (await session.execute(
+                    select(AgentCheckpoint.checkpoint_ns, func.max(AgentCheckpoint.checkpoint_id))
+                    .where(AgentCheckpoint.thread_id == thread_id)
+                    .group_by(AgentCheckpoint.checkpoint_ns)
+                )).all()
+                for checkpoint_ns, checkpoint_id in latest:
+                    for table in (AgentCheckpointWrite, AgentCheckpoint):
+                        await session.execute(delete(table).where(
+                            table.thread_id == thread_id,
+                            table.checkpoint_ns == checkpoint_ns,
+                            table.checkpoint_id < checkpoint_id
+                        ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Failed to trim checkpoints of {thread_id}: {e}")
+
+    async def prune_expired(self, max_age_hours: float = CHECKPOINT_RETENTION_HOURS) -> int:
+        """Delete threads whose newest checkpoint is older than max_age_hours; returns the count"""
+        if not await self._durable():
+            return 0
+
+        from sqlalchemy import select, func
+        from db.models import AgentCheckpoint
+
+        cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+        async with self._sessions() as session:
+            expired = (await session.execute(
+                select(AgentCheckpoint.thread_id)
+                .group_by(AgentCheckpoint.thread_id)
+                .having(func.max(AgentCheckpoint.created_at) < cutoff)
+            )).scalars().all()
+        if expired:
+            await self._delete_threads(list(expired))
+            logger.info(f"Pruned checkpoints of {len(expired)} expired agent runs")
+        return len(expired)
+
+    async def maybe_prune(self) -> None:
+        """prune_expired at most once per CHECKPOINT_PRUNE_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self._last_prune < CHECKPOINT_PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        try:
+            await self.prune_expired()
+        except Exception as e:
+            logger.warning(f"Checkpoint pruning failed: {e}")
+
+def build_checkpointer() -> SQLCheckpointSaver:
+    """Checkpointer on AGENT_CHECKPOINT_URL, else the application database"""
+    try:
+        if CHECKPOINT_URL:
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+            engine = create_async_engine(CHECKPOINT_URL, pool_pre_ping=True)
+            return SQLCheckpointSaver(async_sessionmaker(engine, expire_on_commit=False), engine)
+
+        from db.connection import engine, AsyncSessionLocal
+        if engine is not None:
+            return SQLCheckpointSaver(AsyncSessionLocal, engine)
+    except Exception as e:
+        logger.warning(f"Checkpoint database not configured: {e}")
+    return SQLCheckpointSaver()
@@ -0,0 +1,185 @@
+"""
+Agent Context Management
+Bounded message history and per-node context built from a compact structured summary
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from langchain_core.messages import BaseMessage, HumanMessage
+import json
+import os
+import logging
+
+from llm.planner import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+MAX_HISTORY_MESSAGES = int(os.getenv("AGENT_MAX_HISTORY_MESSAGES", "8"))
+# Per-section caps for the summary sent to the writer/reviewer
+PLAN_TOKEN_BUDGET = int(os.getenv("AGENT_PLAN_TOKENS", "1500"))
+ANALYSIS_TOKEN_BUDGET = int(os.getenv("AGENT_ANALYSIS_TOKENS", "3000"))
+STRUCTURE_TOKEN_BUDGET = int(os.getenv("AGENT_STRUCTURE_TOKENS", "3000"))
+# Retrieved code excerpts: fixed-size whatever the repository size
+ANALYZER_CODE_TOKEN_BUDGET = int(os.getenv("AGENT_ANALYZER_CODE_TOKENS", "6000"))
+WRITER_CODE_TOKEN_BUDGET = int(os.getenv("AGENT_WRITER_CODE_TOKENS", "4000"))
+# Files (in import-graph rank order) whose full content retrieval may draw from;
+# the next ones appear as signatures in the structure digest, the rest not at all
+FULL_CONTENT_TOKEN_BUDGET = int(os.getenv("AGENT_FULL_CONTENT_TOKENS", "24000"))
+# File listing shown to the planner
+FILE_LIST_TOKEN_BUDGET = int(os.getenv("AGENT_FILE_LIST_TOKENS", "1500"))
+
+# ============================================================================
+# Reducers
+# ============================================================================
+
+def _message_key(message: BaseMessage):
+    return getattr(message, "id", None) or (message.type, str(message.content))
+
+def bounded_messages(current: Optional[Sequence[BaseMessage]],
+                     update: Optional[Sequence[BaseMessage]]) -> List[BaseMessage]:
+    """
+    Reducer: append new messages, drop duplicates and keep the history bounded.
+
+    The first message (the task) is pinned; after it only the most recent
+    MAX_HISTORY_MESSAGES - 1 messages are kept. Nodes do not replay this
+    history to the model, it is an audit trail of the run.
+    """
+    merged: List[BaseMessage] = []
+    seen = set()
+    for message in list(current or []) + list(update or []):
+        key = _message_key(message)
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(message)
+    if len(merged) > MAX_HISTORY_MESSAGES:
+        merged = merged[:1] + merged[-(MAX_HISTORY_MESSAGES - 1):]
+    return merged
+
+def accumulate_metrics(current: Optional[Dict[str, Dict[str, int]]],
+                       update: Optional[Dict[str, Dict[str, int]]]) -> Dict[str, Dict[str, int]]:
+    """Reducer: sum per-node call counts and input tokens across iterations"""
+    merged = {node: dict(values) for node, values in (current or {}).items()}
+    for node, values in (update or {}).items():
+        entry = merged.setdefault(node, {"calls": 0, "input_tokens": 0, "last_input_tokens": 0})
+        entry["calls"] += values.get("calls", 0)
+        entry["input_tokens"] += values.get("input_tokens", 0)
+        entry["last_input_tokens"] = values.get("input_tokens", entry["last_input_tokens"])
+    return merged
+
+# ============================================================================
+# Context Building
+# ============================================================================
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, marking the cut"""
+    counter = get_token_counter()
+    tokens = counter.count(text)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max_tokens / tokens)
+    return text[:keep].rstrip() + "\n[... truncated]"
+
+def structural_digest(analysis_results: Dict[str, Any], max_tokens: int = STRUCTURE_TOKEN_BUDGET,
+                      file_ranks: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    One line per file: language, size, complexity and its top-level symbols.
+
+    With file_ranks the files come in import-graph rank order with their role;
+    signature-tier files list their full signatures and omitted files are
+    only counted.
+    """
+    filenames = list(analysis_results)
+    if file_ranks:
+        filenames.sort(key=lambda name: file_ranks.get(name, {}).get("rank", len(file_ranks) + 1))
+    lines = []
+    omitted = 0
+    for filename in filenames:
+        result = analysis_results[filename]
+        ranked = (file_ranks or {}).get(filename)
+        if ranked and ranked.get("tier") == "omit":
+            omitted += 1
+            continue
+        functions = ", ".join(f["name"] for f in result.get("functions", [])[:10])
+        classes = ", ".join(c["name"] for c in result.get("classes", [])[:10])
+        line = (
+            f"- {filename} ({result.get('language', '?')}, {result.get('lines_of_code', 0)} loc, "
+            f"complexity {result.get('complexity_score', 0)}"
+        )
+        if ranked:
+            line += f", {ranked['role']}, imported by {ranked['fan_in']}"
+        line += ")"
+        if classes:
+            line += f"; classes: {classes}"
+        if ranked and ranked.get("tier") == "signatures":
+            signatures = [f.get("signature") or f["name"] for f in result.get("functions", [])]
+            line += "".join(f"\n    {signature}" for signature in signatures)
+        elif functions:
+            line += f"; functions: {functions}"
+        lines.append(line)
+    if omitted:
+        lines.append(f"- ({omitted} less central files omitted)")
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+def file_listing(files: Dict[str, str], max_tokens: int = FILE_LIST_TOKEN_BUDGET) -> str:
+    """Every file with its size, in path order, cut to the token budget"""
+    lines = [
+        f"- {name} ({content.count(chr(10)) + 1} lines)"
+        for name, content in sorted(files.items())
+    ]
+    return truncate_to_tokens(f"{len(files)} files:\n" + "\n".join(lines), max_tokens)
+
+def _review_feedback(review: Dict[str, Any]) -> str:
+    parts = []
+    if review.get("score") is not None:
+        parts.append(f"Score: {review['score']}")
+    for label in ("issues", "suggestions"):
+        items = review.get(label) or []
+        if items:
+            parts.append(f"{label.capitalize()}:\n" + "\n".join(f"- {item}" for item in items))
+    return "\n".join(parts)
+
+def task_message(state: Dict[str, Any]) -> HumanMessage:
+    """The original request (first message of the run)"""
+    messages = state.get("messages") or []
+    if messages:
+        return HumanMessage(content=str(messages[0].content))
+    return HumanMessage(content="Generate documentation")
+
+def build_context(state: Dict[str, Any], sections: Iterable[str]) -> List[BaseMessage]:
+    """
+    Build a node's input from a structured summary of the run so far.
+
+    sections selects what the node needs: "plan", "analysis", "structure",
+    "code" (retrieved excerpts), "draft" (latest documentation) and "review"
+    (latest review feedback).
+    """
+    blocks = []
+    for section in sections:
+        if section == "plan" and state.get("plan"):
+            blocks.append("## Documentation plan\n" + truncate_to_tokens(state["plan"], PLAN_TOKEN_BUDGET))
+        elif section == "analysis" and state.get("analysis_summary"):
+            blocks.append("## Code analysis\n" + truncate_to_tokens(state["analysis_summary"], ANALYSIS_TOKEN_BUDGET))
+        elif section == "structure" and state.get("analysis_results"):
+            blocks.append("## File structure\n" + structural_digest(state["analysis_results"], file_ranks=state.get("file_ranks")))
+        elif section == "code" and state.get("code_context"):
+            blocks.append("## Relevant code\n" + state["code_context"])
+        elif section == "draft" and state.get("documentation"):
+            blocks.append("## Current draft\n" + state["documentation"])
+        elif section == "review" and state.get("review"):
+            feedback = _review_feedback(state["review"])
+            if feedback:
+                blocks.append("## Review feedback to address\n" + feedback)
+    messages: List[BaseMessage] = [task_message(state)]
+    if blocks:
+        messages.append(HumanMessage(content="\n\n".join(blocks)))
+    return messages
+
+def input_metrics(node: str, messages: Sequence[BaseMessage]) -> Dict[str, Dict[str, int]]:
+    """node_metrics update for one model call"""
+    counter = get_token_counter()
+    tokens = sum(
+        counter.count(m.content if isinstance(m.content, str) else json.dumps(m.content))
+        for m in messages
+    )
+    logger.debug(f"{node} input: {tokens} tokens")
+    return {node: {"calls": 1, "input_tokens": tokens}}
@@ -3,40 +3,83 @@ Tekshila Agent Architecture - 2026 Ready
 State-driven multi-agent system for code documentation
 """
 
-from typing import TypedDict, Annotated, Sequence, List, Dict, Any, Optional
+from typing import TypedDict, Annotated, Sequence, List, Dict, Any, Optional, Tuple
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import ToolNode
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import JsonOutputParser
 import operator
 import os
+import time
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
 import logging
 
+from analysis import analyze_source, get_analysis_cache, get_import_graph_cache, inclusion_tiers
+from retrieval import get_code_index, assemble_code_context, prepare_retrieval, sync_code_index, SECTION_QUERIES
+from .context import (
+    bounded_messages, accumulate_metrics, build_context, task_message, input_metrics, file_listing,
+    ANALYZER_CODE_TOKEN_BUDGET, WRITER_CODE_TOKEN_BUDGET, FULL_CONTENT_TOKEN_BUDGET, STRUCTURE_TOKEN_BUDGET
+)
+from .prereview import check_draft, PREREVIEW_MODE
+from .checkpoint import build_checkpointer
+from .hierarchy import HierarchicalDocumenter, HIERARCHICAL_MIN_FILES
+from .routing import (
+    ModelRouter, parse_json_response, valid_plan, valid_text, review_validator, review_borderline
+)
+from llm.coalesce import fingerprint, get_coalescing_group
+from llm.limiter import get_limiter
+
 logger = logging.getLogger(__name__)
 
 # ============================================================================
 # Agent State Definition
 # ============================================================================
 
+def merge_dicts(current: Optional[Dict[str, Any]], update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reducer: merge dict updates from parallel branches key by key"""
+    return {**(current or {}), **(update or {})}
+
+def latest(current: Any, update: Any) -> Any:
+    """Reducer: keep the most recent write (parallel branches may all report progress)"""
+    return update
+
 class AgentState(TypedDict):
-    """State schema for the documentation agent workflow"""
-    messages: Annotated[Sequence[BaseMessage], operator.add]
+    """
+    State schema for the documentation agent workflow.
+
+    Nodes return only the keys they change; the reducers combine updates from
+    the planner, structure and analyzer branches that run in the same step.
+    Each node builds its own model input from plan / analysis_summary / review
+    rather than replaying the message history, which stays bounded.
+    """
+    messages: Annotated[Sequence[BaseMessage], bounded_messages]
     files: Dict[str, str]  # filename -> content
     file_metadata: Dict[str, Dict[str, Any]]  # filename -> metadata
     documentation: str
-    current_step: str
-    errors: List[str]
-    analysis_results: Dict[str, Any]
+    current_step: Annotated[str, latest]
+    errors: Annotated[List[str], operator.add]
+    analysis_results: Annotated[Dict[str, Any], merge_dicts]
     github_context: Optional[Dict[str, Any]]
     user_preferences: Dict[str, Any]
     iteration_count: int
     max_iterations: int
+    plan: str  # latest planner output
+    analysis_summary: str  # latest analyzer output
+    review: Dict[str, Any]  # latest parsed review
+    project_id: Optional[str]  # selects the project's code index for retrieval
+    code_context: str  # code excerpts retrieved for the writer
+    file_ranks: Dict[str, Dict[str, Any]]  # filename -> import-graph rank, role and prompt tier
+    retrieval: Dict[str, Any]  # file-set key, vector availability and whether the index sync was awaited
+    node_metrics: Annotated[Dict[str, Dict[str, int]], accumulate_metrics]  # node -> calls / input tokens
 
 class DocumentationType(Enum):
     README = "readme"
@@ -65,62 +108,10 @@ class FileAnalysis:
 def analyze_code_structure(file_content: str, filename: str) -> Dict[str, Any]:
     """
     Analyze code structure using tree-sitter for AST parsing.
-    Returns structured metadata about the code.
+    Returns structured metadata about the code, including per-function
+    cyclomatic complexity. Languages without a grammar use the regex scanner.
     """
-    try:
-        # Language detection
-        ext = filename.split('.')[-1].lower()
-        
-        # Basic analysis without tree-sitter (fallback)
-        lines = file_content.split('\n')
-        loc = len([l for l in lines if l.strip()])
-        
-        functions = []
-        classes = []
-        imports = []
-        
-        # Simple regex-based parsing (production uses tree-sitter)
-        import re
-        
-        # Python detection
-        if ext == 'py':
-            func_pattern = r'def\s+(\w+)\s*\('
-            class_pattern = r'class\s+(\w+)\s*[\(:]'
-            import_pattern = r'^(?:from|import)\s+(.+)'
-            
-            functions = [{'name': m, 'line': i} for i, line in enumerate(lines) 
-                        for m in re.findall(func_pattern, line)]
-            classes = [{'name': m, 'line': i} for i, line in enumerate(lines) 
-                      for m in re.findall(class_pattern, line)]
-            imports = [m.strip() for line in lines for m in re.findall(import_pattern, line)]
-        
-        # JavaScript/TypeScript detection
-        elif ext in ['js', 'ts', 'jsx', 'tsx']:
-            func_pattern = r'(?:function|const|let|var)\s+(\w+)\s*[=:]*\s*(?:async\s+)?(?:function)?\s*\('
-            class_pattern = r'class\s+(\w+)'
-            
-            functions = [{'name': m, 'line': i} for i, line in enumerate(lines) 
-                        for m in re.findall(func_pattern, line)]
-            classes = [{'name': m, 'line': i} for i, line in enumerate(lines) 
-                      for m in re.findall(class_pattern, line)]
-        
-        # Calculate complexity (simplified cyclomatic complexity)
-        complexity_keywords = ['if', 'for', 'while', 'except', 'try', 'and', 'or', '?']
-        complexity_score = sum(file_content.count(kw) for kw in complexity_keywords) / max(loc, 1) * 10
-        
-        return {
-            "filename": filename,
-            "language": ext,
-            "lines_of_code": loc,
-            "functions": functions[:20],  # Limit to 20
-            "classes": classes[:20],
-            "imports": imports[:30],  # Limit to 30
-            "complexity_score": round(min(complexity_score, 10), 2),
-            "success": True
-        }
-    except Exception as e:
-        logger.error(f"Error analyzing {filename}: {e}")
-        return {"error": str(e), "success": False}
+    return analyze_source(file_content, filename)
 
 @tool
 def fetch_github_context(repo_url: str, token: str) -> Dict[str, Any]:
@@ -152,39 +143,17 @@ def fetch_github_context(repo_url: str, token: str) -> Dict[str, Any]:
         return {"error": str(e), "success": False}
 
 @tool
-def vectorize_code(files: Dict[str, str]) -> Dict[str, Any]:
+def vectorize_code(files: Dict[str, str], project_id: str = "default") -> Dict[str, Any]:
     """
-    Create embeddings for code files to enable semantic search.
-    Uses ChromaDB for vector storage.
+    Index code files for semantic search.
+    Chunks along function/class boundaries into the project's persistent ChromaDB
+    collection; only chunks whose content changed are re-embedded.
     """
     try:
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-        import chromadb
-        
-        # Initialize embeddings
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        
-        # Create vector store
-        client = chromadb.Client()
-        collection = client.get_or_create_collection("code_embeddings")
-        
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for filename, content in files.items():
-            # Split into chunks
-            chunks = [content[i:i:1000] for i in range(0, len(content), 1000)]
-            for i, chunk in enumerate(chunks):
-                documents.append(chunk)
-                metadatas.append({"filename": filename, "chunk": i})
-                ids.append(f"{filename}_{i}")
-        
-        # Add to collection
-        collection.add(documents=documents, metadatas=metadatas, ids=ids)
-        
+        result = get_code_index().index(project_id, files)
         return {
-            "total_chunks": len(documents),
+            **result,
+            "total_chunks": result["chunks"],
             "files_indexed": len(files),
             "success": True
         }
@@ -192,11 +161,39 @@ def vectorize_code(files: Dict[str, str]) -> Dict[str, Any]:
         logger.error(f"Error vectorizing code: {e}")
         return {"error": str(e), "success": False}
 
+# ============================================================================
+# Background Index Sync
+# ============================================================================
+
+# Index syncs (embedding) by retrieval key: started by the structure node and
+# awaited only by the writer, so the analyzer never waits on embedding
+_index_syncs: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+# Finished syncs of jobs that failed before their writer ran are dropped past this
+MAX_INDEX_SYNCS = 64
+
+def start_index_sync(project_id: Optional[str], files: Dict[str, str], key: str):
+    if key in _index_syncs:
+        return
+    _index_syncs[key] = asyncio.create_task(asyncio.to_thread(sync_code_index, project_id, files))
+    excess = len(_index_syncs) - MAX_INDEX_SYNCS
+    if excess > 0:
+        for stale in [k for k, task in _index_syncs.items() if task.done()][:excess]:
+            del _index_syncs[stale]
+
+async def await_index_sync(project_id: Optional[str], files: Dict[str, str], key: str) -> bool:
+    """Whether vectors are usable once the job's index sync is done"""
+    task = _index_syncs.pop(key, None)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        # Resumed elsewhere, or the sync was already consumed: sync again
+        # (unchanged chunks are not re-embedded)
+        return await asyncio.to_thread(sync_code_index, project_id, files)
+    return await task
+
 # ============================================================================
 # Agent Nodes
 # ============================================================================
 
-def create_planner_node(llm: ChatGoogleGenerativeAI):
+def create_planner_node(router: ModelRouter):
     """Create the planning agent node"""
     
     planner_prompt = ChatPromptTemplate.from_messages([
@@ -222,26 +219,63 @@ Respond in JSON format with:
         MessagesPlaceholder(variable_name="messages"),
     ])
     
-    def planner(state: AgentState) -> AgentState:
-        # Format file summary for context
-        file_summary = "\n".join([
-            f"File: {name} ({len(content)} chars, {content.count(chr(10))} lines)"
-            for name, content in list(state["files"].items())[:5]  # First 5 files
-        ])
+    async def planner(state: AgentState) -> AgentState:
+        messages = [task_message(state), HumanMessage(content=f"Files to document:\n{file_listing(state['files'])}")]
+        prompt_messages = planner_prompt.format_messages(messages=messages)
         
-        messages = state["messages"] + [HumanMessage(content=f"Files to document:\n{file_summary}")]
-        
-        response = llm.invoke(planner_prompt.format_messages(messages=messages))
+        # Fast model first; a plan that is not valid JSON is redone by the strong model
+        response, _ = await router.ainvoke("planner", prompt_messages, validate=valid_plan)
         
         return {
-            **state,
-            "messages": state["messages"] + [response],
+            "messages": [response],
+            "plan": response.content,
+            "node_metrics": input_metrics("planner", prompt_messages),
             "current_step": "planning_complete"
         }
     
     return planner
 
-def create_analyzer_node(llm: ChatGoogleGenerativeAI):
+def create_structure_node():
+    """Create the local structural analysis node (no LLM call)"""
+    
+    async def structure(state: AgentState) -> AgentState:
+        # Cached by content hash; only misses are parsed (process pool for large
+        # batches, in-process for small ones). Runs on a worker thread so parsing
+        # never blocks the event loop.
+        structures, analyzed = await asyncio.to_thread(get_analysis_cache().analyze, state["files"])
+        logger.info(f"Structural analysis: {analyzed}/{len(structures)} files parsed, rest cached")
+        analysis_results = {
+            filename: result
+            for filename, result in structures.items()
+            if result["success"]
+        }
+        
+        # Import-graph ranking decides which files prompts see in full, as
+        # signatures or not at all (incremental per project)
+        ranking = await asyncio.to_thread(
+            get_import_graph_cache().rank, state.get("project_id"), state["files"], analysis_results
+        )
+        tiers = inclusion_tiers(
+            ranking, state["files"], analysis_results, FULL_CONTENT_TOKEN_BUDGET, STRUCTURE_TOKEN_BUDGET
+        )
+        # The project's code index is synced once per job in the background;
+        # the analyzer ranks without vectors and only the writer waits for it
+        retrieval = await asyncio.to_thread(prepare_retrieval, state.get("project_id"), state["files"], False)
+        start_index_sync(state.get("project_id"), state["files"], retrieval["key"])
+        
+        return {
+            "analysis_results": analysis_results,
+            "file_ranks": {
+                filename: {**{k: v for k, v in values.items() if k != "imports"}, "tier": tiers[filename]}
+                for filename, values in ranking.items()
+            },
+            "retrieval": retrieval,
+            "current_step": "structure_complete"
+        }
+    
+    return structure
+
+def create_analyzer_node(router: ModelRouter, doc_type: DocumentationType):
     """Create the code analyzer agent node"""
     
     analyzer_prompt = ChatPromptTemplate.from_messages([
@@ -259,42 +293,44 @@ Be thorough and technical."""),
         MessagesPlaceholder(variable_name="messages"),
     ])
     
-    def analyzer(state: AgentState) -> AgentState:
-        analysis_results = {}
-        
-        for filename, content in state["files"].items():
-            # Use the tool for structure analysis
-            structure = analyze_code_structure.invoke({
-                "file_content": content,
-                "filename": filename
-            })
-            
-            if structure["success"]:
-                analysis_results[filename] = structure
-        
-        # Get AI analysis
-        file_context = "\n\n".join([
-            f"=== {name} ===\n{content[:2000]}..."  # First 2000 chars
-            for name, content in list(state["files"].items())[:3]
-        ])
-        
-        messages = state["messages"] + [HumanMessage(content=f"Analyze this code:\n{file_context}")]
-        response = llm.invoke(analyzer_prompt.format_messages(messages=messages))
+    async def analyzer(state: AgentState) -> AgentState:
+        # The code most relevant to this documentation type, in a fixed budget
+        file_context = await asyncio.to_thread(
+            assemble_code_context, state["files"], state.get("analysis_results", {}),
+            SECTION_QUERIES[doc_type.value], ANALYZER_CODE_TOKEN_BUDGET, state.get("project_id"),
+            state.get("file_ranks"), state.get("retrieval")
+        )
+        
+        messages = [task_message(state), HumanMessage(content=f"Analyze this code:\n{file_context}")]
+        prompt_messages = analyzer_prompt.format_messages(messages=messages)
+        response, _ = await router.ainvoke("analyzer", prompt_messages, validate=valid_text)
         
         return {
-            **state,
-            "messages": state["messages"] + [response],
-            "analysis_results": analysis_results,
+            "messages": [response],
+            "analysis_summary": response.content,
+            "node_metrics": input_metrics("analyzer", prompt_messages),
             "current_step": "analysis_complete"
         }
     
     return analyzer
 
-def create_writer_node(llm: ChatGoogleGenerativeAI, doc_type: DocumentationType):
-    """Create the documentation writer agent node"""
-    
-    writer_prompts = {
-        DocumentationType.README: """You are an expert technical writer creating a README.md.
+MAX_SECTION_QUERIES = 8
+
+def section_queries(plan: str, doc_type: DocumentationType) -> List[str]:
+    """Retrieval queries for the writer: the plan's sections and key components"""
+    parsed = parse_json_response(plan)
+    queries = []
+    if isinstance(parsed, dict):
+        queries += [str(section) for section in parsed.get("doc_structure") or [] if section]
+        for component in parsed.get("key_components") or []:
+            if isinstance(component, dict):
+                queries.append(f"{component.get('name', '')} {component.get('description', '')}".strip())
+    queries = [query for query in queries if query][:MAX_SECTION_QUERIES]
+    return queries or SECTION_QUERIES[doc_type.value]
+
+# System prompt of the writer per documentation type
+WRITER_PROMPTS = {
+    DocumentationType.README: """You are an expert technical writer creating a README.md.
 Write comprehensive, professional documentation including:
 
 1. Clear project title and description
@@ -306,8 +342,8 @@ Write comprehensive, professional documentation including:
 7. License information
 
 Use proper Markdown formatting with badges, tables, and code blocks.""",
-        
-        DocumentationType.API_DOCS: """You are an API documentation specialist.
+    
+    DocumentationType.API_DOCS: """You are an API documentation specialist.
 Create detailed API documentation with:
 
 1. Endpoint descriptions
@@ -318,8 +354,8 @@ Create detailed API documentation with:
 6. Rate limiting info
 
 Format as OpenAPI/Swagger compatible Markdown.""",
-        
-        DocumentationType.INLINE_COMMENTS: """You are a code documentation expert.
+    
+    DocumentationType.INLINE_COMMENTS: """You are a code documentation expert.
 Add comprehensive inline comments including:
 
 1. JSDoc/PyDoc-style function/class documentation
@@ -329,8 +365,8 @@ Add comprehensive inline comments including:
 5. Parameter and return value descriptions
 
 Maintain original code structure, only add comments.""",
-        
-        DocumentationType.ARCHITECTURE: """You are a software architect.
+    
+    DocumentationType.ARCHITECTURE: """You are a software architect.
 Create architecture documentation including:
 
 1. System overview and diagrams (ASCII art)
@@ -340,35 +376,62 @@ Create architecture documentation including:
 5. Technology stack
 6. Deployment architecture
 7. Scalability considerations"""
-    }
+}
+
+def create_writer_node(router: ModelRouter, doc_type: DocumentationType):
+    """Create the documentation writer agent node"""
     
     prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=writer_prompts[doc_type]),
+        SystemMessage(content=WRITER_PROMPTS[doc_type]),
         MessagesPlaceholder(variable_name="messages"),
         HumanMessage(content="Generate documentation based on the analysis provided. Output only the documentation content without explanations.")
     ])
     
-    def writer(state: AgentState) -> AgentState:
+    async def writer(state: AgentState) -> AgentState:
         # Check iteration limit
         if state.get("iteration_count", 0) >= state.get("max_iterations", 3):
-            return {**state, "current_step": "max_iterations_reached"}
+            return {"current_step": "max_iterations_reached"}
+        
+        # Code excerpts are retrieved once per run, for the sections in the plan
+        code_context = state.get("code_context")
+        retrieval = state.get("retrieval") or {}
+        if not code_context:
+            if retrieval and not retrieval.get("synced"):
+                vectors = await await_index_sync(state.get("project_id"), state["files"], retrieval["key"])
+                retrieval = {**retrieval, "vectors": vectors, "synced": True}
+            code_context = await asyncio.to_thread(
+                assemble_code_context, state["files"], state.get("analysis_results", {}),
+                section_queries(state.get("plan", ""), doc_type), WRITER_CODE_TOKEN_BUDGET,
+                state.get("project_id"), state.get("file_ranks"), retrieval
+            )
         
-        messages = prompt.format_messages(messages=state["messages"])
-        response = llm.invoke(messages)
+        # Revisions see the latest draft and review feedback, not the whole transcript
+        sections = ["plan", "analysis", "structure", "code"]
+        if state.get("review"):
+            sections += ["draft", "review"]
+        messages = prompt.format_messages(messages=build_context({**state, "code_context": code_context}, sections))
+        response, _ = await router.ainvoke("writer", messages, validate=valid_text)
         
         return {
-            **state,
-            "messages": state["messages"] + [response],
+            "messages": [response],
+            "code_context": code_context,
+            "retrieval": retrieval,
             "documentation": response.content,
+            "node_metrics": input_metrics("writer", messages),
             "current_step": "draft_complete",
             "iteration_count": state.get("iteration_count", 0) + 1
         }
     
     return writer
 
-def create_reviewer_node(llm: ChatGoogleGenerativeAI):
+def create_reviewer_node(router: ModelRouter, doc_type: DocumentationType):
     """Create the documentation reviewer agent node"""
     
+    # Unparseable or borderline fast-model reviews get a second opinion from the strong model
+    validate_review = review_validator(*review_borderline())
+    # Empty borderline band: only unparseable reviews escalate
+    parseable_review = review_validator(0, 0)
+    
     reviewer_prompt = ChatPromptTemplate.from_messages([
         SystemMessage(content="""You are a documentation quality reviewer.
 Review the generated documentation against these criteria:
@@ -390,65 +453,134 @@ Respond in JSON format:
         MessagesPlaceholder(variable_name="messages"),
     ])
     
-    def reviewer(state: AgentState) -> AgentState:
-        messages = reviewer_prompt.format_messages(messages=state["messages"])
-        response = llm.invoke(messages)
+    async def reviewer(state: AgentState) -> AgentState:
+        messages = reviewer_prompt.format_messages(
+            messages=build_context(state, ["plan", "structure", "draft"])
+        )
+        # Drafts reaching this node already passed the local gate; in "fast" mode
+        # borderline scores stay on the cheap model, unparseable reviews still escalate
+        validate = parseable_review if PREREVIEW_MODE == "fast" else validate_review
+        response, _ = await router.ainvoke("reviewer", messages, validate=validate)
         
         # Parse JSON response
-        try:
-            import json
-            review = json.loads(response.content)
-            passed = review.get("passed", False)
-        except:
-            passed = True  # Default to pass on parse error
+        review = parse_json_response(response.content)
+        if not isinstance(review, dict):
+            # Never pass a draft nobody could review: revise it against the local checks
+            logger.warning("Reviewer response could not be parsed; requesting a revision")
+            review = {
+                **check_draft(state.get("documentation", ""), doc_type.value, state.get("analysis_results", {})),
+                "passed": False
+            }
         
-        next_step = "review_passed" if passed else "needs_revision"
+        next_step = "review_passed" if review.get("passed", False) else "needs_revision"
         
         return {
-            **state,
-            "messages": state["messages"] + [response],
+            "messages": [response],
+            "review": review,
+            "node_metrics": input_metrics("reviewer", messages),
             "current_step": next_step
         }
     
     return reviewer
 
+def create_prereview_node(doc_type: DocumentationType):
+    """Create the local pre-review gate (no LLM call)"""
+    
+    async def prereview(state: AgentState) -> AgentState:
+        if state.get("current_step") == "max_iterations_reached":
+            return {"current_step": "max_iterations_reached"}
+        
+        result = check_draft(state.get("documentation", ""), doc_type.value, state.get("analysis_results", {}))
+        metrics = {"prereview": {"calls": 1, "input_tokens": 0}}
+        if not result["passed"]:
+            # Targeted revision without an LLM review round-trip
+            logger.info(f"Pre-review failed: {result['issues']}")
+            return {"review": result, "node_metrics": metrics, "current_step": "needs_revision"}
+        
+        if PREREVIEW_MODE == "skip":
+            return {"review": result, "node_metrics": metrics, "current_step": "review_passed"}
+        return {"node_metrics": metrics, "current_step": "llm_review"}
+    
+    return prereview
+
 # ============================================================================
 # Build the Agent Graph
 # ============================================================================
 
-def build_documentation_agent():
-    """Build and compile the documentation agent workflow"""
+# Named per-node tier assignments; None uses AGENT_NODE_MODELS / the router defaults
+MODEL_PROFILES: Dict[str, Optional[Dict[str, str]]] = {
+    "balanced": None,
+    "quality": {"planner": "strong", "analyzer": "strong", "writer": "strong", "reviewer": "strong", "summarizer": "strong"},
+    "economy": {"planner": "fast", "analyzer": "fast", "writer": "fast", "reviewer": "fast", "summarizer": "fast"},
+}
+DEFAULT_MODEL_PROFILE = os.getenv("AGENT_MODEL_PROFILE", "balanced")
+
+def build_model_router(node_tiers: Optional[Dict[str, str]] = None) -> ModelRouter:
+    """Model router whose Gemini calls share the API key's limiter with all other Gemini traffic"""
+    api_key = os.getenv("GEMINI_API_KEY")
     
-    # Initialize LLM
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro",
-        temperature=0.2,
-        google_api_key=os.getenv("GEMINI_API_KEY"),
-        convert_system_message_to_human=True
-    )
+    def llm_factory(model: str) -> ChatGoogleGenerativeAI:
+        return ChatGoogleGenerativeAI(
+            model=model,
+            temperature=0.2,
+            google_api_key=api_key,
+            convert_system_message_to_human=True,
+            # Retries go through the limiter so 429/503 shrink the shared window
+            max_retries=1
+        )
+    
+    return ModelRouter(llm_factory, node_tiers, limiter=get_limiter(api_key or ""))
+
+def build_documentation_agent(
+    router: Optional[ModelRouter] = None,
+    doc_type: DocumentationType = DocumentationType.README,
+    checkpointer: Optional[Any] = None
+):
+    """Build and compile the documentation agent workflow for one documentation type"""
+    
+    # Per-node model selection
+    router = router or build_model_router()
     
     # Create nodes
-    planner = create_planner_node(llm)
-    analyzer = create_analyzer_node(llm)
-    writer = create_writer_node(llm, DocumentationType.README)
-    reviewer = create_reviewer_node(llm)
+    planner = create_planner_node(router)
+    structure = create_structure_node()
+    analyzer = create_analyzer_node(router, doc_type)
+    writer = create_writer_node(router, doc_type)
+    prereview = create_prereview_node(doc_type)
+    reviewer = create_reviewer_node(router, doc_type)
     
     # Build graph
     workflow = StateGraph(AgentState)
     
     # Add nodes
     workflow.add_node("planner", planner)
+    workflow.add_node("structure", structure)
     workflow.add_node("analyzer", analyzer)
     workflow.add_node("writer", writer)
+    workflow.add_node("prereview", prereview)
     workflow.add_node("reviewer", reviewer)
     
-    # Define edges
-    workflow.set_entry_point("planner")
-    workflow.add_edge("planner", "analyzer")
-    workflow.add_edge("analyzer", "writer")
-    workflow.add_edge("writer", "reviewer")
+    # Define edges: planning runs concurrently with structural analysis; the LLM
+    # analyzer follows the (local, mostly cached) structure pass because its
+    # code retrieval ranks chunks by structural importance
+    workflow.add_edge(START, "planner")
+    workflow.add_edge(START, "structure")
+    workflow.add_edge("structure", "analyzer")
+    workflow.add_edge(["planner", "analyzer"], "writer")
+    workflow.add_edge("writer", "prereview")
     
-    # Conditional edges
+    # Conditional edges: the local gate sends failing drafts straight back to the
+    # writer and only clean drafts on to the LLM reviewer (or straight to END)
+    workflow.add_conditional_edges(
+        "prereview",
+        lambda state: state["current_step"],
+        {
+            "llm_review": "reviewer",
+            "review_passed": END,
+            "needs_revision": "writer",
+            "max_iterations_reached": END
+        }
+    )
     workflow.add_conditional_edges(
         "reviewer",
         lambda state: state["current_step"],
@@ -460,10 +592,128 @@ def build_documentation_agent():
     )
     
     # Add memory
-    memory = MemorySaver()
+    memory = checkpointer or MemorySaver()
     
     return workflow.compile(checkpointer=memory)
 
+# ============================================================================
+# Hierarchical Workflow
+# ============================================================================
+
+class HierarchyState(TypedDict):
+    """Hierarchical run; its files are checkpointed before the first model call"""
+    files: Dict[str, str]
+    project_id: Optional[str]
+    analysis_results: Dict[str, Any]
+    result: Dict[str, Any]
+
+def create_hierarchy_node(router: ModelRouter, doc_type: DocumentationType):
+    """Map-reduce over the directory tree instead of one writer call"""
+    
+    async def hierarchy_node(state: HierarchyState) -> HierarchyState:
+        files = state["files"]
+        structures, analyzed = await asyncio.to_thread(get_analysis_cache().analyze, files)
+        analysis_results = {
+            filename: result
+            for filename, result in structures.items()
+            if result["success"]
+        }
+        ranking = await asyncio.to_thread(
+            get_import_graph_cache().rank, state.get("project_id"), files, analysis_results
+        )
+        
+        documenter = HierarchicalDocumenter(router, doc_type.value, WRITER_PROMPTS[doc_type])
+        result = await documenter.run(
+            files, analysis_results, ranking, f"Generate {doc_type.value} documentation"
+        )
+        return {"analysis_results": analysis_results, "result": result}
+    
+    return hierarchy_node
+
+def build_hierarchy_agent(
+    router: Optional[ModelRouter] = None,
+    doc_type: DocumentationType = DocumentationType.README,
+    checkpointer: Optional[Any] = None
+) -> StateGraph:
+    """
+    Single-node workflow around HierarchicalDocumenter. It is checkpointed like
+    the agent graph, so an interrupted job can be rerun from its saved files;
+    module summaries finished before the interruption come back from the cache.
+    """
+    workflow = StateGraph(HierarchyState)
+    workflow.add_node("hierarchy", create_hierarchy_node(router or build_model_router(), doc_type))
+    workflow.add_edge(START, "hierarchy")
+    workflow.add_edge("hierarchy", END)
+    
+    return workflow.compile(checkpointer=checkpointer or MemorySaver())
+
+# ============================================================================
+# Graph Registry
+# ============================================================================
+
+class GraphRegistry:
+    """
+    Compiled graphs per (DocumentationType, model profile).
+    
+    warmup() compiles every combination and builds the Gemini clients up front
+    (application startup), so no request pays for graph compilation. Graphs are
+    immutable once compiled and safe to share across concurrent jobs.
+    """
+    
+    def __init__(self, profiles: Optional[Dict[str, Optional[Dict[str, str]]]] = None):
+        self.profiles = profiles or MODEL_PROFILES
+        self.routers: Dict[str, ModelRouter] = {}
+        self.checkpointer = build_checkpointer()
+        self._graphs: Dict[Tuple[DocumentationType, str, bool], Any] = {}
+        self._build_ms: Dict[str, float] = {}
+        # Reentrant: get() builds the profile's router while holding it
+        self._lock = threading.RLock()
+    
+    def router(self, profile: Optional[str] = None) -> ModelRouter:
+        profile = profile if profile in self.profiles else DEFAULT_MODEL_PROFILE
+        with self._lock:
+            if profile not in self.routers:
+                self.routers[profile] = build_model_router(self.profiles[profile])
+            return self.routers[profile]
+    
+    def get(self, doc_type: DocumentationType, profile: Optional[str] = None, hierarchical: bool = False):
+        """Compiled graph for a documentation type and model profile (or its hierarchical workflow)"""
+        profile = profile if profile in self.profiles else DEFAULT_MODEL_PROFILE
+        key = (doc_type, profile, hierarchical)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is None:
+                start = time.perf_counter()
+                build = build_hierarchy_agent if hierarchical else build_documentation_agent
+                graph = build(self.router(profile), doc_type, self.checkpointer)
+                self._graphs[key] = graph
+                name = f"{doc_type.value}/{profile}" + ("/hierarchical" if hierarchical else "")
+                self._build_ms[name] = round((time.perf_counter() - start) * 1000, 2)
+            return graph
+    
+    def warmup(self) -> Dict[str, float]:
+        """Compile all graphs and construct every model client; returns build timings (ms)"""
+        start = time.perf_counter()
+        for profile in self.profiles:
+            router = self.router(profile)
+            for tier in router.models:
+                router.llm(tier)
+            for doc_type in DocumentationType:
+                self.get(doc_type, profile)
+                if doc_type != DocumentationType.INLINE_COMMENTS:
+                    self.get(doc_type, profile, hierarchical=True)
+        logger.info(f"Compiled {len(self._graphs)} agent graphs in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return self.info()["build_ms"]
+    
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "graphs": len(self._graphs),
+                "default_profile": DEFAULT_MODEL_PROFILE,
+                "profiles": list(self.profiles),
+                "build_ms": dict(self._build_ms)
+            }
+
 # ============================================================================
 # Agent Orchestrator
 # ============================================================================
@@ -472,15 +722,51 @@ class AgentOrchestrator:
     """Orchestrates multiple specialized agents for complex tasks"""
     
     def __init__(self):
-        self.doc_agent = build_documentation_agent()
+        self.registry = GraphRegistry()
         self.logger = logging.getLogger(__name__)
     
+    def routing_metrics(self) -> Dict[str, Any]:
+        """Model routing metrics per profile"""
+        return {profile: router.metrics() for profile, router in list(self.registry.routers.items())}
+    
+    @staticmethod
+    def _initial_state(
+        files: Dict[str, str],
+        doc_type: DocumentationType,
+        github_context: Optional[Dict[str, Any]] = None,
+        user_preferences: Optional[Dict[str, Any]] = None,
+        project_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return {
+            "messages": [HumanMessage(content=f"Generate {doc_type.value} documentation")],
+            "files": files,
+            "file_metadata": {},
+            "documentation": "",
+            "current_step": "start",
+            "errors": [],
+            "analysis_results": {},
+            "github_context": github_context,
+            "user_preferences": user_preferences or {},
+            "iteration_count": 0,
+            "max_iterations": 3,
+            "plan": "",
+            "analysis_summary": "",
+            "review": {},
+            "node_metrics": {},
+            "project_id": project_id,
+            "code_context": "",
+            "file_ranks": {},
+            "retrieval": {}
+        }
+    
     async def generate_documentation(
         self,
         files: Dict[str, str],
         doc_type: DocumentationType = DocumentationType.README,
         github_context: Optional[Dict[str, Any]] = None,
-        user_preferences: Optional[Dict[str, Any]] = None
+        user_preferences: Optional[Dict[str, Any]] = None,
+        project_id: Optional[str] = None,
+        job_id: Optional[Any] = None
     ) -> Dict[str, Any]:
         """
         Generate documentation using the agent workflow
@@ -490,39 +776,162 @@ class AgentOrchestrator:
             doc_type: Type of documentation to generate
             github_context: Optional GitHub repository context
             user_preferences: User customization preferences
+            project_id: Project whose ProjectFile rows receive the analyses
+            job_id: DocumentationJob id; the run is checkpointed under it and
+                a previously interrupted run of the same job is resumed
             
         Returns:
             Dictionary with documentation and metadata
         """
         
         # Initialize state
-        initial_state = {
-            "messages": [HumanMessage(content=f"Generate {doc_type.value} documentation")],
-            "files": files,
-            "file_metadata": {},
-            "documentation": "",
-            "current_step": "start",
-            "errors": [],
-            "analysis_results": {},
-            "github_context": github_context,
-            "user_preferences": user_preferences or {},
-            "iteration_count": 0,
-            "max_iterations": 3
-        }
-        
-        # Run agent workflow
+        initial_state = self._initial_state(files, doc_type, github_context, user_preferences, project_id)
+        
+        # Identical jobs already in flight (same files, type, preferences and
+        # project) share a single workflow run
+        job_key = fingerprint(
+            "documentation", doc_type.value, files, github_context, user_preferences or {}, project_id
+        )
+        profile = (user_preferences or {}).get("model_profile")
+        thread_id = str(job_id or uuid.uuid4())
+        if self.use_hierarchy(files, doc_type, user_preferences):
+            graph = self.registry.get(doc_type, profile, hierarchical=True)
+            hierarchy_state = {"files": files, "project_id": project_id, "analysis_results": {}, "result": {}}
+            return await get_coalescing_group().do(
+                job_key, lambda: self._run_hierarchical(graph, hierarchy_state, project_id, self._hierarchy_thread(thread_id))
+            )
+        graph = self.registry.get(doc_type, profile)
+        return await get_coalescing_group().do(
+            job_key, lambda: self._run_documentation(graph, initial_state, project_id, thread_id)
+        )
+    
+    @staticmethod
+    def use_hierarchy(files: Dict[str, str], doc_type: DocumentationType,
+                      user_preferences: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Large repositories (or users who ask for it) are documented module by
+        module; inline comments are per file and always use the graph.
+        """
+        if doc_type == DocumentationType.INLINE_COMMENTS:
+            return False
+        preference = (user_preferences or {}).get("hierarchical")
+        if preference is not None:
+            return bool(preference)
+        return 0 < HIERARCHICAL_MIN_FILES <= len(files)
+    
+    async def _run_hierarchical(self, graph: Any, initial_state: Optional[Dict[str, Any]],
+                                project_id: Optional[str], thread_id: str) -> Dict[str, Any]:
+        """
+        Run (or rerun) the hierarchical workflow. Its files are checkpointed
+        before any model call, so an interrupted job is rerun from them and
+        the module summaries it already produced come back from the cache.
+        """
+        checkpointer = self.registry.checkpointer
         try:
-            final_state = self.doc_agent.invoke(
-                initial_state,
-                config={"configurable": {"thread_id": "doc_gen_1"}}
+            config = self._thread_config(thread_id)
+            graph_input, files = await self._graph_input(graph, initial_state, config)
+            analysis_cache = get_analysis_cache()
+            await analysis_cache.warm(files)
+            final_state = await graph.ainvoke(graph_input, config=config)
+            analysis_results = final_state["analysis_results"]
+            result = final_state["result"]
+            await analysis_cache.persist(project_id, files, analysis_results)
+            await checkpointer.finish(thread_id)
+            await checkpointer.maybe_prune()
+            
+            return {
+                "success": True,
+                "documentation": result["documentation"],
+                "analysis": analysis_results,
+                "steps_completed": "hierarchy_complete",
+                "iterations": 1,
+                "node_metrics": result["node_metrics"],
+                "hierarchy": {
+                    "modules": result["modules"],
+                    "module_count": result["module_count"],
+                    "generated": result["generated"],
+                    "cached": result["cached"]
+                }
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Hierarchical documentation failed: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "documentation": ""
+            }
+    
+    async def resume_documentation(
+        self,
+        job_id: Any,
+        doc_type: DocumentationType = DocumentationType.README,
+        project_id: Optional[str] = None,
+        profile: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Continue an interrupted job from its last completed node. A job that
+        took the hierarchical path is rerun from its checkpointed files.
+        
+        Returns None when the job has no unfinished checkpoint to resume from.
+        """
+        thread_id = str(job_id)
+        graph = self.registry.get(doc_type, profile)
+        snapshot = await graph.aget_state(self._thread_config(thread_id))
+        if snapshot.next:
+            return await self._run_documentation(graph, None, project_id, thread_id)
+        
+        graph = self.registry.get(doc_type, profile, hierarchical=True)
+        snapshot = await graph.aget_state(self._thread_config(self._hierarchy_thread(thread_id)))
+        if snapshot.next:
+            return await self._run_hierarchical(graph, None, project_id, self._hierarchy_thread(thread_id))
+        return None
+    
+    @staticmethod
+    def _hierarchy_thread(thread_id: str) -> str:
+        """Hierarchical runs keep their checkpoints apart from the graph's"""
+        return f"{thread_id}:hierarchy"
+    
+    @staticmethod
+    def _thread_config(thread_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": thread_id}}
+    
+    async def _graph_input(self, graph: Any, initial_state: Optional[Dict[str, Any]],
+                           config: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+        """
+        Input for a run on this thread and the files it covers. A thread with
+        pending nodes was interrupted (crash, deploy): it is continued with a
+        None input instead of starting over, so completed LLM calls are not repaid.
+        """
+        snapshot = await graph.aget_state(config)
+        if snapshot.next:
+            self.logger.info(
+                f"Resuming {config['configurable']['thread_id']} at {', '.join(snapshot.next)}"
             )
+            return None, snapshot.values.get("files", {})
+        return initial_state, initial_state["files"]
+    
+    async def _run_documentation(self, graph: Any, initial_state: Optional[Dict[str, Any]],
+                                 project_id: Optional[str], thread_id: str) -> Dict[str, Any]:
+        """Run (or resume) the agent workflow once and shape the result"""
+        checkpointer = self.registry.checkpointer
+        try:
+            config = self._thread_config(thread_id)
+            graph_input, files = await self._graph_input(graph, initial_state, config)
+            analysis_cache = get_analysis_cache()
+            await analysis_cache.warm(files)
+            final_state = await graph.ainvoke(graph_input, config=config)
+            await analysis_cache.persist(project_id, files, final_state["analysis_results"])
+            await checkpointer.finish(thread_id)
+            await checkpointer.maybe_prune()
             
             return {
                 "success": True,
                 "documentation": final_state["documentation"],
                 "analysis": final_state["analysis_results"],
                 "steps_completed": final_state["current_step"],
-                "iterations": final_state["iteration_count"]
+                "iterations": final_state["iteration_count"],
+                "node_metrics": final_state.get("node_metrics", {})
             }
             
         except Exception as e:
@@ -536,35 +945,59 @@ class AgentOrchestrator:
     async def stream_documentation(
         self,
         files: Dict[str, str],
-        doc_type: DocumentationType = DocumentationType.README
+        doc_type: DocumentationType = DocumentationType.README,
+        project_id: Optional[str] = None,
+        profile: Optional[str] = None,
+        job_id: Optional[Any] = None
     ):
         """
-        Stream documentation generation for real-time UI updates
+        Stream documentation generation for real-time UI updates.
+        
+        Yields one update per completed node plus "writing" updates carrying
+        each token ("delta") of the writer's draft as it is generated.
         """
-        initial_state = {
-            "messages": [HumanMessage(content=f"Generate {doc_type.value} documentation")],
-            "files": files,
-            "file_metadata": {},
-            "documentation": "",
-            "current_step": "start",
-            "errors": [],
-            "analysis_results": {},
-            "github_context": None,
-            "user_preferences": {},
-            "iteration_count": 0,
-            "max_iterations": 3
-        }
+        graph = self.registry.get(doc_type, profile)
+        thread_id = str(job_id or uuid.uuid4())
+        config = self._thread_config(thread_id)
+        graph_input, files = await self._graph_input(graph, self._initial_state(files, doc_type, project_id=project_id), config)
+        
+        analysis_cache = get_analysis_cache()
+        await analysis_cache.warm(files)
+        analysis_results = {}
         
-        async for state in self.doc_agent.astream(
-            initial_state,
-            config={"configurable": {"thread_id": "doc_stream_1"}}
+        # "messages" relays LLM tokens as Gemini streams them; "updates" marks node completion
+        async for mode, chunk in graph.astream(
+            graph_input,
+            config=config,
+            stream_mode=["updates", "messages"]
         ):
-            yield {
-                "step": state.get("current_step"),
-                "documentation": state.get("documentation", ""),
-                "analysis": state.get("analysis_results", {}),
-                "complete": state.get("current_step") in ["review_passed", "max_iterations_reached"]
-            }
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "writer" and isinstance(message.content, str) and message.content:
+                    yield {
+                        "step": "writing",
+                        "delta": message.content,
+                        "documentation": None,
+                        "analysis": None,
+                        "complete": False
+                    }
+                continue
+            
+            for node, update in chunk.items():
+                if not isinstance(update, dict):
+                    continue
+                if node == "structure":
+                    analysis_results = update.get("analysis_results", {})
+                yield {
+                    "step": update.get("current_step", node),
+                    "documentation": update.get("documentation", ""),
+                    "analysis": update.get("analysis_results", {}),
+                    "complete": update.get("current_step") in ["review_passed", "max_iterations_reached"]
+                }
+        
+        await analysis_cache.persist(project_id, files, analysis_results)
+        await self.registry.checkpointer.finish(thread_id)
+        await self.registry.checkpointer.maybe_prune()
 
 # Singleton instance
 _orchestrator = None
@@ -0,0 +1,284 @@
+"""
+Hierarchical Documentation
+Map-reduce over a repository's directory tree: modules are summarized in parallel,
+parents and the root document are synthesized from child summaries, and every
+summary is cached by the content hashes beneath it
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+import asyncio
+import hashlib
+import os
+import posixpath
+import logging
+
+from analysis import content_hash
+from llm.cache import get_response_cache, make_cache_key
+from retrieval import ContextAssembler, SECTION_QUERIES
+from .context import accumulate_metrics, input_metrics, structural_digest, truncate_to_tokens
+from .routing import ModelRouter, valid_text
+
+logger = logging.getLogger(__name__)
+
+# Repositories with at least this many files are documented hierarchically
+# (0 = only when requested through user_preferences["hierarchical"])
+HIERARCHICAL_MIN_FILES = int(os.getenv("AGENT_HIERARCHICAL_MIN_FILES", "60"))
+# Directories with fewer files (including subdirectories) fold into their parent
+MODULE_MIN_FILES = int(os.getenv("AGENT_MODULE_MIN_FILES", "4"))
+# Module summaries generated at once per job
+MODULE_CONCURRENCY = int(os.getenv("AGENT_MODULE_CONCURRENCY", "8"))
+MODULE_CODE_TOKEN_BUDGET = int(os.getenv("AGENT_MODULE_CODE_TOKENS", "3000"))
+MODULE_STRUCTURE_TOKEN_BUDGET = int(os.getenv("AGENT_MODULE_STRUCTURE_TOKENS", "1500"))
+# Cap per child summary in its parent's prompt
+CHILD_SUMMARY_TOKEN_BUDGET = int(os.getenv("AGENT_CHILD_SUMMARY_TOKENS", "600"))
+# Part of every cache key; bump when the prompts change
+SUMMARY_VERSION = "1"
+
+MODULE_PROMPT = """You are a software architect summarizing one module of a larger repository.
+From its files and the summaries of its submodules, write a concise Markdown summary
+(at most about 300 words) covering:
+
+1. The module's responsibility
+2. Key classes, functions and entry points, with their purpose
+3. Public interfaces other modules rely on
+4. Notable dependencies, configuration and data flow
+
+Emphasize what matters for {doc_type} documentation. Output only the summary."""
+
+# ============================================================================
+# Module Tree
+# ============================================================================
+
+@dataclass
+class ModuleNode:
+    """A directory of the repository; files are its direct files after folding"""
+    path: str
+    files: List[str] = field(default_factory=list)
+    children: List["ModuleNode"] = field(default_factory=list)
+    digest: str = ""
+
+    @property
+    def label(self) -> str:
+        return f"{self.path}/" if self.path else "(root)"
+
+    def file_count(self) -> int:
+        return len(self.files) + sum(child.file_count() for child in self.children)
+
+    def all_files(self) -> List[str]:
+        return self.files + [name for child in self.children for name in child.all_files()]
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+def _node_for(nodes: Dict[str, ModuleNode], path: str) -> ModuleNode:
+    node = nodes.get(path)
+    if node is None:
+        node = nodes[path] = ModuleNode(path)
+        _node_for(nodes, posixpath.dirname(path)).children.append(node)
+    return node
+
+def _fold(node: ModuleNode, min_files: int):
+    """
+    Bottom-up: small directories merge into their parent, and directories that
+    only wrap a single subdirectory ("src/" around "src/app/") are skipped.
+    """
+    children = []
+    for child in node.children:
+        _fold(child, min_files)
+        while not child.files and len(child.children) == 1:
+            child = child.children[0]
+        if child.file_count() < min_files:
+            node.files.extend(child.all_files())
+        else:
+            children.append(child)
+    node.files.sort()
+    node.children = sorted(children, key=lambda child: child.path)
+
+def _digest(node: ModuleNode, hashes: Dict[str, str]) -> str:
+    """Merkle hash: direct files' content hashes plus the children's digests"""
+    digest = hashlib.sha256(f"{SUMMARY_VERSION}\0{node.path}".encode("utf-8"))
+    for filename in node.files:
+        digest.update(f"\0{filename}\0{hashes[filename]}".encode("utf-8"))
+    for child in node.children:
+        digest.update(f"\0{_digest(child, hashes)}".encode("utf-8"))
+    node.digest = digest.hexdigest()
+    return node.digest
+
+def build_module_tree(files: Dict[str, str], min_files: int = MODULE_MIN_FILES) -> ModuleNode:
+    """
+    Directory tree of the files with a content digest per node. A change to
+    one file changes only the digests on its path to the root.
+    """
+    nodes = {"": ModuleNode("")}
+    for filename in sorted(files):
+        _node_for(nodes, posixpath.dirname(filename)).files.append(filename)
+    root = nodes[""]
+    _fold(root, min_files)
+    _digest(root, {filename: content_hash(content) for filename, content in files.items()})
+    return root
+
+# ============================================================================
+# Map-Reduce
+# ============================================================================
+
+class HierarchicalDocumenter:
+    """
+    Documents a repository bottom-up.
+
+    Every module (directory) is summarized from its own files and its
+    submodules' summaries; sibling modules run in parallel, up to
+    MODULE_CONCURRENCY model calls at once. The root document is written by
+    the writer model from the root's files and the top-level summaries.
+    Summaries and the root document are stored in the LLM response cache
+    under their node digest, so after a change only the modules on the path
+    from the changed files to the root are regenerated.
+    """
+
+    def __init__(self, router: ModelRouter, doc_type: str, writer_prompt: str,
+                 concurrency: int = MODULE_CONCURRENCY, min_files: int = MODULE_MIN_FILES):
+        self.router = router
+        self.doc_type = doc_type
+        self.writer_prompt = writer_prompt
+        self.min_files = min_files
+        self.cache = get_response_cache()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.summaries: Dict[str, str] = {}
+        self.node_metrics: Dict[str, Dict[str, int]] = {}
+        self.generated = 0
+        self.cached = 0
+
+    def _cache_key(self, node: ModuleNode, purpose: str) -> str:
+        model = self.router.models[self.router.tier_for(purpose)]
+        return make_cache_key(model, node.digest, f"{purpose}:{self.doc_type}")
+
+    async def _cache_get(self, key: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return await self.cache.aget(key)
+
+    def _module_input(self, node: ModuleNode, files: Dict[str, str], analysis_results: Dict[str, Any],
+                      file_ranks: Dict[str, Dict[str, Any]], child_summaries: List[Tuple[str, str]]) -> str:
+        """The module's structure, most relevant code and its submodules' summaries"""
+        blocks = []
+        if node.files:
+            module_files = {name: files[name] for name in node.files}
+            module_analysis = {name: analysis_results[name] for name in node.files if name in analysis_results}
+            ranks = {name: file_ranks[name] for name in node.files if name in file_ranks}
+            # Tiers are chosen for the whole repository; within a module every file is listed
+            untiered = {name: {k: v for k, v in values.items() if k != "tier"} for name, values in ranks.items()}
+            blocks.append("## Files\n" + structural_digest(module_analysis, MODULE_STRUCTURE_TOKEN_BUDGET, untiered))
+            importance = {name: values["score"] for name, values in ranks.items()}
+            code = ContextAssembler(module_files, module_analysis, importance=importance).assemble(
+                SECTION_QUERIES[self.doc_type], MODULE_CODE_TOKEN_BUDGET
+            )
+            if code:
+                blocks.append("## Code\n" + code)
+        if child_summaries:
+            blocks.append("## Submodules\n" + "\n\n".join(
+                f"### {label}\n{truncate_to_tokens(summary, CHILD_SUMMARY_TOKEN_BUDGET)}"
+                for label, summary in child_summaries
+            ))
+        return "\n\n".join(blocks)
+
+    async def _call(self, node_name: str, messages: List[BaseMessage]) -> str:
+        async with self._semaphore:
+            response, _ = await self.router.ainvoke(node_name, messages, validate=valid_text)
+        self.node_metrics = accumulate_metrics(self.node_metrics, input_metrics(node_name, messages))
+        self.generated += 1
+        return response.content
+
+    async def _summarize(self, node: ModuleNode, files: Dict[str, str], analysis_results: Dict[str, Any],
+                         file_ranks: Dict[str, Dict[str, Any]]) -> str:
+        key = self._cache_key(node, "summarizer")
+        cached = await self._cache_get(key)
+        if cached is not None:
+            # The digest covers every file below, so the whole subtree is unchanged
+            self.cached += 1
+            self.summaries[node.label] = cached
+            return cached
+
+        child_summaries = await asyncio.gather(
+            *(self._summarize(child, files, analysis_results, file_ranks) for child in node.children)
+        )
+        module_input = await asyncio.to_thread(
+            self._module_input, node, files, analysis_results, file_ranks,
+            [(child.label, summary) for child, summary in zip(node.children, child_summaries)]
+        )
+        messages = [
+            SystemMessage(content=MODULE_PROMPT.format(doc_type=self.doc_type)),
+            HumanMessage(content=f"# Module {node.label}\n\n{module_input}")
+        ]
+        try:
+            summary = await self._call("summarizer", messages)
+        except Exception as e:
+            # One failed module should not fail the document; it is not cached
+            # and will be retried on the next run
+            logger.warning(f"Summary of {node.label} failed: {e}")
+            self.summaries[node.label] = structural_digest(
+                {name: analysis_results[name] for name in node.files if name in analysis_results},
+                CHILD_SUMMARY_TOKEN_BUDGET
+            )
+            return self.summaries[node.label]
+        if self.cache is not None:
+            await self.cache.aset(key, summary)
+        self.summaries[node.label] = summary
+        return summary
+
+    async def run(self, files: Dict[str, str], analysis_results: Dict[str, Any],
+                  file_ranks: Dict[str, Dict[str, Any]], task: str) -> Dict[str, Any]:
+        """
+        Summarize every module and write the root document.
+
+        Returns the documentation, each module's summary and how many model
+        calls were made or served from the cache.
+        """
+        root = await asyncio.to_thread(build_module_tree, files, self.min_files)
+        key = self._cache_key(root, "writer")
+        documentation = await self._cache_get(key)
+        if documentation is not None:
+            self.cached += 1
+        else:
+            child_summaries = await asyncio.gather(
+                *(self._summarize(child, files, analysis_results, file_ranks) for child in root.children)
+            )
+            root_input = await asyncio.to_thread(
+                self._module_input, root, files, analysis_results, file_ranks,
+                [(child.label, summary) for child, summary in zip(root.children, child_summaries)]
+            )
+            messages = [
+                SystemMessage(content=self.writer_prompt),
+                HumanMessage(content=task),
+                HumanMessage(content=root_input),
+                HumanMessage(content="Generate documentation for the whole repository from the module "
+                                     "summaries and top-level files above. Output only the documentation "
+                                     "content without explanations.")
+            ]
+            documentation = await self._call("writer", messages)
+            if self.cache is not None:
+                await self.cache.aset(key, documentation)
+
+        modules = list(root.walk())
+        # Modules below an unchanged parent were not visited; their
+        # summaries are still in the cache under the same digests
+        unvisited = [node for node in modules[1:] if not self.summaries.get(node.label)]
+        stored = await asyncio.gather(
+            *(self._cache_get(self._cache_key(node, "summarizer")) for node in unvisited)
+        )
+        for node, summary in zip(unvisited, stored):
+            self.summaries[node.label] = summary or ""
+        logger.info(
+            f"Hierarchical {self.doc_type}: {len(modules)} modules, "
+            f"{self.generated} generated, {self.cached} cached"
+        )
+        return {
+            "documentation": documentation,
+            "modules": {node.label: self.summaries[node.label] for node in modules[1:]},
+            "module_count": len(modules),
+            "generated": self.generated,
+            "cached": self.cached,
+            "node_metrics": self.node_metrics,
+        }
@@ -0,0 +1,104 @@
+"""
+Local Pre-review Gate
+Deterministic structural checks on a draft before any LLM review round
+"""
+
+from typing import Any, Dict, List, Set
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# What happens to drafts that pass: "skip" the LLM review, run it on the "fast"
+# model without escalation, or run the "full" routed review
+PREREVIEW_MODE = os.getenv("AGENT_PREREVIEW_MODE", "skip")
+
+# doc type -> list of (section label, heading keywords); one keyword must appear in a heading
+REQUIRED_SECTIONS = {
+    "readme": [
+        ("Installation", ("install", "getting started", "setup", "set up")),
+        ("Usage", ("usage", "example", "quick start", "quickstart", "how to use")),
+    ],
+    "api_docs": [
+        ("Endpoints / API reference", ("endpoint", "api", "reference", "route")),
+        ("Request / parameters", ("request", "parameter", "argument", "input")),
+        ("Response / return values", ("response", "return", "output")),
+        ("Errors", ("error", "status code", "exception")),
+    ],
+    "architecture": [
+        ("Overview", ("overview", "architecture", "introduction", "summary")),
+        ("Components", ("component", "module", "service", "layer")),
+        ("Data flow", ("data flow", "flow", "request lifecycle", "sequence")),
+    ],
+    "inline_comments": [],
+}
+
+MIN_LENGTH = {"readme": 400, "api_docs": 400, "architecture": 400, "inline_comments": 50}
+
+_HEADING_PATTERN = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+_FENCE_PATTERN = re.compile(r"^\s{0,3}(```|~~~)", re.MULTILINE)
+# Bare call-like references in inline code: `name()` / `name(arg)`. Dotted calls
+# (`json.loads()`) usually name third-party APIs and are not checked.
+_CALL_REFERENCE = re.compile(r"`([A-Za-z_]\w*)\([^`]*\)`")
+_BUILTIN_CALLS = {
+    "print", "len", "open", "range", "str", "int", "dict", "list", "set", "isinstance",
+    "super", "require", "fetch", "setTimeout", "console", "import"
+}
+MAX_REPORTED_SYMBOLS = 10
+
+def known_symbols(analysis_results: Dict[str, Any]) -> Set[str]:
+    symbols = set()
+    for result in analysis_results.values():
+        for function in result.get("functions", []):
+            symbols.add(function.get("name"))
+        for cls in result.get("classes", []):
+            symbols.add(cls.get("name"))
+            symbols.update(cls.get("methods", []))
+    symbols.discard(None)
+    return symbols
+
+def check_draft(draft: str, doc_type: str, analysis_results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the local checks on a draft.
+
+    Returns {"passed", "issues", "suggestions"} in the same shape as an LLM
+    review, so the writer can act on it directly.
+    """
+    issues: List[str] = []
+    suggestions: List[str] = []
+    draft = draft or ""
+
+    minimum = MIN_LENGTH.get(doc_type, 400)
+    if len(draft.strip()) < minimum:
+        issues.append(f"Draft is too short ({len(draft.strip())} characters, minimum {minimum})")
+        suggestions.append("Expand the documentation to cover the project fully")
+
+    headings = [h.lower() for h in _HEADING_PATTERN.findall(draft)]
+    for label, keywords in REQUIRED_SECTIONS.get(doc_type, []):
+        if not any(keyword in heading for heading in headings for keyword in keywords):
+            issues.append(f"Missing required section: {label}")
+            suggestions.append(f"Add a '{label}' section with its own heading")
+
+    if len(_FENCE_PATTERN.findall(draft)) % 2:
+        issues.append("Unbalanced code fences (a ``` block is not closed)")
+        suggestions.append("Close every fenced code block")
+
+    # Symbol lists are capped per file; only check names against complete lists
+    complete = all(
+        result.get("function_count", 0) <= len(result.get("functions", []))
+        and result.get("class_count", 0) <= len(result.get("classes", []))
+        for result in analysis_results.values()
+    )
+    symbols = known_symbols(analysis_results)
+    if symbols and complete:
+        unknown = []
+        for name in _CALL_REFERENCE.findall(draft):
+            if name not in symbols and name not in _BUILTIN_CALLS and name not in unknown:
+                unknown.append(name)
+        if unknown:
+            shown = ", ".join(f"`{name}()`" for name in unknown[:MAX_REPORTED_SYMBOLS])
+            issues.append(f"References functions that do not exist in the code: {shown}")
+            suggestions.append("Only reference functions and classes that exist in the analyzed files")
+
+    return {"passed": not issues, "issues": issues, "suggestions": suggestions, "source": "local"}
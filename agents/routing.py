@@ -0,0 +1,159 @@
+"""
+Per-node Model Routing
+Fast model by default, escalation to the strong model on invalid output or a borderline
+review, with latency and token accounting per node and model
+"""
+
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from langchain_core.messages import BaseMessage
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+from llm.limiter import AdaptiveLimiter, ainvoke_with_limits
+
+logger = logging.getLogger(__name__)
+
+FAST_MODEL = os.getenv("AGENT_MODEL_FAST", "gemini-1.5-flash")
+STRONG_MODEL = os.getenv("AGENT_MODEL_STRONG", "gemini-1.5-pro")
+# node=tier pairs; tiers are "fast" or "strong"
+DEFAULT_NODE_TIERS = "planner=fast,analyzer=fast,writer=strong,reviewer=fast,summarizer=fast"
+# Fast-model review scores in [low, high) are re-checked by the strong model
+REVIEW_BORDERLINE = os.getenv("AGENT_REVIEW_BORDERLINE", "60,80")
+
+_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*\n?(.*?)\n?```\s*$", re.DOTALL)
+
+def parse_json_response(text: Any) -> Optional[Any]:
+    """Parse a model's JSON answer, tolerating a surrounding Markdown fence"""
+    if not isinstance(text, str):
+        return None
+    fenced = _FENCE_PATTERN.match(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+def parse_node_tiers(spec: str) -> Dict[str, str]:
+    tiers = {}
+    for pair in spec.split(","):
+        if "=" in pair:
+            node, tier = pair.split("=", 1)
+            tiers[node.strip()] = tier.strip()
+    return tiers
+
+# ============================================================================
+# Validators
+# ============================================================================
+
+def valid_plan(response: BaseMessage) -> bool:
+    return isinstance(parse_json_response(response.content), dict)
+
+def valid_text(response: BaseMessage) -> bool:
+    return isinstance(response.content, str) and bool(response.content.strip())
+
+def review_validator(low: float, high: float) -> Callable[[BaseMessage], bool]:
+    """Reviews must parse and have a score outside the borderline band"""
+    def valid_review(response: BaseMessage) -> bool:
+        review = parse_json_response(response.content)
+        if not isinstance(review, dict):
+            return False
+        try:
+            score = float(review.get("score"))
+        except (TypeError, ValueError):
+            return False
+        return not (low <= score < high)
+    return valid_review
+
+# ============================================================================
+# Router
+# ============================================================================
+
+class ModelRouter:
+    """
+    Chooses a model per node and escalates when the fast model's output is not good enough.
+
+    llm_factory(model_name) builds a chat model; models are built once per tier.
+    Every call records latency and token usage under (node, model) so the
+    routing policy can be tuned from real traffic. With a limiter, every call
+    takes a slot in the API key's window and reports overloads back to it.
+    """
+
+    def __init__(self, llm_factory: Callable[[str], Any], node_tiers: Optional[Dict[str, str]] = None,
+                 fast_model: str = FAST_MODEL, strong_model: str = STRONG_MODEL,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self.models = {"fast": fast_model, "strong": strong_model}
+        self.node_tiers = node_tiers or parse_node_tiers(os.getenv("AGENT_NODE_MODELS", DEFAULT_NODE_TIERS))
+        self.limiter = limiter
+        self._factory = llm_factory
+        self._llms: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def llm(self, tier: str):
+        with self._lock:
+            if tier not in self._llms:
+                self._llms[tier] = self._factory(self.models[tier])
+            return self._llms[tier]
+
+    def tier_for(self, node: str) -> str:
+        tier = self.node_tiers.get(node, "strong")
+        return tier if tier in self.models else "strong"
+
+    def _record(self, node: str, model: str, seconds: float, response: Any, escalated: bool):
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._lock:
+            entry = self._stats.setdefault((node, model), {
+                "calls": 0, "escalations": 0, "total_ms": 0.0, "input_tokens": 0, "output_tokens": 0
+            })
+            entry["calls"] += 1
+            entry["escalations"] += int(escalated)
+            entry["total_ms"] += seconds * 1000
+            entry["input_tokens"] += usage.get("input_tokens", 0) or 0
+            entry["output_tokens"] += usage.get("output_tokens", 0) or 0
+
+    async def _call(self, tier: str, messages: Sequence[BaseMessage]) -> BaseMessage:
+        llm = self.llm(tier)
+        if self.limiter is None:
+            return await llm.ainvoke(messages)
+        return await ainvoke_with_limits(self.limiter, lambda: llm.ainvoke(messages))
+
+    async def ainvoke(self, node: str, messages: Sequence[BaseMessage],
+                      validate: Optional[Callable[[BaseMessage], bool]] = None) -> Tuple[BaseMessage, str]:
+        """
+        Call the node's model; on a failed validation retry once on the strong model.
+
+        Returns (response, model). An invalid fast response is still recorded, so
+        escalation rates show up per node in metrics().
+        """
+        tier = self.tier_for(node)
+        start = time.perf_counter()
+        response = await self._call(tier, messages)
+        self._record(node, self.models[tier], time.perf_counter() - start, response, escalated=False)
+
+        if tier == "fast" and validate is not None and not validate(response):
+            logger.info(f"{node}: {self.models['fast']} output failed validation, escalating")
+            start = time.perf_counter()
+            response = await self._call("strong", messages)
+            self._record(node, self.models["strong"], time.perf_counter() - start, response, escalated=True)
+            tier = "strong"
+        return response, self.models[tier]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per node and model: calls, escalations into it, latency and tokens"""
+        with self._lock:
+            report: Dict[str, Any] = {}
+            for (node, model), entry in self._stats.items():
+                report.setdefault(node, {})[model] = {
+                    **{k: v for k, v in entry.items() if k != "total_ms"},
+                    "avg_latency_ms": round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else 0.0
+                }
+            return {"models": dict(self.models), "node_tiers": dict(self.node_tiers), "nodes": report}
+
+def review_borderline() -> Tuple[float, float]:
+    low, high = (float(x) for x in REVIEW_BORDERLINE.split(","))
+    return low, high
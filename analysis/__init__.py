@@ -0,0 +1,40 @@
+"""Tekshila Analysis Package"""
+
+from .structure import (
+    analyze_source,
+    analyze_with_tree_sitter,
+    analyze_with_regex,
+    detect_language,
+    get_parser,
+    ANALYZER_VERSION
+)
+from .pool import analyze_files, shutdown_analysis_pool
+from .cache import AnalysisCache, content_hash, get_analysis_cache
+from .graph import (
+    ImportResolver,
+    ImportGraphCache,
+    rank_files,
+    inclusion_tiers,
+    summarize_ranking,
+    get_import_graph_cache
+)
+
+__all__ = [
+    "analyze_source",
+    "analyze_with_tree_sitter",
+    "analyze_with_regex",
+    "detect_language",
+    "get_parser",
+    "ANALYZER_VERSION",
+    "analyze_files",
+    "shutdown_analysis_pool",
+    "AnalysisCache",
+    "content_hash",
+    "get_analysis_cache",
+    "ImportResolver",
+    "ImportGraphCache",
+    "rank_files",
+    "inclusion_tiers",
+    "summarize_ranking",
+    "get_import_graph_cache"
+]
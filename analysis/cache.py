@@ -0,0 +1,249 @@
+"""
+Structural Analysis Cache
+Analysis results keyed by SHA-256 of file content plus analyzer version, held in an
+in-process LRU and persisted to ProjectFile.ast_data in Postgres
+"""
+
+from typing import Dict, Any, Optional, Set, Tuple
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import hashlib
+import os
+import posixpath
+import threading
+import uuid
+import logging
+
+from .structure import ANALYZER_VERSION
+from .pool import analyze_files
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_ENTRIES = int(os.getenv("ANALYSIS_CACHE_ENTRIES", "5000"))
+# ProjectFile.path column width; longer paths stay in the memory tier
+MAX_PATH_LENGTH = 500
+
+def content_hash(content: str) -> str:
+    """SHA-256 of file content, as stored in ProjectFile.content_hash"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache for per-file structural analysis.
+
+    The memory tier is consulted synchronously from the analyzer node. The
+    Postgres tier is read in bulk before a job runs (warm) and written in bulk
+    after it finishes (persist), so the graph itself never waits on the database.
+    Results are content-addressed: a file analyzed in one project is a hit in any
+    other project with identical content.
+    """
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self.analyzed = 0
+
+    @staticmethod
+    def _key(digest: str) -> str:
+        return f"{ANALYZER_VERSION}:{digest}"
+
+    # -- memory tier -------------------------------------------------------------
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._data.get(self._key(digest))
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(self._key(digest))
+            self.hits += 1
+            return value
+
+    def put(self, digest: str, analysis: Dict[str, Any]):
+        with self._lock:
+            key = self._key(digest)
+            self._data[key] = analysis
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def analyze(self, files: Dict[str, str]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """
+        Analyze files, parsing only cache misses.
+
+        Returns (results, analyzed) with results in the same order as files.
+        """
+        digests = {filename: content_hash(content) for filename, content in files.items()}
+        cached: Dict[str, Dict[str, Any]] = {}
+        missing: Dict[str, str] = {}
+        for filename, content in files.items():
+            hit = self.get(digests[filename])
+            if hit is not None:
+                # Entries are shared across paths with identical content
+                cached[filename] = {**hit, "filename": filename}
+            else:
+                missing[filename] = content
+
+        fresh = analyze_files(missing) if missing else {}
+        for filename, analysis in fresh.items():
+            if analysis.get("success"):
+                self.put(digests[filename], analysis)
+        with self._lock:
+            self.analyzed += len(fresh)
+
+        results = {filename: cached.get(filename) or fresh[filename] for filename in files}
+        return results, len(fresh)
+
+    # -- Postgres tier ------------------------------------------------------------
+
+    async def warm(self, files: Dict[str, str]) -> Set[str]:
+        """
+        Load persisted analyses for memory misses into the memory tier.
+
+        Returns the set of content hashes whose analysis is now in memory.
+        """
+        digests = await asyncio.to_thread(lambda: {content_hash(c) for c in files.values()})
+        with self._lock:
+            known = {d for d in digests if self._key(d) in self._data}
+        missing = digests - known
+        if not missing:
+            return known
+
+        try:
+            from sqlalchemy import select
+            from db.connection import get_db_session
+            from db.models import ProjectFile
+
+            async with get_db_session() as session:
+                if session is None:
+                    return known
+                rows = await session.execute(
+                    select(ProjectFile.content_hash, ProjectFile.ast_data)
+                    .where(ProjectFile.content_hash.in_(missing))
+                    .where(ProjectFile.ast_data["analyzer_version"].astext == ANALYZER_VERSION)
+                )
+                for digest, ast_data in rows:
+                    if digest in known:
+                        continue
+                    analysis = {k: v for k, v in ast_data.items() if k != "analyzer_version"}
+                    self.put(digest, analysis)
+                    known.add(digest)
+                    with self._lock:
+                        self.db_hits += 1
+        except Exception as e:
+            logger.warning(f"Analysis cache lookup failed, analyzing from scratch: {e}")
+        return known
+
+    async def persist(
+        self,
+        project_id: Optional[str],
+        files: Dict[str, str],
+        results: Dict[str, Dict[str, Any]]
+    ):
+        """
+        Bulk upsert analyses into the project's ProjectFile rows.
+
+        Rows are keyed by (project_id, path): a file seen for the first time
+        gets a row, an existing row is updated in place. Rows that already hold
+        this content's analysis (same content hash, current analyzer version)
+        are skipped. Without a project there is no row to attach to, so results
+        stay in the memory tier only.
+        """
+        if not project_id:
+            return
+        pending = {
+            filename: (content_hash(files[filename]), analysis)
+            for filename, analysis in results.items()
+            if filename in files and analysis.get("success") and len(filename) <= MAX_PATH_LENGTH
+        }
+        if not pending:
+            return
+
+        try:
+            from sqlalchemy import select
+            from sqlalchemy.dialects.postgresql import insert
+            from db.connection import get_db_session
+            from db.models import ProjectFile
+
+            project_uuid = uuid.UUID(str(project_id))
+            async with get_db_session() as session:
+                if session is None:
+                    return
+                rows = (await session.execute(
+                    select(
+                        ProjectFile.path, ProjectFile.content_hash,
+                        ProjectFile.ast_data["analyzer_version"].astext
+                    )
+                    .where(ProjectFile.project_id == project_uuid)
+                    .where(ProjectFile.path.in_(list(pending)))
+                )).all()
+                current = {
+                    path for path, stored_hash, stored_version in rows
+                    if stored_hash == pending[path][0] and stored_version == ANALYZER_VERSION
+                }
+
+                now = datetime.utcnow()
+                upserts = [
+                    {
+                        "id": uuid.uuid4(),
+                        "project_id": project_uuid,
+                        "path": path,
+                        "name": posixpath.basename(path)[:255],
+                        "extension": posixpath.splitext(path)[1].lstrip(".")[:20],
+                        "language": (analysis.get("language") or "unknown")[:50],
+                        "content_hash": digest,
+                        "content_size": len(files[path].encode("utf-8")),
+                        "ast_data": {**analysis, "analyzer_version": ANALYZER_VERSION},
+                        "complexity_score": analysis.get("complexity_score"),
+                        "lines_of_code": analysis.get("lines_of_code", 0),
+                        "function_count": analysis.get("function_count", len(analysis.get("functions", []))),
+                        "class_count": analysis.get("class_count", len(analysis.get("classes", []))),
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for path, (digest, analysis) in pending.items()
+                    if path not in current
+                ]
+                if upserts:
+                    statement = insert(ProjectFile)
+                    refreshed = (
+                        "language", "content_hash", "content_size", "ast_data", "complexity_score",
+                        "lines_of_code", "function_count", "class_count", "updated_at"
+                    )
+                    await session.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=[ProjectFile.project_id, ProjectFile.path],
+                            set_={column: statement.excluded[column] for column in refreshed}
+                        ),
+                        upserts
+                    )
+            if upserts:
+                logger.info(f"Persisted {len(upserts)} file analyses for project {project_id}")
+        except Exception as e:
+            logger.warning(f"Analysis cache write-back failed: {e}")
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "db_hits": self.db_hits,
+                "analyzed": self.analyzed,
+                "analyzer_version": ANALYZER_VERSION
+            }
+
+# Singleton instance
+_analysis_cache = None
+
+def get_analysis_cache() -> AnalysisCache:
+    """Get or create the process-wide analysis cache"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = AnalysisCache()
+    return _analysis_cache
@@ -0,0 +1,377 @@
+"""
+Import Graph Ranking
+Resolves intra-project imports into a dependency graph and ranks files by centrality
+(PageRank plus fan-in/fan-out), cached incrementally per project
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set
+from collections import OrderedDict
+import os
+import posixpath
+import re
+import threading
+import logging
+
+from .cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_MAX_ITERATIONS = 100
+# Share of the ranked files (by PageRank) that count as core modules
+CORE_FRACTION = float(os.getenv("GRAPH_CORE_FRACTION", "0.1"))
+# Projects whose graphs are kept in memory
+GRAPH_CACHE_PROJECTS = int(os.getenv("GRAPH_CACHE_PROJECTS", "64"))
+
+ENTRY_NAMES = {"main", "app", "index", "cli", "server", "manage", "__main__", "wsgi", "asgi", "run"}
+JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+# Root aliases used by bundler configs ("@/components/Button")
+JS_ROOT_ALIASES = ("@/", "~/")
+
+# ============================================================================
+# Import Resolution
+# ============================================================================
+
+_JS_SPECIFIER = re.compile(
+    r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*|^\s*import\s+)(['"])([^'"\n]+)\1""",
+    re.MULTILINE
+)
+
+def _python_module(filename: str) -> Optional[str]:
+    if not filename.endswith(".py"):
+        return None
+    parts = filename[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts) or None
+
+class ImportResolver:
+    """
+    Maps import strings to project files.
+
+    Python modules are matched by dotted path, falling back to the longest
+    unambiguous suffix so that sources below a top-level folder ("backend/
+    agents/x.py" imported as "agents.x") still resolve. JS/TS specifiers are
+    resolved relative to the importing file or a root alias, trying the usual
+    extensions and index files. Imports of third-party packages resolve to
+    nothing and are dropped.
+    """
+
+    def __init__(self, filenames: Iterable[str]):
+        self.filenames = set(filenames)
+        self.modules: Dict[str, str] = {}
+        self.suffixes: Dict[str, Optional[str]] = {}
+        for filename in sorted(self.filenames):
+            module = _python_module(filename)
+            if not module:
+                continue
+            self.modules[module] = filename
+            parts = module.split(".")
+            for i in range(1, len(parts)):
+                suffix = ".".join(parts[i:])
+                # None marks a suffix shared by several files
+                self.suffixes[suffix] = None if suffix in self.suffixes else filename
+
+    def _lookup(self, module: str) -> Optional[str]:
+        return self.modules.get(module) or self.suffixes.get(module)
+
+    def resolve(self, filename: str, analysis: Dict[str, Any], content: str = "") -> Set[str]:
+        if filename.endswith(".py"):
+            targets = self._resolve_python(filename, analysis.get("imports", []))
+        elif filename.endswith(JS_EXTENSIONS):
+            # Specifiers come from the source itself so that require() and
+            # `export ... from` count as well as import statements
+            specifiers = {match.group(2) for match in _JS_SPECIFIER.finditer(content)}
+            targets = {self._resolve_js(filename, specifier) for specifier in specifiers} - {None}
+        else:
+            targets = set()
+        targets.discard(filename)
+        return targets
+
+    def _resolve_python(self, filename: str, imports: List[str]) -> Set[str]:
+        targets = set()
+        package = filename.split("/")[:-1]
+        for text in imports:
+            if " import " in text:
+                module, _, names = text.partition(" import")
+                module = module.strip()
+                names = [
+                    name.split(" as ")[0].strip()
+                    for name in names.strip().strip("()").split(",")
+                ]
+                if module.startswith("."):
+                    level = len(module) - len(module.lstrip("."))
+                    base = package[:len(package) - level + 1] if level > 1 else package
+                    module = ".".join(base + ([module.lstrip(".")] if module.lstrip(".") else []))
+                for name in names:
+                    # `from pkg import submodule` imports a module, not a symbol
+                    target = self._lookup(f"{module}.{name}") if module and name else None
+                    if target is None and name and not module:
+                        target = self._lookup(name)
+                    if target:
+                        targets.add(target)
+                target = self._lookup(module) if module else None
+                if target and not (target.endswith("__init__.py") and targets):
+                    targets.add(target)
+            else:
+                for part in text.split(","):
+                    module = part.split(" as ")[0].strip()
+                    # `import a.b.c` loads a.b.c (and its packages); the deepest known module counts
+                    pieces = module.split(".")
+                    for i in range(len(pieces), 0, -1):
+                        target = self._lookup(".".join(pieces[:i]))
+                        if target:
+                            targets.add(target)
+                            break
+        return targets
+
+    def _resolve_js(self, filename: str, specifier: str) -> Optional[str]:
+        if specifier.startswith("."):
+            bases = [posixpath.normpath(posixpath.join(posixpath.dirname(filename), specifier))]
+        elif specifier.startswith(JS_ROOT_ALIASES):
+            rest = specifier[2:]
+            bases = [rest, f"src/{rest}"]
+        else:
+            return None
+        for base in bases:
+            for candidate in [base] + [base + ext for ext in JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in JS_EXTENSIONS]:
+                if candidate in self.filenames:
+                    return candidate
+        return None
+
+# ============================================================================
+# Ranking
+# ============================================================================
+
+def pagerank(edges: Dict[str, Set[str]], start: Optional[Dict[str, float]] = None,
+             damping: float = PAGERANK_DAMPING) -> Dict[str, float]:
+    """
+    Power iteration over importer -> imported edges, so importance flows to
+    the modules the rest of the project depends on. Files without imports
+    spread their rank evenly. A previous ranking warm-starts the iteration,
+    which converges in a few steps after a small change.
+    """
+    nodes = list(edges)
+    count = len(nodes)
+    if not count:
+        return {}
+    if start:
+        ranks = {node: start.get(node, 1.0 / count) for node in nodes}
+        total = sum(ranks.values())
+        ranks = {node: value / total for node, value in ranks.items()}
+    else:
+        ranks = {node: 1.0 / count for node in nodes}
+    incoming: Dict[str, List[str]] = {node: [] for node in nodes}
+    for source, targets in edges.items():
+        for target in targets:
+            incoming[target].append(source)
+    out_degree = {node: len(targets) for node, targets in edges.items()}
+
+    for _ in range(PAGERANK_MAX_ITERATIONS):
+        dangling = sum(ranks[node] for node in nodes if not out_degree[node])
+        base = (1 - damping) / count + damping * dangling / count
+        updated = {
+            node: base + damping * sum(ranks[source] / out_degree[source] for source in incoming[node])
+            for node in nodes
+        }
+        delta = sum(abs(updated[node] - ranks[node]) for node in nodes)
+        ranks = updated
+        if delta < PAGERANK_TOLERANCE:
+            break
+    return ranks
+
+def rank_files(edges: Dict[str, Set[str]], start: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Per file: pagerank, fan_in, fan_out, a combined score in [0, 1], its role
+    (entry | core | module | isolated) and rank (1 = most important).
+    """
+    scores = pagerank(edges, start)
+    fan_in = {node: 0 for node in edges}
+    for targets in edges.values():
+        for target in targets:
+            fan_in[target] += 1
+    top_rank = max(scores.values(), default=0.0) or 1.0
+    top_in = max(fan_in.values(), default=0) or 1
+    top_out = max((len(targets) for targets in edges.values()), default=0) or 1
+    core_count = max(1, int(len(edges) * CORE_FRACTION))
+    by_pagerank = sorted(edges, key=lambda node: (-scores[node], node))
+    core = {node for node in by_pagerank[:core_count] if fan_in[node] >= 2}
+
+    ranking = {}
+    for node, targets in edges.items():
+        stem = posixpath.splitext(posixpath.basename(node))[0].lower()
+        if not fan_in[node] and not targets:
+            role = "isolated"
+        elif not fan_in[node] and stem != "__init__":
+            role = "entry"
+        elif node in core:
+            role = "core"
+        else:
+            role = "module"
+        score = 0.6 * scores[node] / top_rank + 0.2 * fan_in[node] / top_in + 0.2 * len(targets) / top_out
+        if role == "entry" and stem in ENTRY_NAMES:
+            # Entry points rank low on PageRank (nothing imports them) but are
+            # where readers start
+            score = max(score, 0.7)
+        ranking[node] = {
+            "pagerank": round(scores[node], 6),
+            "fan_in": fan_in[node],
+            "fan_out": len(targets),
+            "imports": sorted(targets),
+            "role": role,
+            "score": round(min(score, 1.0), 4),
+        }
+    for position, node in enumerate(sorted(ranking, key=lambda node: (-ranking[node]["score"], node)), 1):
+        ranking[node]["rank"] = position
+    return ranking
+
+# ============================================================================
+# Inclusion Tiers
+# ============================================================================
+
+def _signature_text(analysis: Dict[str, Any]) -> str:
+    lines = [f"class {cls['name']}" for cls in analysis.get("classes", [])]
+    lines += [f.get("signature") or f"{f['name']}(...)" for f in analysis.get("functions", [])]
+    return "\n".join(lines)
+
+def inclusion_tiers(ranking: Dict[str, Dict[str, Any]], files: Dict[str, str],
+                    analysis_results: Dict[str, Any], full_tokens: int,
+                    signature_tokens: int) -> Dict[str, str]:
+    """
+    Decide per file whether prompts get its full content, its signatures only,
+    or nothing: files are taken in rank order, the most central ones fill the
+    full-content budget, the next ones the signature budget. Entry points are
+    always listed with at least their signatures. Sizes are estimated at four
+    characters per token, which is close enough for a coarse cut.
+    """
+    tiers = {}
+    full_left, signatures_left = full_tokens, signature_tokens
+    for filename in sorted(ranking, key=lambda name: ranking[name]["rank"]):
+        size = len(files.get(filename, "")) // 4
+        signatures = len(_signature_text(analysis_results.get(filename, {}))) // 4 + 10
+        if size <= full_left:
+            tiers[filename] = "full"
+            full_left -= size
+        elif signatures <= signatures_left or ranking[filename]["role"] == "entry":
+            tiers[filename] = "signatures"
+            signatures_left -= signatures
+        else:
+            tiers[filename] = "omit"
+    return tiers
+
+# ============================================================================
+# Per-project Cache
+# ============================================================================
+
+class _ProjectGraph:
+    __slots__ = ("hashes", "edges", "ranking")
+
+    def __init__(self, hashes: Dict[str, str], edges: Dict[str, Set[str]], ranking: Dict[str, Dict[str, Any]]):
+        self.hashes = hashes
+        self.edges = edges
+        self.ranking = ranking
+
+class ImportGraphCache:
+    """
+    Per-project import graphs, updated incrementally.
+
+    Only files whose content hash changed have their imports re-resolved
+    (all of them when files were added or removed, since that changes what
+    an import can resolve to); PageRank is warm-started from the previous
+    ranking and an unchanged file set returns the cached ranking as is.
+    """
+
+    def __init__(self, max_projects: int = GRAPH_CACHE_PROJECTS):
+        self.max_projects = max_projects
+        self._projects: "OrderedDict[str, _ProjectGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.updates = 0
+        self.resolved = 0
+
+    @staticmethod
+    def _key(project_id: Optional[str], files: Dict[str, str]) -> str:
+        if project_id:
+            return str(project_id)
+        # Ad-hoc runs are keyed by their file set
+        return "files:" + content_hash("\0".join(sorted(files)))
+
+    def rank(self, project_id: Optional[str], files: Dict[str, str],
+             analysis_results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        key = self._key(project_id, files)
+        hashes = {filename: content_hash(content) for filename, content in files.items()}
+        with self._lock:
+            previous = self._projects.get(key)
+            if previous is not None:
+                self._projects.move_to_end(key)
+        if previous is not None and previous.hashes == hashes:
+            with self._lock:
+                self.hits += 1
+            return previous.ranking
+
+        same_files = previous is not None and previous.hashes.keys() == hashes.keys()
+        resolver = ImportResolver(files)
+        edges: Dict[str, Set[str]] = {}
+        resolved = 0
+        for filename, content in files.items():
+            if same_files and previous.hashes[filename] == hashes[filename]:
+                edges[filename] = previous.edges[filename]
+            else:
+                edges[filename] = resolver.resolve(filename, analysis_results.get(filename, {}), content)
+                resolved += 1
+
+        start = {name: values["pagerank"] for name, values in previous.ranking.items()} if previous else None
+        ranking = rank_files(edges, start)
+        logger.info(
+            f"Import graph for {key}: {resolved}/{len(files)} files resolved, "
+            f"{sum(len(targets) for targets in edges.values())} edges"
+        )
+        with self._lock:
+            self._projects[key] = _ProjectGraph(hashes, edges, ranking)
+            self._projects.move_to_end(key)
+            while len(self._projects) > self.max_projects:
+                self._projects.popitem(last=False)
+            self.updates += 1
+            self.resolved += resolved
+        return ranking
+
+    def get(self, project_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """The project's last computed ranking, if cached"""
+        with self._lock:
+            entry = self._projects.get(str(project_id))
+            return entry.ranking if entry is not None else None
+
+    def invalidate(self, project_id: str):
+        with self._lock:
+            self._projects.pop(str(project_id), None)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "projects": len(self._projects),
+                "hits": self.hits,
+                "updates": self.updates,
+                "files_resolved": self.resolved,
+            }
+
+def summarize_ranking(ranking: Dict[str, Dict[str, Any]], limit: int = 10) -> Dict[str, Any]:
+    """Entry points, core modules and the top files, for stats and logs"""
+    ordered = sorted(ranking, key=lambda name: ranking[name]["rank"])
+    return {
+        "files": len(ranking),
+        "edges": sum(values["fan_out"] for values in ranking.values()),
+        "entry_points": [name for name in ordered if ranking[name]["role"] == "entry"][:limit],
+        "core": [name for name in ordered if ranking[name]["role"] == "core"][:limit],
+        "top": [(name, ranking[name]["score"]) for name in ordered[:limit]],
+    }
+
+# Singleton instance
+_import_graph_cache = None
+
+def get_import_graph_cache() -> ImportGraphCache:
+    """Get or create the process-wide import graph cache"""
+    global _import_graph_cache
+    if _import_graph_cache is None:
+        _import_graph_cache = ImportGraphCache()
+    return _import_graph_cache
@@ -0,0 +1,106 @@
+"""
+Parallel Structural Analysis
+Distributes per-file analysis across a reusable process pool in byte-balanced chunks
+"""
+
+from typing import Dict, Any, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import logging
+
+from .structure import analyze_source
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "0")) or (os.cpu_count() or 1)
+# Below either threshold, pickling and IPC cost more than parsing in-process
+ANALYSIS_POOL_MIN_FILES = int(os.getenv("ANALYSIS_POOL_MIN_FILES", "32"))
+ANALYSIS_POOL_MIN_BYTES = int(os.getenv("ANALYSIS_POOL_MIN_KB", "512")) * 1024
+# Chunks per worker: enough to balance uneven files, few enough to amortize pickling
+CHUNKS_PER_WORKER = 4
+
+def _analyze_chunk(items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    # Runs in a worker process; grammars stay loaded for the worker's lifetime
+    return [analyze_source(content, filename) for filename, content in items]
+
+def analyze_sequential(files: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    return {filename: analyze_source(content, filename) for filename, content in files.items()}
+
+def chunk_files(files: Dict[str, str], chunk_count: int) -> List[List[Tuple[str, str]]]:
+    """Split files, in order, into up to chunk_count runs of roughly equal size"""
+    total = sum(len(content) for content in files.values())
+    target = max(total // max(chunk_count, 1), 1)
+    chunks: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    size = 0
+    for filename, content in files.items():
+        current.append((filename, content))
+        size += len(content)
+        if size >= target:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+# ============================================================================
+# Pool lifecycle
+# ============================================================================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_analysis_pool() -> ProcessPoolExecutor:
+    """Get or create the shared analysis process pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a server process with live threads and sockets is unsafe
+            context = multiprocessing.get_context(os.getenv("ANALYSIS_POOL_START_METHOD", "spawn"))
+            _pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS, mp_context=context)
+        return _pool
+
+def shutdown_analysis_pool():
+    """Stop the worker processes (application shutdown)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# ============================================================================
+# Public API
+# ============================================================================
+
+def analyze_files(files: Dict[str, str], parallel: Optional[bool] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze many files, using the process pool for large inputs.
+
+    Results are keyed and ordered exactly as the sequential path would produce
+    them. Small inputs (and pool failures) are analyzed in-process.
+    """
+    if parallel is None:
+        total_bytes = sum(len(content) for content in files.values())
+        parallel = (
+            ANALYSIS_WORKERS > 1
+            and len(files) >= ANALYSIS_POOL_MIN_FILES
+            and total_bytes >= ANALYSIS_POOL_MIN_BYTES
+        )
+    if not parallel:
+        return analyze_sequential(files)
+
+    chunks = chunk_files(files, ANALYSIS_WORKERS * CHUNKS_PER_WORKER)
+    try:
+        pool = get_analysis_pool()
+        results: Dict[str, Dict[str, Any]] = {}
+        for chunk, analyses in zip(chunks, pool.map(_analyze_chunk, chunks)):
+            for (filename, _), analysis in zip(chunk, analyses):
+                results[filename] = analysis
+        return results
+    except BrokenProcessPool as e:
+        logger.error(f"Analysis pool failed, analyzing in-process: {e}")
+        shutdown_analysis_pool()
+        return analyze_sequential(files)
@@ -0,0 +1,320 @@
+"""
+Structural Code Analysis Engine
+Tree-sitter backed extraction of functions, classes, imports and per-function
+cyclomatic complexity, with the legacy regex scanner as fallback
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from functools import lru_cache
+import importlib
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the shape or semantics of analysis results change
+ANALYZER_VERSION = "ts-1"
+
+MAX_FUNCTIONS = 20
+MAX_CLASSES = 20
+MAX_IMPORTS = 30
+MAX_SIGNATURE_LENGTH = 200
+
+# ============================================================================
+# Language Specifications
+# ============================================================================
+
+PYTHON_SPEC = {
+    "grammar": ("tree_sitter_python", "language"),
+    "functions": {"function_definition"},
+    "classes": {"class_definition"},
+    "imports": {"import_statement", "import_from_statement"},
+    "decisions": {
+        "if_statement", "elif_clause", "for_statement", "while_statement", "except_clause",
+        "conditional_expression", "boolean_operator", "case_clause", "for_in_clause", "if_clause"
+    },
+    "boolean_operators": set(),
+}
+
+JAVASCRIPT_SPEC = {
+    "grammar": ("tree_sitter_javascript", "language"),
+    "functions": {
+        "function_declaration", "generator_function_declaration", "method_definition",
+        "function_expression", "function", "arrow_function"
+    },
+    "classes": {"class_declaration", "abstract_class_declaration"},
+    "imports": {"import_statement"},
+    "decisions": {
+        "if_statement", "for_statement", "for_in_statement", "while_statement", "do_statement",
+        "switch_case", "catch_clause", "ternary_expression"
+    },
+    # binary_expression counts only for these operators
+    "boolean_operators": {"&&", "||", "??"},
+}
+
+LANGUAGE_SPECS = {
+    "python": PYTHON_SPEC,
+    "javascript": JAVASCRIPT_SPEC,
+    "typescript": {**JAVASCRIPT_SPEC, "grammar": ("tree_sitter_typescript", "language_typescript")},
+    "tsx": {**JAVASCRIPT_SPEC, "grammar": ("tree_sitter_typescript", "language_tsx")},
+}
+
+EXTENSION_LANGUAGES = {
+    "py": "python", "pyi": "python",
+    "js": "javascript", "jsx": "javascript", "mjs": "javascript", "cjs": "javascript",
+    "ts": "typescript", "mts": "typescript", "cts": "typescript",
+    "tsx": "tsx",
+}
+
+# ============================================================================
+# Grammar / Parser Cache
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def get_language(language: str):
+    """Load a tree-sitter grammar once per process; None when it is not installed"""
+    spec = LANGUAGE_SPECS.get(language)
+    if spec is None:
+        return None
+    module_name, attr = spec["grammar"]
+    try:
+        from tree_sitter import Language
+        module = importlib.import_module(module_name)
+        return Language(getattr(module, attr)())
+    except Exception as e:
+        logger.warning(f"tree-sitter grammar for {language} unavailable, using regex analysis: {e}")
+        return None
+
+_parsers = threading.local()
+
+def get_parser(language: str):
+    """Per-thread parser for a language (tree-sitter parsers are not thread-safe)"""
+    cache = getattr(_parsers, "by_language", None)
+    if cache is None:
+        cache = _parsers.by_language = {}
+    if language not in cache:
+        grammar = get_language(language)
+        if grammar is None:
+            cache[language] = None
+        else:
+            from tree_sitter import Parser
+            cache[language] = Parser(grammar)
+    return cache[language]
+
+def detect_language(filename: str) -> Tuple[str, Optional[str]]:
+    """Return (extension, tree-sitter language or None)"""
+    ext = filename.split('.')[-1].lower() if '.' in filename else ''
+    return ext, EXTENSION_LANGUAGES.get(ext)
+
+# ============================================================================
+# Tree-sitter Analysis
+# ============================================================================
+
+def _text(node) -> str:
+    return node.text.decode("utf-8", "replace") if node is not None else ""
+
+def _function_name(node) -> str:
+    name = node.child_by_field_name("name")
+    if name is not None:
+        return _text(name)
+    # Anonymous functions take the name they are bound to: const f = () => ...
+    parent = node.parent
+    if parent is not None and parent.type in ("variable_declarator", "assignment_expression", "pair",
+                                              "public_field_definition", "field_definition"):
+        target = (parent.child_by_field_name("name") or parent.child_by_field_name("left")
+                  or parent.child_by_field_name("key") or parent.child_by_field_name("property"))
+        if target is not None:
+            return _text(target)
+    return "<anonymous>"
+
+def _signature(node, source: bytes) -> str:
+    body = node.child_by_field_name("body")
+    end = body.start_byte if body is not None else node.end_byte
+    signature = source[node.start_byte:end].decode("utf-8", "replace")
+    signature = " ".join(signature.split()).rstrip(" :{=>").rstrip()
+    return signature[:MAX_SIGNATURE_LENGTH]
+
+def _import_text(node) -> str:
+    text = " ".join(_text(node).split())
+    for keyword in ("from ", "import "):
+        if text.startswith(keyword):
+            return text[len(keyword):].rstrip(";")
+    return text
+
+def _is_decision(node, spec: Dict[str, Any]) -> bool:
+    if node.type in spec["decisions"]:
+        return True
+    if spec["boolean_operators"] and node.type == "binary_expression":
+        operator = node.child_by_field_name("operator")
+        return operator is not None and operator.type in spec["boolean_operators"]
+    return False
+
+def _analyze_tree(tree, source: bytes, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Single walk over the syntax tree.
+
+    Each decision point is charged to the innermost enclosing function, so a
+    function's cyclomatic complexity is 1 + its own branches, excluding those of
+    nested functions (which are reported separately).
+    """
+    functions: List[Dict[str, Any]] = []
+    classes: List[Dict[str, Any]] = []
+    imports: List[str] = []
+    decisions_total = 0
+
+    # (node, index of enclosing function in `functions`, enclosing class name)
+    stack = [(tree.root_node, None, None)]
+    while stack:
+        node, owner, class_name = stack.pop()
+        node_type = node.type
+
+        if node_type in spec["functions"]:
+            functions.append({
+                "name": _function_name(node),
+                "line": node.start_point[0],
+                "end_line": node.end_point[0],
+                "signature": _signature(node, source),
+                "class": class_name,
+                "complexity": 1,
+            })
+            owner = len(functions) - 1
+            class_name = None
+        elif node_type in spec["classes"]:
+            name = _text(node.child_by_field_name("name"))
+            classes.append({"name": name, "line": node.start_point[0], "methods": []})
+            class_name = name
+        elif node_type in spec["imports"]:
+            imports.append(_import_text(node))
+            continue
+        elif _is_decision(node, spec):
+            decisions_total += 1
+            if owner is not None:
+                functions[owner]["complexity"] += 1
+
+        for child in reversed(node.children):
+            stack.append((child, owner, class_name))
+
+    methods_by_class: Dict[str, List[str]] = {}
+    for function in functions:
+        if function["class"]:
+            methods_by_class.setdefault(function["class"], []).append(function["name"])
+    for cls in classes:
+        cls["methods"] = methods_by_class.get(cls["name"], [])
+
+    return {
+        "functions": functions,
+        "classes": classes,
+        "imports": imports,
+        "decisions": decisions_total,
+        "parse_errors": tree.root_node.has_error,
+    }
+
+def _complexity_summary(functions: List[Dict[str, Any]], decisions: int, loc: int) -> Dict[str, Any]:
+    complexities = [f["complexity"] for f in functions]
+    return {
+        # Same 0-10 scale as before: branch density per line of code
+        "complexity_score": round(min(decisions / max(loc, 1) * 10, 10), 2),
+        "max_complexity": max(complexities) if complexities else 0,
+        "average_complexity": round(sum(complexities) / len(complexities), 2) if complexities else 0,
+    }
+
+def analyze_with_tree_sitter(content: str, filename: str, language: str) -> Optional[Dict[str, Any]]:
+    """Parser-backed analysis; None when the grammar is unavailable"""
+    parser = get_parser(language)
+    if parser is None:
+        return None
+    source = content.encode("utf-8")
+    tree = parser.parse(source)
+    result = _analyze_tree(tree, source, LANGUAGE_SPECS[language])
+    loc = len([l for l in content.split('\n') if l.strip()])
+    # Anonymous callbacks keep their own complexity but are not listed
+    functions = [f for f in result["functions"] if f["name"] != "<anonymous>"]
+    return {
+        "filename": filename,
+        "language": filename.split('.')[-1].lower(),
+        "lines_of_code": loc,
+        "functions": functions[:MAX_FUNCTIONS],
+        "classes": result["classes"][:MAX_CLASSES],
+        "imports": result["imports"][:MAX_IMPORTS],
+        "function_count": len(functions),
+        "class_count": len(result["classes"]),
+        **_complexity_summary(result["functions"], result["decisions"], loc),
+        "parse_errors": result["parse_errors"],
+        "engine": "tree-sitter",
+        "success": True
+    }
+
+# ============================================================================
+# Regex Fallback
+# ============================================================================
+
+PY_FUNC_PATTERN = re.compile(r'def\s+(\w+)\s*\(')
+PY_CLASS_PATTERN = re.compile(r'class\s+(\w+)\s*[\(:]')
+PY_IMPORT_PATTERN = re.compile(r'^(?:from|import)\s+(.+)')
+JS_FUNC_PATTERN = re.compile(r'(?:function|const|let|var)\s+(\w+)\s*[=:]*\s*(?:async\s+)?(?:function)?\s*\(')
+JS_CLASS_PATTERN = re.compile(r'class\s+(\w+)')
+COMPLEXITY_KEYWORDS = ['if', 'for', 'while', 'except', 'try', 'and', 'or', '?']
+
+def analyze_with_regex(content: str, filename: str) -> Dict[str, Any]:
+    """Line-based scan used for languages without a grammar"""
+    ext = filename.split('.')[-1].lower()
+    lines = content.split('\n')
+    loc = len([l for l in lines if l.strip()])
+
+    functions = []
+    classes = []
+    imports = []
+
+    if ext == 'py':
+        functions = [{'name': m, 'line': i} for i, line in enumerate(lines)
+                     for m in PY_FUNC_PATTERN.findall(line)]
+        classes = [{'name': m, 'line': i} for i, line in enumerate(lines)
+                   for m in PY_CLASS_PATTERN.findall(line)]
+        imports = [m.strip() for line in lines for m in PY_IMPORT_PATTERN.findall(line)]
+    elif ext in ['js', 'ts', 'jsx', 'tsx']:
+        functions = [{'name': m, 'line': i} for i, line in enumerate(lines)
+                     for m in JS_FUNC_PATTERN.findall(line)]
+        classes = [{'name': m, 'line': i} for i, line in enumerate(lines)
+                   for m in JS_CLASS_PATTERN.findall(line)]
+
+    # Simplified complexity: keyword density
+    complexity_score = sum(content.count(kw) for kw in COMPLEXITY_KEYWORDS) / max(loc, 1) * 10
+
+    return {
+        "filename": filename,
+        "language": ext,
+        "lines_of_code": loc,
+        "functions": functions[:MAX_FUNCTIONS],
+        "classes": classes[:MAX_CLASSES],
+        "imports": imports[:MAX_IMPORTS],
+        "function_count": len(functions),
+        "class_count": len(classes),
+        "complexity_score": round(min(complexity_score, 10), 2),
+        "engine": "regex",
+        "success": True
+    }
+
+# ============================================================================
+# Public API
+# ============================================================================
+
+def analyze_source(content: str, filename: str, engine: str = "auto") -> Dict[str, Any]:
+    """
+    Analyze one file's structure.
+
+    Args:
+        content: File text
+        filename: Path, used for language detection
+        engine: "auto" (tree-sitter when a grammar exists), "tree-sitter" or "regex"
+    """
+    try:
+        _, language = detect_language(filename)
+        if engine != "regex" and language is not None:
+            result = analyze_with_tree_sitter(content, filename, language)
+            if result is not None:
+                return result
+        return analyze_with_regex(content, filename)
+    except Exception as e:
+        logger.error(f"Error analyzing {filename}: {e}")
+        return {"error": str(e), "success": False}
@@ -11,12 +11,12 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from typing import List, Dict, Any, Optional, AsyncGenerator
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import asyncio
 import json
 import structlog
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 # Internal imports
 from db.connection import get_db, init_db, close_db
@@ -32,6 +32,9 @@ from agents.documentation_agent import (
     get_agent_orchestrator, DocumentationType
 )
 from github_integration import GitHubIntegration
+from ingestion import build_default_filter
+from analysis import shutdown_analysis_pool, get_import_graph_cache, summarize_ranking
+from retrieval import get_code_index, get_embedding_service
 
 # Configure structured logging
 structlog.configure(
@@ -56,6 +59,16 @@ logger = structlog.get_logger()
 # Security
 security = HTTPBearer(auto_error=False)
 
+# Running documentation jobs refresh heartbeat_at; PROCESSING jobs whose heartbeat
+# is older than AGENT_JOB_STALE_SECONDS were abandoned by their worker and are resumed
+JOB_HEARTBEAT_SECONDS = float(os.getenv("AGENT_JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.getenv("AGENT_JOB_STALE_SECONDS", "180"))
+RESUME_CONCURRENCY = int(os.getenv("AGENT_RESUME_CONCURRENCY", "4"))
+# A job abandoned this many times (it keeps killing its worker) is failed instead
+MAX_JOB_RESUMES = int(os.getenv("AGENT_MAX_JOB_RESUMES", "3"))
+# How often to look for abandoned jobs after startup (0 = only at startup)
+RESUME_INTERVAL_SECONDS = float(os.getenv("AGENT_RESUME_INTERVAL_SECONDS", "300"))
+
 # ============================================================================
 # FastAPI Application
 # ============================================================================
@@ -66,9 +79,34 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Tekshila API", version="3.0.0")
     await init_db()
+    orchestrator = get_agent_orchestrator()
+    await orchestrator.registry.checkpointer.setup()
+    app.state.resume_task = None
+    if os.getenv("AGENT_RESUME_ON_STARTUP", "true").lower() == "true":
+        app.state.resume_task = asyncio.create_task(resume_abandoned_jobs())
+    # Compile every agent graph and build the model clients before the first request
+    try:
+        build_ms = await asyncio.to_thread(orchestrator.registry.warmup)
+        logger.info("Agent graphs compiled", build_ms=build_ms)
+    except Exception as e:
+        # Graphs are still built lazily on first use
+        logger.warning("Agent graph warmup failed", error=str(e))
+    if os.getenv("EMBEDDING_WARMUP", "false").lower() == "true":
+        try:
+            await asyncio.to_thread(get_embedding_service().load)
+        except Exception as e:
+            # Loaded lazily on the first embedding request instead
+            logger.warning("Embedding model warmup failed", error=str(e))
     yield
     # Shutdown
     logger.info("👋 Shutting down Tekshila API")
+    if app.state.resume_task is not None:
+        # Jobs cut short here keep their checkpoints and go stale for another worker
+        app.state.resume_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await app.state.resume_task
+    shutdown_analysis_pool()
+    get_embedding_service().shutdown()
     await close_db()
 
 app = FastAPI(
@@ -409,6 +447,68 @@ async def create_project(
         "message": "Project created successfully"
     }
 
+async def get_owned_project(project_id: str, current_user: User, db: AsyncSession) -> Project:
+    from uuid import UUID
+    
+    result = await db.execute(
+        select(Project).where(
+            Project.id == UUID(project_id),
+            Project.owner_id == current_user.id
+        )
+    )
+    project = result.scalar_one_or_none()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return project
+
+@app.post("/api/projects/{project_id}/index")
+async def index_project_code(
+    project_id: str,
+    files: Dict[str, str],  # filename -> content
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Update the project's semantic code index; only changed chunks are re-embedded"""
+    await get_owned_project(project_id, current_user, db)
+    try:
+        return await asyncio.to_thread(get_code_index().index, project_id, files)
+    except Exception as e:
+        logger.error("Code indexing error", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Code indexing failed"
+        )
+
+@app.get("/api/projects/{project_id}/index")
+async def get_project_index_stats(
+    project_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Index size and last indexing throughput for a project"""
+    await get_owned_project(project_id, current_user, db)
+    stats = await asyncio.to_thread(get_code_index().stats, project_id)
+    return {**stats, "embedding_service": get_embedding_service().info()}
+
+@app.get("/api/projects/{project_id}/graph")
+async def get_project_import_graph(
+    project_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Entry points, core modules and top-ranked files from the project's last import graph"""
+    await get_owned_project(project_id, current_user, db)
+    graph_cache = get_import_graph_cache()
+    ranking = graph_cache.get(project_id)
+    return {
+        "graph": summarize_ranking(ranking) if ranking is not None else None,
+        "cache": graph_cache.info()
+    }
+
 # ============================================================================
 # GitHub Integration Endpoints
 # ============================================================================
@@ -444,22 +544,7 @@ async def sync_github_repo(
     db: AsyncSession = Depends(get_db)
 ):
     """Sync GitHub repository to project"""
-    # Get project
-    from uuid import UUID
-    
-    result = await db.execute(
-        select(Project).where(
-            Project.id == UUID(project_id),
-            Project.owner_id == current_user.id
-        )
-    )
-    project = result.scalar_one_or_none()
-    
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Project not found"
-        )
+    project = await get_owned_project(project_id, current_user, db)
     
     # Update GitHub info
     project.github_repo_name = repo_name
@@ -505,43 +590,44 @@ async def generate_documentation(
         doc_type=doc_type,
         status=DocStatus.PROCESSING,
         file_paths=list(files.keys()),
-        started_at=datetime.utcnow()
+        started_at=datetime.utcnow(),
+        heartbeat_at=datetime.utcnow()
     )
     db.add(job)
     await db.commit()
     
     if stream:
         return StreamingResponse(
-            stream_documentation_generation(files, doc_type_enum, job.id, db),
-            media_type="text/event-stream"
+            stream_documentation_generation(
+                files, doc_type_enum, job.id, db, project_id,
+                (current_user.preferences or {}).get("model_profile")
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
         )
     
     # Non-streaming: run agent workflow
     try:
         orchestrator = get_agent_orchestrator()
         
-        result = await orchestrator.generate_documentation(
-            files=files,
-            doc_type=doc_type_enum,
-            user_preferences=current_user.preferences
-        )
-        
-        if result["success"]:
-            job.status = DocStatus.COMPLETED
-            job.generated_content = result["documentation"]
-            job.quality_score = result.get("quality_score")
-            job.completed_at = datetime.utcnow()
-        else:
-            job.status = DocStatus.FAILED
-            job.error_message = result.get("error")
+        async with job_heartbeat(job.id):
+            result = await orchestrator.generate_documentation(
+                files=files,
+                doc_type=doc_type_enum,
+                user_preferences=current_user.preferences,
+                project_id=project_id,
+                job_id=job.id
+            )
         
+        apply_agent_result(job, result)
         await db.commit()
         
         return {
             "job_id": str(job.id),
             "status": job.status.value,
             "documentation": result.get("documentation"),
-            "analysis": result.get("analysis")
+            "analysis": result.get("analysis"),
+            "node_metrics": result.get("node_metrics")
         }
         
     except Exception as e:
@@ -555,32 +641,218 @@ async def generate_documentation(
             detail="Documentation generation failed"
         )
 
+def apply_agent_result(job: DocumentationJob, result: Dict[str, Any]):
+    """Record an orchestrator result on its DocumentationJob"""
+    if result["success"]:
+        job.status = DocStatus.COMPLETED
+        job.generated_content = result["documentation"]
+        job.quality_score = result.get("quality_score")
+        job.agent_steps = {"node_metrics": result.get("node_metrics", {})}
+        if result.get("hierarchy"):
+            job.agent_steps["hierarchy"] = result["hierarchy"]
+        job.completed_at = datetime.utcnow()
+    else:
+        job.status = DocStatus.FAILED
+        job.error_message = result.get("error")
+
+async def record_job_result(job_id: Any, result: Dict[str, Any]):
+    """apply_agent_result in its own session (the request's session is gone once a stream ends)"""
+    from db.connection import get_db_session
+    
+    async with get_db_session() as db:
+        job = await db.get(DocumentationJob, job_id) if db is not None else None
+        if job is not None:
+            apply_agent_result(job, result)
+
+@asynccontextmanager
+async def job_heartbeat(job_id: Any):
+    """Refresh the job's heartbeat_at while the body runs, so no other worker resumes it"""
+    from sqlalchemy import update
+    from db.connection import get_db_session
+    
+    async def beat():
+        while True:
+            try:
+                async with get_db_session() as db:
+                    if db is None:
+                        return
+                    await db.execute(
+                        update(DocumentationJob)
+                        .where(DocumentationJob.id == job_id)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+            except Exception as e:
+                logger.warning("Job heartbeat failed", job_id=str(job_id), error=str(e))
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+    
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+def stale_job_condition():
+    """PROCESSING jobs whose worker stopped refreshing the heartbeat"""
+    from sqlalchemy import func
+    
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    last_seen = func.coalesce(
+        DocumentationJob.heartbeat_at, DocumentationJob.started_at, DocumentationJob.created_at
+    )
+    return (DocumentationJob.status == DocStatus.PROCESSING) & (last_seen < cutoff)
+
+def abandoned_job_condition():
+    """Stale jobs that have not used up their AGENT_MAX_JOB_RESUMES attempts"""
+    return stale_job_condition() & (DocumentationJob.retry_count < MAX_JOB_RESUMES)
+
+async def fail_exhausted_jobs():
+    """Fail stale jobs that were already resumed AGENT_MAX_JOB_RESUMES times"""
+    from sqlalchemy import update
+    from db.connection import get_db_session
+    
+    async with get_db_session() as db:
+        if db is None:
+            return
+        failed = await db.execute(
+            update(DocumentationJob)
+            .where(stale_job_condition(), DocumentationJob.retry_count >= MAX_JOB_RESUMES)
+            .values(
+                status=DocStatus.FAILED,
+                error_message=f"Abandoned by its worker after {MAX_JOB_RESUMES} resume attempts",
+                completed_at=datetime.utcnow()
+            )
+        )
+    if failed.rowcount:
+        logger.warning("Failed documentation jobs past the resume limit", count=failed.rowcount)
+
+async def resume_job(job_id: Any, retry_count: int):
+    """
+    Claim one abandoned job and continue it from its last checkpoint.
+    
+    The claim bumps retry_count and the heartbeat only if the job is still
+    abandoned and nobody claimed it since it was listed, so a job running on
+    a live worker, or taken over by another instance, is left alone.
+    """
+    from sqlalchemy import update
+    from db.connection import get_db_session
+    
+    async with get_db_session() as db:
+        if db is None:
+            return
+        claimed = await db.execute(
+            update(DocumentationJob)
+            .where(
+                DocumentationJob.id == job_id,
+                DocumentationJob.retry_count == retry_count,
+                abandoned_job_condition()
+            )
+            .values(retry_count=retry_count + 1, heartbeat_at=datetime.utcnow())
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return
+        job = await db.get(DocumentationJob, job_id)
+        user = await db.get(User, job.user_id)
+        doc_type = job.doc_type
+        project_id = str(job.project_id) if job.project_id else None
+        preferences = (user.preferences if user else None) or {}
+    
+    async with job_heartbeat(job_id):
+        try:
+            result = await get_agent_orchestrator().resume_documentation(
+                job_id, DocumentationType(doc_type), project_id, preferences.get("model_profile")
+            )
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+    if result is None:
+        result = {"success": False, "error": "Interrupted before the first checkpoint was saved"}
+    await record_job_result(job_id, result)
+    logger.info("Interrupted documentation job resumed", job_id=str(job_id), success=result["success"])
+
+async def resume_interrupted_jobs():
+    """
+    Continue jobs abandoned by a crashed or stopped worker.
+    
+    Jobs count as abandoned once their heartbeat is older than
+    AGENT_JOB_STALE_SECONDS. Each is resumed in its own task and session,
+    at most AGENT_RESUME_CONCURRENCY at once; jobs resumed
+    AGENT_MAX_JOB_RESUMES times already are failed instead.
+    """
+    from db.connection import get_db_session
+    
+    await fail_exhausted_jobs()
+    async with get_db_session() as db:
+        if db is None:
+            return
+        candidates = (await db.execute(
+            select(DocumentationJob.id, DocumentationJob.retry_count).where(abandoned_job_condition())
+        )).all()
+    if not candidates:
+        return
+    
+    semaphore = asyncio.Semaphore(RESUME_CONCURRENCY)
+    
+    async def run(job_id: Any, retry_count: int):
+        async with semaphore:
+            try:
+                await resume_job(job_id, retry_count)
+            except Exception as e:
+                logger.error("Resuming documentation job failed", job_id=str(job_id), error=str(e))
+    
+    await asyncio.gather(*(run(job_id, retry_count) for job_id, retry_count in candidates))
+
+async def resume_abandoned_jobs():
+    """Resume abandoned jobs at startup and then every AGENT_RESUME_INTERVAL_SECONDS"""
+    while True:
+        try:
+            await resume_interrupted_jobs()
+        except Exception as e:
+            logger.error("Abandoned job sweep failed", error=str(e))
+        if RESUME_INTERVAL_SECONDS <= 0:
+            return
+        await asyncio.sleep(RESUME_INTERVAL_SECONDS)
+
 async def stream_documentation_generation(
     files: Dict[str, str],
     doc_type: DocumentationType,
     job_id: Any,
-    db: AsyncSession
+    db: AsyncSession,
+    project_id: Optional[str] = None,
+    model_profile: Optional[str] = None
 ) -> AsyncGenerator[str, None]:
     """Stream documentation generation updates"""
     try:
         orchestrator = get_agent_orchestrator()
         
-        async for update in orchestrator.stream_documentation(files, doc_type):
-            data = {
-                "step": update["step"],
-                "content": update["documentation"],
-                "complete": update["complete"]
-            }
-            yield f"data: {json.dumps(data)}\n\n"
-            
-            # Small delay to prevent overwhelming the client
-            await asyncio.sleep(0.05)
+        documentation = ""
+        async with job_heartbeat(job_id):
+            async for update in orchestrator.stream_documentation(
+                files, doc_type, project_id, model_profile, job_id=job_id
+            ):
+                if update.get("documentation"):
+                    documentation = update["documentation"]
+                if "delta" in update:
+                    # Token-level relay of the writer draft; no artificial delay
+                    yield f"data: {json.dumps({'step': update['step'], 'delta': update['delta'], 'complete': False})}\n\n"
+                    continue
+                
+                data = {
+                    "step": update["step"],
+                    "content": update["documentation"],
+                    "complete": update["complete"]
+                }
+                yield f"data: {json.dumps(data)}\n\n"
+        
+        await record_job_result(job_id, {"success": True, "documentation": documentation})
         
         # Final update
         yield f"data: {json.dumps({'complete': True})}\n\n"
         
     except Exception as e:
         logger.error("Stream error", error=str(e))
+        await record_job_result(job_id, {"success": False, "error": str(e)})
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
 @app.get("/api/documentation/jobs")
@@ -612,6 +884,20 @@ async def list_documentation_jobs(
         for j in jobs
     ]
 
+@app.get("/api/agents/routing")
+async def get_model_routing_metrics(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Per-node model choices with call counts, escalations, latency and tokens"""
+    return get_agent_orchestrator().routing_metrics()
+
+@app.get("/api/agents/graphs")
+async def get_agent_graphs(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Compiled agent graphs per documentation type / model profile, with build timings"""
+    return get_agent_orchestrator().registry.info()
+
 @app.get("/api/documentation/{job_id}")
 async def get_documentation(
     job_id: str,
@@ -657,6 +943,8 @@ async def upload_files(
     """Upload code files for processing"""
     uploaded = {}
     errors = []
+    skipped = []
+    file_filter = build_default_filter()
     
     SUPPORTED_EXTENSIONS = {
         'py', 'js', 'ts', 'jsx', 'tsx', 'java', 'c', 'cpp', 'cs', 
@@ -679,6 +967,15 @@ async def upload_files(
                 errors.append(f"{file.filename}: File too large (max 1MB)")
                 continue
             
+            # Vendored, minified and generated files only waste LLM tokens
+            reason = file_filter and (
+                file_filter.path_reason(file.filename, len(content))
+                or file_filter.content_reason(file.filename, text_content)
+            )
+            if reason:
+                skipped.append({"path": file.filename, "reason": reason})
+                continue
+            
             uploaded[file.filename] = text_content
             
         except Exception as e:
@@ -690,7 +987,8 @@ async def upload_files(
         "success": len(uploaded) > 0,
         "files": uploaded,
         "file_count": len(uploaded),
-        "errors": errors if errors else None
+        "errors": errors if errors else None,
+        "skipped": skipped
     }
 
 # ============================================================================
@@ -6,18 +6,25 @@ Provides REST API endpoints for the modern frontend to interact with Streamlit b
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uvicorn
 import os
-import tempfile
 import asyncio
 import io
 import zipfile
 from pathlib import Path
+from contextlib import asynccontextmanager
 
 # Import core functionality
-from core import process_file_content, process_zip_file, call_gemini, SUPPORTED_FILES
+from core import process_file_content, process_zip_file, acall_gemini, acomment_files, astream_gemini, plan_readme, SUPPORTED_FILES
+from ingestion import is_archive_filename, ArchiveLimitError, IngestionStats, build_default_filter
+from llm.cache import get_response_cache
+from llm.coalesce import get_coalescing_group
+from llm.limiter import limiter_metrics
+from llm.client import init_http_client, close_http_client
+from llm.fanout import merge_file_streams, REQUEST_CONCURRENCY
+from llm.streaming import sse_event
 from github_integration import GitHubIntegration
 from code_quality import CodeQualityAnalyzer
 from dotenv import load_dotenv
@@ -25,10 +32,18 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared Gemini HTTP client on startup and close it on shutdown"""
+    await init_http_client()
+    yield
+    await close_http_client()
+
 app = FastAPI(
     title="Tekshila API",
     description="AI-Powered Code Documentation and Analysis API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -50,6 +65,7 @@ class DocumentationRequest(BaseModel):
     purpose: str  # "readme" or "comments"
     custom_instructions: Optional[str] = ""
     files: Dict[str, str]  # filename: content
+    max_concurrency: Optional[int] = Field(None, ge=1, le=REQUEST_CONCURRENCY)  # parallel files for "comments"
 
 class GitHubConnectRequest(BaseModel):
     token: str
@@ -134,8 +150,7 @@ async def generate_documentation(request: DocumentationRequest):
         
         # Call Gemini API
         if request.purpose.lower() == "readme":
-            generated_content = await asyncio.to_thread(
-                call_gemini, 
+            generated_content = await acall_gemini(
                 request.files,  # Pass files dict for multiple files
                 "readme", 
                 True,  # is_multiple_files
@@ -150,8 +165,7 @@ async def generate_documentation(request: DocumentationRequest):
                 # Single file
                 filename = list(request.files.keys())[0]
                 file_content = request.files[filename]
-                generated_content = await asyncio.to_thread(
-                    call_gemini, 
+                generated_content = await acall_gemini(
                     file_content, 
                     "comment", 
                     False, 
@@ -161,24 +175,15 @@ async def generate_documentation(request: DocumentationRequest):
                     os.getenv("GEMINI_API_URL")
                 )
             else:
-                # Multiple files - process each file separately and combine
-                commented_files = {}
-                for filename, file_content in request.files.items():
-                    try:
-                        commented_content = await asyncio.to_thread(
-                            call_gemini, 
-                            file_content, 
-                            "comment", 
-                            False, 
-                            filename, 
-                            request.custom_instructions, 
-                            GEMINI_API_KEY, 
-                            os.getenv("GEMINI_API_URL")
-                        )
-                        commented_files[filename] = commented_content
-                    except Exception as e:
-                        # If individual file fails, include original with error note
-                        commented_files[filename] = f"// Error adding comments to {filename}: {str(e)}\n\n{file_content}"
+                # Multiple files - small files are batched into shared requests, the rest
+                # run in parallel; a failing file keeps its original content with an error note
+                commented_files = await acomment_files(
+                    request.files,
+                    request.custom_instructions,
+                    GEMINI_API_KEY,
+                    os.getenv("GEMINI_API_URL"),
+                    limit=request.max_concurrency
+                )
                 
                 # Combine all commented files
                 generated_content = ""
@@ -196,30 +201,93 @@ async def generate_documentation(request: DocumentationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate documentation: {str(e)}")
 
+@app.post("/api/generate-docs/stream")
+async def generate_documentation_stream(request: DocumentationRequest):
+    """Stream generated documentation to the client as server-sent events"""
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="Google API key not configured")
+    
+    if not request.files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    
+    api_url = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent")
+    
+    if request.purpose.lower() == "readme":
+        events = astream_gemini(
+            request.files,  # Pass files dict, as the non-streaming path does
+            "readme",
+            True,  # is_multiple_files
+            request.project_name,
+            request.custom_instructions,
+            GEMINI_API_KEY,
+            api_url
+        )
+    else:
+        # One upstream stream per file, interleaved and tagged with "file"
+        events = merge_file_streams(
+            request.files,
+            lambda filename, content: astream_gemini(
+                content,
+                "comment",
+                False,
+                filename,
+                request.custom_instructions,
+                GEMINI_API_KEY,
+                api_url
+            ),
+            limit=request.max_concurrency
+        )
+    
+    async def relay():
+        try:
+            async for event in events:
+                yield sse_event(event)
+            yield sse_event({"complete": True})
+        except Exception as e:
+            yield sse_event({"type": "error", "error": str(e)})
+    
+    return StreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/generate-docs/plan")
+async def plan_documentation(request: DocumentationRequest):
+    """Report the README token plan (chunks, calls, tokens) without calling Gemini"""
+    if not request.files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    
+    plan, _ = await asyncio.to_thread(
+        plan_readme, request.files, request.project_name, request.custom_instructions
+    )
+    return {
+        "success": True,
+        "plan": plan.as_dict()
+    }
+
 # File upload endpoint
 @app.post("/api/upload-files")
 async def upload_files(files: List[UploadFile] = File(...)):
     try:
         uploaded_files = {}
         supported_extensions = list(SUPPORTED_FILES.keys())
+        stats = IngestionStats()
+        file_filter = build_default_filter()
         
         for file in files:
-            # Read file content
-            content = await file.read()
-            
             # Handle different file types
-            if file.filename.endswith('.zip'):
-                # Process zip file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as temp_file:
-                    temp_file.write(content)
-                    temp_file_path = temp_file.name
-                
+            if is_archive_filename(file.filename):
+                # Stream archive members straight from the spooled upload
                 try:
-                    zip_content = process_zip_file(temp_file_path)
-                    uploaded_files.update(zip_content)
-                finally:
-                    os.unlink(temp_file_path)
+                    archive_content = await asyncio.to_thread(process_zip_file, file.file, stats)
+                except ArchiveLimitError as e:
+                    raise HTTPException(status_code=413, detail=str(e))
+                uploaded_files.update(archive_content)
             else:
+                # Read file content
+                content = await file.read()
+                
                 # Check if individual file has supported extension
                 file_ext = file.filename.split('.')[-1].lower() if '.' in file.filename else ''
                 
@@ -227,6 +295,13 @@ async def upload_files(files: List[UploadFile] = File(...)):
                     # Regular file
                     try:
                         file_content = content.decode('utf-8')
+                        reason = file_filter and (
+                            file_filter.path_reason(file.filename, len(content))
+                            or file_filter.content_reason(file.filename, file_content)
+                        )
+                        if reason:
+                            stats.skip(reason, file.filename)
+                            continue
                         uploaded_files[file.filename] = file_content
                     except UnicodeDecodeError:
                         # Handle binary files
@@ -235,12 +310,17 @@ async def upload_files(files: List[UploadFile] = File(...)):
         if not uploaded_files:
             raise HTTPException(status_code=400, detail="No supported files found in upload")
         
+        report = stats.report()
         return {
             "success": True,
             "files": uploaded_files,
-            "count": len(uploaded_files)
+            "count": len(uploaded_files),
+            "skipped": report["skipped"],
+            "skipped_files": report["skipped_files"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload files: {str(e)}")
 
@@ -410,8 +490,7 @@ async def generate_documentation_advanced(request: DocumentationRequest):
         
         if request.purpose.lower() == "readme":
             # Generate single README for all files
-            generated_content = await asyncio.to_thread(
-                call_gemini,
+            generated_content = await acall_gemini(
                 request.files,
                 "readme",
                 is_multiple,
@@ -430,20 +509,14 @@ async def generate_documentation_advanced(request: DocumentationRequest):
             }
             
         else:  # Comments
-            # Generate comments for each file separately
-            commented_files = {}
-            for filename, content in request.files.items():
-                commented_content = await asyncio.to_thread(
-                    call_gemini,
-                    {filename: content},
-                    "comment",
-                    False,
-                    filename,
-                    request.custom_instructions,
-                    GEMINI_API_KEY,
-                    os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent")
-                )
-                commented_files[filename] = commented_content
+            # Generate comments for all files (batched small files, parallel requests)
+            commented_files = await acomment_files(
+                request.files,
+                request.custom_instructions,
+                GEMINI_API_KEY,
+                os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"),
+                limit=request.max_concurrency
+            )
             
             return {
                 "success": True,
@@ -464,6 +537,26 @@ async def get_supported_files():
         "file_types": SUPPORTED_FILES
     }
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get LLM response cache hit/miss counters"""
+    cache = get_response_cache()
+    return {
+        "success": True,
+        "enabled": cache is not None,
+        # info() counts rows in the SQLite tier; keep it off the event loop
+        "stats": await asyncio.to_thread(cache.info) if cache is not None else None,
+        "coalescing": get_coalescing_group().info()
+    }
+
+@app.get("/api/llm/metrics")
+async def get_llm_metrics():
+    """Get adaptive limiter state (concurrency window, queue depth) per API key"""
+    return {
+        "success": True,
+        "limiters": limiter_metrics()
+    }
+
 @app.post("/api/github/validate-token")
 async def validate_github_token(request: GitHubConnectRequest):
     """Validate GitHub token without storing it"""
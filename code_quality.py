@@ -6,6 +6,9 @@ import json
 from typing import Dict, List, Any, Optional
 import requests
 
+from llm.cache import get_response_cache, make_cache_key
+from llm.limiter import run_with_limits
+
 
 class CodeQualityAnalyzer:
     """Class to analyze code quality using AI-powered analysis."""
@@ -63,6 +66,13 @@ class CodeQualityAnalyzer:
         try:
             url = os.getenv("GEMINI_API_URL")
             
+            # Re-analyzing identical code is served from the response cache
+            cache = get_response_cache()
+            cache_key = make_cache_key(url, prompt, "quality")
+            cached_text = cache.get(cache_key) if cache is not None else None
+            if cached_text is not None:
+                return self._parse_ai_response(cached_text)
+            
             payload = {
                 "contents": [{
                     "parts": [{"text": prompt}]
@@ -71,33 +81,24 @@ class CodeQualityAnalyzer:
             
             headers = {"Content-Type": "application/json"}
             
-            response = requests.post(
-                f"{url}?key={self.gemini_api_key}",
-                headers=headers,
-                json=payload,
-                timeout=30
+            # Shared per-key limiter; 429/5xx are retried with backoff before giving up
+            response = run_with_limits(
+                self.gemini_api_key,
+                lambda: requests.post(
+                    f"{url}?key={self.gemini_api_key}",
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                ),
+                retry_on=(requests.exceptions.ConnectionError, requests.exceptions.Timeout)
             )
             
             if response.status_code == 200:
                 response_json = response.json()
                 result_text = response_json['candidates'][0]['content']['parts'][0]['text']
-                
-                # Extract JSON from the response
-                json_match = re.search(r'```json\s*([\s\S]*?)\s*```|{\s*"issues"[\s\S]*?}', result_text)
-                if json_match:
-                    json_str = json_match.group(1) or json_match.group(0)
-                    try:
-                        return json.loads(json_str)
-                    except json.JSONDecodeError:
-                        pass
-                
-                # If JSON parsing fails, return the raw text
-                return {
-                    "raw_response": result_text,
-                    "issues": [],
-                    "suggestions": ["Unable to parse AI response as JSON"],
-                    "summary": "AI analysis completed but results could not be structured properly."
-                }
+                if cache is not None:
+                    cache.set(cache_key, result_text)
+                return self._parse_ai_response(result_text)
             else:
                 return {
                     "error": f"API error: {response.status_code}",
@@ -108,4 +109,22 @@ class CodeQualityAnalyzer:
             return {
                 "error": "Failed to analyze with AI",
                 "message": str(e)
-            }
\ No newline at end of file
+            }
+    
+    def _parse_ai_response(self, result_text: str) -> Dict[str, Any]:
+        """Extract the structured JSON analysis from the model's text response."""
+        json_match = re.search(r'```json\s*([\s\S]*?)\s*```|{\s*"issues"[\s\S]*?}', result_text)
+        if json_match:
+            json_str = json_match.group(1) or json_match.group(0)
+            try:
+                return json.loads(json_str)
+            except json.JSONDecodeError:
+                pass
+        
+        # If JSON parsing fails, return the raw text
+        return {
+            "raw_response": result_text,
+            "issues": [],
+            "suggestions": ["Unable to parse AI response as JSON"],
+            "summary": "AI analysis completed but results could not be structured properly."
+        }
@@ -1,8 +1,22 @@
 import requests
+import httpx
 import json
+import asyncio
 import os
-import zipfile
-import tempfile
+import re
+import logging
+
+from ingestion import iter_archive, build_default_filter
+from llm.cache import get_response_cache, make_cache_key
+from llm.client import get_http_client
+from llm.coalesce import get_coalescing_group, get_thread_single_flight
+from llm.limiter import run_with_limits, arun_with_limits
+from llm.fanout import map_files_concurrently, map_files_threaded, comment_error_fallback
+from llm.batching import plan_comment_batches, build_comment_batch_prompt, split_comment_batch_response
+from llm.streaming import astream_gemini_text, CodeBlockExtractor
+from llm.planner import PROMPT_TOKEN_BUDGET, get_token_counter, plan_prompt, split_oversized_section
+
+logger = logging.getLogger(__name__)
 
 SUPPORTED_FILES = {
     "py": "Python", "js": "JavaScript", "ts": "TypeScript", "jsx": "React JSX",
@@ -15,71 +29,40 @@ SUPPORTED_FILES = {
 def process_file_content(file_obj):
     return file_obj.getvalue().decode("utf-8")
 
-def process_zip_file(zip_file_obj):
-    project_files = {}
-    supported_extensions = list(SUPPORTED_FILES.keys())
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Handle both file objects and file paths
-        if hasattr(zip_file_obj, 'getvalue'):
-            # File object (from Streamlit)
-            zip_path = os.path.join(temp_dir, "uploaded.zip")
-            with open(zip_path, "wb") as f:
-                f.write(zip_file_obj.getvalue())
-        else:
-            # File path (from API)
-            zip_path = zip_file_obj
-
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        for root, dirs, files in os.walk(temp_dir):
-            for file in files:
-                # Skip hidden files and directories
-                if file.startswith('.') or any(d.startswith('.') for d in root.split(os.sep)):
-                    continue
-                
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, temp_dir)
-                
-                # Get file extension
-                file_ext = file.split('.')[-1].lower() if '.' in file else ''
-                
-                # Only process files with supported extensions
-                if file_ext not in supported_extensions:
-                    continue
-                
-                try:
-                    # Skip files larger than 1MB
-                    if os.path.getsize(file_path) > 1024 * 1024:
-                        continue
-                    
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    project_files[rel_path] = content
-                except Exception as e:
-                    # Skip files that can't be read (binary, encoding issues, etc.)
-                    continue
-    
-    return project_files
-
-def call_gemini(content, purpose, is_multiple_files=False, project_name="", custom_instructions="", api_key="", api_url=""):
-    import re
+def process_zip_file(zip_file_obj, stats=None):
+    # Accepts .zip and .tar.gz/.tgz; members are streamed, never extracted to disk.
+    # The archive's .gitignore/.gitattributes and the vendored/generated heuristics
+    # decide what is kept; pass an IngestionStats to learn what was skipped and why
+    return dict(iter_archive(
+        zip_file_obj,
+        extensions=SUPPORTED_FILES.keys(),
+        stats=stats,
+        file_filter=build_default_filter()
+    ))
+
+def format_file_section(file_path, file_content):
+    extension = os.path.splitext(file_path)[1].lstrip('.')
+    language = SUPPORTED_FILES.get(extension, "Unknown")
+    return f"## File: {file_path} ({language})\n```{extension}\n{file_content}\n```"
+
+def readme_base_prompt(project_name="", custom_instructions="", is_multiple_files=True):
+    if is_multiple_files:
+        base_prompt = f"You are an AI documentation assistant. Generate a technical README for the project '{project_name}':"
+    else:
+        base_prompt = "You are an AI documentation assistant. Generate a technical README for the following code:"
+    if custom_instructions:
+        base_prompt += f"\n\nAdditional instructions: {custom_instructions}"
+    return base_prompt
+
+def build_gemini_prompt(content, purpose, is_multiple_files=False, project_name="", custom_instructions=""):
     if purpose == "readme":
         if is_multiple_files:
-            file_sections = []
-            for file_path, file_content in content.items():
-                extension = os.path.splitext(file_path)[1].lstrip('.')
-                language = SUPPORTED_FILES.get(extension, "Unknown")
-                file_sections.append(f"## File: {file_path} ({language})\n```{extension}\n{file_content}\n```")
-            combined_content = "\n\n".join(file_sections)
-            base_prompt = f"You are an AI documentation assistant. Generate a technical README for the project '{project_name}':"
+            combined_content = "\n\n".join(
+                format_file_section(file_path, file_content) for file_path, file_content in content.items()
+            )
         else:
             combined_content = content
-            base_prompt = "You are an AI documentation assistant. Generate a technical README for the following code:"
-        if custom_instructions:
-            base_prompt += f"\n\nAdditional instructions: {custom_instructions}"
+        base_prompt = readme_base_prompt(project_name, custom_instructions, is_multiple_files)
         prompt = f"{base_prompt}\n\n{combined_content}"
     else:
         extension = os.path.splitext(project_name)[1].lstrip('.')
@@ -88,16 +71,308 @@ def call_gemini(content, purpose, is_multiple_files=False, project_name="", cust
         prompt = f"You are an AI assistant. Add comments to this {language} code:\n```{extension}\n{code}\n```"
         if custom_instructions:
             prompt += f"\n\nAdditional instructions: {custom_instructions}"
+    return prompt
 
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
+def postprocess_gemini_text(text, purpose):
+    if purpose == "comment":
+        match = re.findall(r"```[\w]*\n(.*?)```", text, re.DOTALL)
+        return match[0] if match else text
+    return text
 
-    response = requests.post(f"{api_url}?key={api_key}", headers=headers, data=json.dumps(payload), timeout=60)
-    if response.status_code == 200:
-        text = response.json()['candidates'][0]['content']['parts'][0]['text']
-        if purpose == "comment":
-            match = re.findall(r"```[\w]*\n(.*?)```", text, re.DOTALL)
-            return match[0] if match else text
-        return text
-    else:
-        raise Exception(f"Gemini API Error: {response.status_code} {response.text}")
+def generate_text(prompt, purpose, api_key="", api_url="", use_cache=True):
+    # Identical (model, prompt, purpose) requests are served from the response cache
+    cache = get_response_cache() if use_cache else None
+    cache_key = make_cache_key(api_url, prompt, purpose)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    def post():
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        headers = {"Content-Type": "application/json"}
+
+        # Shared per-key limiter: token bucket + AIMD window, retries 429/5xx honoring Retry-After
+        response = run_with_limits(
+            api_key,
+            lambda: requests.post(f"{api_url}?key={api_key}", headers=headers, data=json.dumps(payload), timeout=60),
+            retry_on=(requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        )
+        if response.status_code == 200:
+            text = response.json()['candidates'][0]['content']['parts'][0]['text']
+            if cache is not None:
+                cache.set(cache_key, text)
+            return text
+        else:
+            raise Exception(f"Gemini API Error: {response.status_code} {response.text}")
+
+    # Identical prompts already in flight share one upstream call
+    return get_thread_single_flight().do(cache_key, post)
+
+async def agenerate_text(prompt, purpose, api_key="", api_url="", use_cache=True):
+    # Async variant of generate_text on the shared pooled httpx client (no executor thread)
+    cache = get_response_cache() if use_cache else None
+    cache_key = make_cache_key(api_url, prompt, purpose)
+    if cache is not None:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+    async def post():
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+
+        response = await arun_with_limits(
+            api_key,
+            lambda: get_http_client().post(api_url, params={"key": api_key}, json=payload),
+            retry_on=(httpx.TransportError,)
+        )
+        if response.status_code == 200:
+            text = response.json()['candidates'][0]['content']['parts'][0]['text']
+            if cache is not None:
+                await cache.aset(cache_key, text)
+            return text
+        else:
+            raise Exception(f"Gemini API Error: {response.status_code} {response.text}")
+
+    # Identical prompts already in flight (in this worker, or any worker when
+    # LLM_COALESCE_REDIS_URL is set) share one upstream call
+    return await get_coalescing_group().do(cache_key, post)
+
+# ============================================================================
+# Token-budgeted README generation (map-reduce for large projects)
+# ============================================================================
+
+def build_readme_sections(content, budget=None):
+    # Sections sorted by path so files from one directory are packed together;
+    # a file larger than the budget is split into "path [part N]" sections
+    budget = budget or PROMPT_TOKEN_BUDGET
+    counter = get_token_counter()
+    sections = {}
+    for file_path in sorted(content):
+        section = format_file_section(file_path, content[file_path])
+        if counter.count(section) <= budget:
+            sections[file_path] = section
+            continue
+        for index, part in enumerate(split_oversized_section(section, budget, counter), start=1):
+            sections[f"{file_path} [part {index}]"] = part
+    return sections
+
+def plan_readme(content, project_name="", custom_instructions="", budget=None):
+    budget = budget or PROMPT_TOKEN_BUDGET
+    preamble = readme_base_prompt(project_name, custom_instructions)
+    sections = build_readme_sections(content, max(budget - get_token_counter().count(preamble), 1))
+    return plan_prompt(sections, preamble=preamble, budget=budget), sections
+
+def build_readme_map_prompt(project_name, chunk_sections):
+    return (
+        f"You are an AI documentation assistant. Summarize these source files from the project '{project_name}' "
+        "so a README can be written from the summary alone. For each file give its purpose, key classes, "
+        "functions and endpoints with signatures, configuration and external dependencies. Be concise and factual."
+        f"\n\n" + "\n\n".join(chunk_sections)
+    )
+
+def build_readme_reduce_prompt(project_name, custom_instructions, plan, summaries):
+    parts = []
+    for index, (chunk, summary) in enumerate(zip(plan.chunks, summaries), start=1):
+        parts.append(f"## Part {index} (files: {', '.join(chunk.sections)})\n{summary}")
+    base_prompt = readme_base_prompt(project_name, custom_instructions)
+    return f"{base_prompt}\n\nThe project is too large to show in full; write the README from these file summaries.\n\n" + "\n\n".join(parts)
+
+def _raise_error(name, content, error):
+    raise error
+
+def generate_readme_map_reduce(plan, sections, project_name="", custom_instructions="", api_key="", api_url="", use_cache=True):
+    map_prompts = {
+        f"chunk-{index}": build_readme_map_prompt(project_name, [sections[name] for name in chunk.sections])
+        for index, chunk in enumerate(plan.chunks)
+    }
+    summaries = map_files_threaded(
+        map_prompts,
+        lambda name, prompt: generate_text(prompt, "readme_summary", api_key, api_url, use_cache),
+        on_error=_raise_error
+    )
+    reduce_prompt = build_readme_reduce_prompt(project_name, custom_instructions, plan, list(summaries.values()))
+    return generate_text(reduce_prompt, "readme", api_key, api_url, use_cache)
+
+async def asummarize_readme_chunks(plan, sections, project_name="", api_key="", api_url="", use_cache=True):
+    map_prompts = {
+        f"chunk-{index}": build_readme_map_prompt(project_name, [sections[name] for name in chunk.sections])
+        for index, chunk in enumerate(plan.chunks)
+    }
+
+    async def summarize(name, prompt):
+        return await agenerate_text(prompt, "readme_summary", api_key, api_url, use_cache)
+
+    summaries = await map_files_concurrently(map_prompts, summarize, on_error=_raise_error)
+    return list(summaries.values())
+
+async def agenerate_readme_map_reduce(plan, sections, project_name="", custom_instructions="", api_key="", api_url="", use_cache=True):
+    summaries = await asummarize_readme_chunks(plan, sections, project_name, api_key, api_url, use_cache)
+    reduce_prompt = build_readme_reduce_prompt(project_name, custom_instructions, plan, summaries)
+    return await agenerate_text(reduce_prompt, "readme", api_key, api_url, use_cache)
+
+# ============================================================================
+# Batched comment generation for many small files
+# ============================================================================
+
+def _file_languages(files):
+    return {
+        filename: SUPPORTED_FILES.get(os.path.splitext(filename)[1].lstrip('.'), "Unknown")
+        for filename in files
+    }
+
+def _batch_jobs(files, plan):
+    # Job id -> files for that request; one request per batch
+    return {f"batch-{index}": {name: files[name] for name in batch} for index, batch in enumerate(plan.batches)}
+
+def _split_batch_results(jobs, job_texts):
+    # Per-file outputs from each batch response, plus the files needing an individual retry
+    results, failed = {}, []
+    for job_id, job_files in jobs.items():
+        text = job_texts[job_id]
+        if text is None:
+            failed.extend(job_files)
+            continue
+        job_results, job_failed = split_comment_batch_response(job_files, text)
+        results.update(job_results)
+        failed.extend(job_failed)
+    return results, failed
+
+def _comment_work(jobs, plan):
+    # One work item per batch request plus one per file too large to batch
+    return {**{job_id: "" for job_id in jobs}, **{f"file:{name}": "" for name in plan.singles}}
+
+def _collect_comment_outputs(files, jobs, plan, outputs):
+    job_texts = {job_id: outputs[job_id] for job_id in jobs}
+    results, failed = _split_batch_results(jobs, job_texts)
+    for name in plan.singles:
+        results[name] = outputs[f"file:{name}"]
+    return results, {name: files[name] for name in failed}
+
+def comment_files(files, custom_instructions="", api_key="", api_url="", limit=None, use_cache=True):
+    # Small files share one request; files missing or malformed in a batch
+    # response are then commented individually
+    plan = plan_comment_batches(files)
+    jobs = _batch_jobs(files, plan)
+    languages = _file_languages(files)
+
+    def comment_one(name, content):
+        return call_gemini(content, "comment", False, name, custom_instructions, api_key, api_url, use_cache)
+
+    def run_job(job_id, _):
+        if job_id in jobs:
+            prompt = build_comment_batch_prompt(jobs[job_id], languages, custom_instructions)
+            try:
+                return generate_text(prompt, "comment_batch", api_key, api_url, use_cache)
+            except Exception as e:
+                logger.warning(f"Batch request failed, falling back to individual calls: {e}")
+                return None
+        name = job_id[len("file:"):]
+        try:
+            return comment_one(name, files[name])
+        except Exception as e:
+            return comment_error_fallback(name, files[name], e)
+
+    outputs = map_files_threaded(_comment_work(jobs, plan), run_job, limit=limit, on_error=_raise_error)
+    results, retry = _collect_comment_outputs(files, jobs, plan, outputs)
+    results.update(map_files_threaded(retry, comment_one, limit=limit))
+    return {name: results[name] for name in files}
+
+async def acomment_files(files, custom_instructions="", api_key="", api_url="", limit=None, use_cache=True):
+    plan = await asyncio.to_thread(plan_comment_batches, files)
+    jobs = _batch_jobs(files, plan)
+    languages = _file_languages(files)
+
+    async def comment_one(name, content):
+        return await acall_gemini(content, "comment", False, name, custom_instructions, api_key, api_url, use_cache)
+
+    async def run_job(job_id, _):
+        if job_id in jobs:
+            prompt = build_comment_batch_prompt(jobs[job_id], languages, custom_instructions)
+            try:
+                return await agenerate_text(prompt, "comment_batch", api_key, api_url, use_cache)
+            except Exception as e:
+                logger.warning(f"Batch request failed, falling back to individual calls: {e}")
+                return None
+        name = job_id[len("file:"):]
+        try:
+            return await comment_one(name, files[name])
+        except Exception as e:
+            return comment_error_fallback(name, files[name], e)
+
+    outputs = await map_files_concurrently(_comment_work(jobs, plan), run_job, limit=limit, on_error=_raise_error)
+    results, retry = _collect_comment_outputs(files, jobs, plan, outputs)
+    results.update(await map_files_concurrently(retry, comment_one, limit=limit))
+    return {name: results[name] for name in files}
+
+# ============================================================================
+# Entry points
+# ============================================================================
+
+def call_gemini(content, purpose, is_multiple_files=False, project_name="", custom_instructions="", api_key="", api_url="", use_cache=True):
+    if purpose == "readme" and is_multiple_files:
+        plan, sections = plan_readme(content, project_name, custom_instructions)
+        if plan.mode == "map_reduce":
+            return generate_readme_map_reduce(plan, sections, project_name, custom_instructions, api_key, api_url, use_cache)
+
+    prompt = build_gemini_prompt(content, purpose, is_multiple_files, project_name, custom_instructions)
+    text = generate_text(prompt, purpose, api_key, api_url, use_cache)
+    return postprocess_gemini_text(text, purpose)
+
+async def acall_gemini(content, purpose, is_multiple_files=False, project_name="", custom_instructions="", api_key="", api_url="", use_cache=True):
+    # Async variant of call_gemini on the shared pooled httpx client (no executor thread)
+    if purpose == "readme" and is_multiple_files:
+        # Token counting is CPU-bound on large projects; keep it off the event loop
+        plan, sections = await asyncio.to_thread(plan_readme, content, project_name, custom_instructions)
+        if plan.mode == "map_reduce":
+            return await agenerate_readme_map_reduce(plan, sections, project_name, custom_instructions, api_key, api_url, use_cache)
+
+    prompt = build_gemini_prompt(content, purpose, is_multiple_files, project_name, custom_instructions)
+    text = await agenerate_text(prompt, purpose, api_key, api_url, use_cache)
+    return postprocess_gemini_text(text, purpose)
+
+async def _replay_text(text):
+    # A cached response is relayed as a single delta
+    yield text
+
+async def astream_gemini(content, purpose, is_multiple_files=False, project_name="", custom_instructions="", api_key="", api_url="", use_cache=True):
+    # Streaming variant of acall_gemini. Yields event dicts:
+    #   {"type": "progress", ...}  map-reduce stage updates (large READMEs only)
+    #   {"type": "delta", "text"}  raw model text as it arrives
+    #   {"type": "code", "text"}   fenced code extracted incrementally ("comment" purpose)
+    #   {"type": "done", "content"} final post-processed result, same as acall_gemini
+    prompt = None
+    if purpose == "readme" and is_multiple_files:
+        plan, sections = await asyncio.to_thread(plan_readme, content, project_name, custom_instructions)
+        if plan.mode == "map_reduce":
+            yield {"type": "progress", "stage": "summarizing", "chunks": len(plan.chunks)}
+            summaries = await asummarize_readme_chunks(plan, sections, project_name, api_key, api_url, use_cache)
+            yield {"type": "progress", "stage": "synthesizing"}
+            prompt = build_readme_reduce_prompt(project_name, custom_instructions, plan, summaries)
+    if prompt is None:
+        prompt = build_gemini_prompt(content, purpose, is_multiple_files, project_name, custom_instructions)
+
+    cache = get_response_cache() if use_cache else None
+    cache_key = make_cache_key(api_url, prompt, purpose)
+    text = await cache.aget(cache_key) if cache is not None else None
+    extractor = CodeBlockExtractor() if purpose == "comment" else None
+
+    deltas = _replay_text(text) if text is not None else astream_gemini_text(prompt, api_key, api_url)
+
+    received = []
+    async for delta in deltas:
+        received.append(delta)
+        yield {"type": "delta", "text": delta}
+        if extractor is not None:
+            code = extractor.feed(delta)
+            if code:
+                yield {"type": "code", "text": code}
+    if extractor is not None:
+        code = extractor.flush()
+        if code:
+            yield {"type": "code", "text": code}
+
+    full_text = "".join(received)
+    if text is None and cache is not None:
+        await cache.aset(cache_key, full_text)
+    yield {"type": "done", "content": postprocess_gemini_text(full_text, purpose)}
@@ -4,7 +4,7 @@ from .connection import get_db, get_db_session, init_db, close_db, engine, Async
 from .models import (
     Base,
     User, Project, ProjectFile, DocumentationJob, 
-    AgentTask, Integration, UsageLog,
+    AgentTask, AgentCheckpoint, AgentCheckpointWrite, Integration, UsageLog,
     UserRole, DocStatus, IntegrationType, AgentTaskStatus
 )
 
@@ -21,6 +21,8 @@ __all__ = [
     "ProjectFile",
     "DocumentationJob",
     "AgentTask",
+    "AgentCheckpoint",
+    "AgentCheckpointWrite",
     "Integration",
     "UsageLog",
     "UserRole",
@@ -76,6 +76,7 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 async def init_db():
     """Initialize database tables"""
     from db.models import Base
+    from db.migrations import upgrade_schema
     
     if engine is None:
         print("⚠️  Database not configured or connection failed. Running in No-DB mode.")
@@ -84,6 +85,8 @@ async def init_db():
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # Columns added to tables that already existed
+            await upgrade_schema(conn)
         print("✅ Database initialized")
     except Exception as e:
         print(f"⚠️  Database initialization failed: {e}. Running in No-DB mode.")
@@ -0,0 +1,36 @@
+"""
+Schema Upgrades
+Idempotent DDL for columns and indexes added to tables after they were first created
+"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Base.metadata.create_all creates missing tables but never alters existing ones,
+# so every column or index added to an existing model is also listed here. Each
+# statement must be safe to run again on every startup.
+SCHEMA_UPGRADES = [
+    # Documentation job heartbeat (abandoned-job detection)
+    "ALTER TABLE documentation_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITHOUT TIME ZONE",
+    # Project files are created by analysis write-back before any upload
+    "ALTER TABLE project_files ALTER COLUMN storage_key DROP NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_file_project_path ON project_files (project_id, path)",
+    "DROP INDEX IF EXISTS idx_file_project",
+]
+
+async def upgrade_schema(conn: AsyncConnection) -> int:
+    """
+    Apply SCHEMA_UPGRADES on an open connection.
+
+    Each statement runs in its own savepoint, so one failure does not abort
+    the others. Returns the number of statements that failed.
+    """
+    failed = 0
+    for statement in SCHEMA_UPGRADES:
+        try:
+            async with conn.begin_nested():
+                await conn.execute(text(statement))
+        except Exception as e:
+            failed += 1
+            print(f"⚠️  Schema upgrade failed ({statement}): {e}")
+    return failed
@@ -7,7 +7,7 @@ from datetime import datetime
 from typing import List, Optional, Dict, Any
 from sqlalchemy import (
     String, Integer, Text, DateTime, Boolean, 
-    ForeignKey, JSON, Enum, Float, Index
+    ForeignKey, JSON, Enum, Float, Index, LargeBinary
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
@@ -160,7 +160,7 @@ class ProjectFile(Base):
     # Content (stored in object storage, reference here)
     content_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # SHA-256
     content_size: Mapped[int] = mapped_column(Integer, nullable=False)
-    storage_key: Mapped[str] = mapped_column(String(500), nullable=False)  # S3/MinIO key
+    storage_key: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # S3/MinIO key, None until uploaded
     
     # Analysis
     ast_data: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
@@ -181,8 +181,10 @@ class ProjectFile(Base):
     project: Mapped["Project"] = relationship(back_populates="files")
     
     __table_args__ = (
-        Index('idx_file_project', 'project_id', 'path'),
+        # One row per path: analysis write-back upserts on it
+        Index('uq_file_project_path', 'project_id', 'path', unique=True),
         Index('idx_file_language', 'language'),
+        Index('idx_file_content_hash', 'content_hash'),
     )
 
 # ============================================================================
@@ -232,6 +234,8 @@ class DocumentationJob(Base):
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Refreshed by the worker running the job; a stale heartbeat marks an abandoned job
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     # Relationships
@@ -285,6 +289,45 @@ class AgentTask(Base):
     # Relationships
     user: Mapped["User"] = relationship(back_populates="agent_tasks")
 
+class AgentCheckpoint(Base):
+    """
+    LangGraph checkpoint for one agent run (thread = DocumentationJob.id).
+    Portable column types so the table also works on SQLite.
+    """
+    __tablename__ = "agent_checkpoints"
+    
+    thread_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(String(255), primary_key=True, default="")
+    checkpoint_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    parent_checkpoint_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    
+    # Serialized and zlib-compressed snapshot (channel values included)
+    type: Mapped[str] = mapped_column(String(32), nullable=False)
+    checkpoint: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    metadata_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    checkpoint_metadata: Mapped[bytes] = mapped_column("metadata", LargeBinary, nullable=False)
+    
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_checkpoint_created', 'created_at'),
+    )
+
+class AgentCheckpointWrite(Base):
+    """Pending writes of a checkpoint (node outputs not yet folded into a snapshot)"""
+    __tablename__ = "agent_checkpoint_writes"
+    
+    thread_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    checkpoint_ns: Mapped[str] = mapped_column(String(255), primary_key=True, default="")
+    checkpoint_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    task_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    idx: Mapped[int] = mapped_column(Integer, primary_key=True)
+    
+    channel: Mapped[str] = mapped_column(String(255), nullable=False)
+    type: Mapped[str] = mapped_column(String(32), nullable=False)
+    value: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    task_path: Mapped[str] = mapped_column(String(255), default="")
+
 # ============================================================================
 # Integration Models
 # ============================================================================
@@ -14,7 +14,8 @@ from werkzeug.utils import secure_filename
 # Add the parent directory to the path to import the existing modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core import call_gemini, process_file_content, process_zip_file, SUPPORTED_FILES
+from core import call_gemini, comment_files, process_file_content, process_zip_file, SUPPORTED_FILES
+from ingestion import is_archive_filename
 from github_integration import GitHubIntegration
 from code_quality import CodeQualityAnalyzer
 from dotenv import load_dotenv
@@ -38,6 +39,8 @@ github_integrations = {}
 code_analyzer = CodeQualityAnalyzer(gemini_api_key=GEMINI_API_KEY)
 
 def allowed_file(filename):
+    if is_archive_filename(filename):
+        return True
     if '.' not in filename:
         return False
     file_ext = filename.rsplit('.', 1)[1].lower()
@@ -70,8 +73,8 @@ def generate_documentation():
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
                 
-                if filename.endswith('.zip'):
-                    # Handle zip file
+                if is_archive_filename(filename):
+                    # Handle zip / tar.gz archive
                     zip_content = process_zip_file(file)
                     file_content.update(zip_content)
                 else:
@@ -107,18 +110,14 @@ def generate_documentation():
             })
         
         else:  # Comments
-            commented_files = {}
-            for file_name, content in file_content.items():
-                commented_content = call_gemini(
-                    {file_name: content},
-                    "comment",
-                    False,
-                    file_name,
-                    custom_instructions,
-                    GEMINI_API_KEY,
-                    GEMINI_API_URL
-                )
-                commented_files[file_name] = commented_content
+            # Comment files in parallel (small files batched per request);
+            # a failing file keeps its original content
+            commented_files = comment_files(
+                file_content,
+                custom_instructions,
+                GEMINI_API_KEY,
+                GEMINI_API_URL
+            )
             
             # Return the first file for preview, but store all files
             first_file = next(iter(commented_files))
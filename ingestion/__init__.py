@@ -0,0 +1,22 @@
+"""Tekshila Ingestion Package"""
+
+from .archive import (
+    iter_archive,
+    is_archive_filename,
+    IngestionLimits,
+    IngestionStats,
+    ArchiveLimitError,
+    ARCHIVE_EXTENSIONS
+)
+from .filters import FileFilter, build_default_filter
+
+__all__ = [
+    "iter_archive",
+    "is_archive_filename",
+    "IngestionLimits",
+    "IngestionStats",
+    "ArchiveLimitError",
+    "ARCHIVE_EXTENSIONS",
+    "FileFilter",
+    "build_default_filter"
+]
@@ -0,0 +1,322 @@
+"""
+Archive Ingestion Engine
+Streams source files out of uploaded .zip / .tar.gz archives without extracting to disk
+"""
+
+from typing import Iterator, Tuple, Optional, Iterable, Any, BinaryIO
+from dataclasses import dataclass, field
+import io
+import os
+import posixpath
+import tarfile
+import tempfile
+import zipfile
+import logging
+
+from .filters import FileFilter
+
+logger = logging.getLogger(__name__)
+
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar.gz", ".tgz", ".tar")
+ARCHIVE_EXTENSIONS = ZIP_EXTENSIONS + TAR_EXTENSIONS
+
+# Uploads larger than this are spooled to a temp file instead of held in RAM
+SPOOL_MAX_MEMORY = 32 * 1024 * 1024
+# Individual skipped paths kept for the upload report (counts are always complete)
+MAX_SKIPPED_REPORTED = 1000
+
+# ============================================================================
+# Limits
+# ============================================================================
+
+class ArchiveLimitError(ValueError):
+    """Raised when an archive exceeds the configured ingestion limits"""
+    pass
+
+@dataclass
+class IngestionLimits:
+    """Resource limits applied to a single archive"""
+    max_file_size: int = 1024 * 1024  # Per-member uncompressed size (1MB)
+    max_total_bytes: int = int(os.getenv("MAX_ARCHIVE_UNCOMPRESSED_MB", "200")) * 1024 * 1024
+    max_members: int = int(os.getenv("MAX_ARCHIVE_MEMBERS", "20000"))
+
+@dataclass
+class IngestionStats:
+    """Counters collected while walking an archive"""
+    members_seen: int = 0
+    files_selected: int = 0
+    bytes_read: int = 0
+    skipped: dict = field(default_factory=dict)  # reason -> count
+    skipped_files: list = field(default_factory=list)  # [(path, reason)], capped
+
+    def skip(self, reason: str, path: Optional[str] = None):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        if path is not None and len(self.skipped_files) < MAX_SKIPPED_REPORTED:
+            self.skipped_files.append((path, reason))
+
+    def report(self) -> dict:
+        """Summary of what was kept and what was skipped, and why"""
+        return {
+            "members_seen": self.members_seen,
+            "files_selected": self.files_selected,
+            "bytes_read": self.bytes_read,
+            "skipped": dict(self.skipped),
+            "skipped_files": [{"path": path, "reason": reason} for path, reason in self.skipped_files]
+        }
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+def is_archive_filename(filename: str) -> bool:
+    """Check whether a filename looks like a supported archive"""
+    return (filename or "").lower().endswith(ARCHIVE_EXTENSIONS)
+
+def _normalize_member_path(name: str) -> Optional[str]:
+    """Normalize an archive member name; returns None for unsafe paths"""
+    name = name.replace("\\", "/")
+    path = posixpath.normpath(name)
+    if path.startswith("/") or path == "." or path.startswith("../") or path == "..":
+        return None
+    return path
+
+def _is_hidden(path: str) -> bool:
+    return any(part.startswith('.') for part in path.split('/'))
+
+def _extension(path: str) -> str:
+    filename = path.rsplit('/', 1)[-1]
+    return filename.split('.')[-1].lower() if '.' in filename else ''
+
+def _is_reportable(reason: str) -> bool:
+    # Extension and hidden-path skips are routine and would flood the report
+    return reason not in ("hidden", "unsupported_extension")
+
+def _skip_reason(path: Optional[str], size: int, extensions: Optional[Iterable[str]],
+                 limits: IngestionLimits) -> Optional[str]:
+    """Decide from metadata alone whether a member should be skipped"""
+    if path is None:
+        return "unsafe_path"
+    if _is_hidden(path):
+        return "hidden"
+    if extensions is not None and _extension(path) not in extensions:
+        return "unsupported_extension"
+    if size > limits.max_file_size:
+        return "too_large"
+    return None
+
+def _decode(data: bytes) -> Optional[str]:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        # Binary or non-UTF-8 content is skipped, as before
+        return None
+
+def _open_source(source: Any) -> Tuple[BinaryIO, bool]:
+    """
+    Turn an upload into a seekable binary stream.
+
+    Accepts a filesystem path, raw bytes, an object with getvalue() (Streamlit),
+    or any readable file object (FastAPI UploadFile.file, Flask FileStorage).
+    Returns (stream, should_close).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb"), True
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source), True
+    if hasattr(source, "getvalue"):
+        return io.BytesIO(source.getvalue()), True
+
+    stream = getattr(source, "stream", source)  # Werkzeug FileStorage wraps its stream
+    if hasattr(stream, "seekable") and stream.seekable():
+        stream.seek(0)
+        return stream, False
+
+    # Non-seekable stream: spool it so zip central directory lookups work
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    while True:
+        chunk = stream.read(1024 * 1024)
+        if not chunk:
+            break
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled, True
+
+# ============================================================================
+# Format-specific walkers
+# ============================================================================
+
+def _iter_zip(stream: BinaryIO, extensions, limits: IngestionLimits,
+              stats: IngestionStats, file_filter: Optional[FileFilter]) -> Iterator[Tuple[str, str]]:
+    with zipfile.ZipFile(stream, 'r') as zf:
+        infos = zf.infolist()
+        if len(infos) > limits.max_members:
+            raise ArchiveLimitError(
+                f"Archive has {len(infos)} members (limit {limits.max_members})"
+            )
+
+        # .gitignore / .gitattributes must be known before any member is selected
+        if file_filter is not None:
+            for info in infos:
+                path = _normalize_member_path(info.filename)
+                if (path and not info.is_dir() and FileFilter.is_metadata_file(path)
+                        and info.file_size <= limits.max_file_size):
+                    with zf.open(info) as member:
+                        text = _decode(member.read(limits.max_file_size))
+                    if text is not None:
+                        file_filter.add_metadata_file(path, text)
+
+        # Select members from the central directory before decompressing anything
+        selected = []
+        for info in infos:
+            stats.members_seen += 1
+            if info.is_dir():
+                continue
+            path = _normalize_member_path(info.filename)
+            reason = _skip_reason(path, info.file_size, extensions, limits)
+            if not reason and file_filter is not None:
+                reason = file_filter.path_reason(path, info.file_size)
+            if reason:
+                stats.skip(reason, path if _is_reportable(reason) else None)
+                continue
+            selected.append((path, info))
+
+        declared_total = sum(info.file_size for _, info in selected)
+        if declared_total > limits.max_total_bytes:
+            raise ArchiveLimitError(
+                f"Archive expands to {declared_total} bytes (limit {limits.max_total_bytes})"
+            )
+
+        for path, info in selected:
+            with zf.open(info) as member:
+                # Never trust the declared size: cap the read
+                data = member.read(limits.max_file_size + 1)
+            if len(data) > limits.max_file_size:
+                stats.skip("too_large", path)
+                continue
+            stats.bytes_read += len(data)
+            if stats.bytes_read > limits.max_total_bytes:
+                raise ArchiveLimitError(
+                    f"Archive exceeded {limits.max_total_bytes} uncompressed bytes"
+                )
+            text = _decode(data)
+            if text is None:
+                stats.skip("binary", path)
+                continue
+            if file_filter is not None:
+                reason = file_filter.content_reason(path, text)
+                if reason:
+                    stats.skip(reason, path)
+                    continue
+            stats.files_selected += 1
+            yield path, text
+
+def _iter_tar(stream: BinaryIO, extensions, limits: IngestionLimits,
+              stats: IngestionStats, file_filter: Optional[FileFilter]) -> Iterator[Tuple[str, str]]:
+    # A tar stream has no index, so .gitignore / .gitattributes may arrive after the
+    # files they govern. With a filter, candidates are held (already bounded by the
+    # total-bytes limit) until the whole stream has been read.
+    pending = []
+    # "r|*" reads sequentially with transparent compression detection
+    with tarfile.open(fileobj=stream, mode="r|*") as tf:
+        for member in tf:
+            stats.members_seen += 1
+            if stats.members_seen > limits.max_members:
+                raise ArchiveLimitError(
+                    f"Archive has more than {limits.max_members} members"
+                )
+            if not member.isfile():
+                continue
+            path = _normalize_member_path(member.name)
+            if (file_filter is not None and path and FileFilter.is_metadata_file(path)
+                    and member.size <= limits.max_file_size):
+                fileobj = tf.extractfile(member)
+                text = _decode(fileobj.read(limits.max_file_size)) if fileobj else None
+                if text is not None:
+                    file_filter.add_metadata_file(path, text)
+            reason = _skip_reason(path, member.size, extensions, limits)
+            if reason:
+                stats.skip(reason, path if _is_reportable(reason) else None)
+                continue
+
+            fileobj = tf.extractfile(member)
+            if fileobj is None:
+                continue
+            # Never trust the declared size: cap the read
+            data = fileobj.read(limits.max_file_size + 1)
+            if len(data) > limits.max_file_size:
+                stats.skip("too_large", path)
+                continue
+            stats.bytes_read += len(data)
+            if stats.bytes_read > limits.max_total_bytes:
+                raise ArchiveLimitError(
+                    f"Archive exceeded {limits.max_total_bytes} uncompressed bytes"
+                )
+            text = _decode(data)
+            if text is None:
+                stats.skip("binary", path)
+                continue
+            if file_filter is None:
+                stats.files_selected += 1
+                yield path, text
+            else:
+                pending.append((path, len(data), text))
+
+    for path, size, text in pending:
+        reason = file_filter.path_reason(path, size) or file_filter.content_reason(path, text)
+        if reason:
+            stats.skip(reason, path)
+            continue
+        stats.files_selected += 1
+        yield path, text
+
+# ============================================================================
+# Public API
+# ============================================================================
+
+def iter_archive(
+    source: Any,
+    extensions: Optional[Iterable[str]] = None,
+    limits: Optional[IngestionLimits] = None,
+    stats: Optional[IngestionStats] = None,
+    file_filter: Optional[FileFilter] = None
+) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (path, text) pairs for the selected members of a zip or tar archive.
+
+    Members are filtered on extension, declared size and hidden path before any
+    data is decompressed. With a FileFilter, the archive's own .gitignore and
+    .gitattributes are honored and vendored, minified and generated files are
+    skipped as well; every skip is counted in stats. Raises ArchiveLimitError when the archive exceeds the
+    member-count or total-uncompressed-size limits.
+
+    Args:
+        source: Path, bytes or file object holding the archive
+        extensions: Allowed lowercase extensions (None allows everything)
+        limits: Resource limits (defaults to IngestionLimits())
+        stats: Optional IngestionStats to collect counters into
+        file_filter: Optional FileFilter for smart file selection
+    """
+    limits = limits or IngestionLimits()
+    stats = stats if stats is not None else IngestionStats()
+    if extensions is not None:
+        extensions = set(extensions)
+
+    stream, should_close = _open_source(source)
+    try:
+        if zipfile.is_zipfile(stream):
+            stream.seek(0)
+            yield from _iter_zip(stream, extensions, limits, stats, file_filter)
+        else:
+            stream.seek(0)
+            try:
+                yield from _iter_tar(stream, extensions, limits, stats, file_filter)
+            except tarfile.ReadError as e:
+                raise ValueError(f"Unsupported or corrupt archive: {e}")
+    finally:
+        logger.debug(
+            "Archive ingested: %d members, %d files, %d bytes, skipped=%s",
+            stats.members_seen, stats.files_selected, stats.bytes_read, stats.skipped
+        )
+        if should_close:
+            stream.close()
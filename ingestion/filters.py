@@ -0,0 +1,282 @@
+"""
+Smart File Selection
+Honors .gitignore / .gitattributes (linguist-generated, linguist-vendored) and skips
+vendored, minified and generated files before anything is sent to the LLM
+"""
+
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+import math
+import os
+import posixpath
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+IGNORE_FILES = (".gitignore",)
+ATTRIBUTE_FILES = (".gitattributes",)
+
+VENDOR_DIRS = {
+    "node_modules", "bower_components", "jspm_packages", "vendor", "vendors",
+    "third_party", "thirdparty", "third-party", "site-packages", "venv", "Pods"
+}
+BUILD_DIRS = {
+    "dist", "build", "out", "target", "coverage", "__pycache__", ".next", ".nuxt",
+    "htmlcov", ".tox", ".gradle", "obj"
+}
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+    "composer.lock", "Gemfile.lock", "Cargo.lock", "poetry.lock", "Pipfile.lock",
+    "go.sum", "packages.lock.json", "flake.lock"
+}
+GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".min.mjs", ".bundle.js", ".chunk.js", ".map",
+    "_pb2.py", "_pb2_grpc.py", ".pb.go", ".pb.cc", ".pb.h", ".g.dart", ".freezed.dart",
+    ".designer.cs", ".generated.cs", ".generated.ts", ".generated.js", ".d.ts.map"
+)
+DATA_EXTENSIONS = {"json", "xml", "yml", "yaml", "txt", "csv", "sql"}
+
+GENERATED_MARKERS = re.compile(
+    r"@generated|auto-?generated|do not edit|code generated by|"
+    r"this file (?:is|was) (?:automatically )?generated|generated by the protocol buffer compiler",
+    re.IGNORECASE
+)
+
+MAX_DATA_FILE_BYTES = int(os.getenv("INGESTION_MAX_DATA_FILE_KB", "256")) * 1024
+
+# ============================================================================
+# Git pattern matching
+# ============================================================================
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore-style glob (relative, no leading '/') into a regex"""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape("["))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+class GitPattern:
+    """One gitignore/gitattributes pattern, scoped to the directory of its file"""
+
+    __slots__ = ("base", "negated", "dir_only", "regex")
+
+    def __init__(self, base: str, pattern: str, allow_negation: bool = True):
+        self.base = base.strip("/")
+        self.negated = False
+        if allow_negation and pattern.startswith("!"):
+            self.negated = True
+            pattern = pattern[1:]
+        elif pattern.startswith("\\!") or pattern.startswith("\\#"):
+            pattern = pattern[1:]
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+        self.regex = re.compile("^" + prefix + _translate_glob(pattern) + "$")
+
+    def matches(self, path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not path.startswith(self.base + "/"):
+                return False
+            path = path[len(self.base) + 1:]
+        return bool(self.regex.match(path))
+
+def _pattern_lines(text: str):
+    for raw in text.splitlines():
+        line = raw.rstrip("\r")
+        # Trailing spaces are ignored unless escaped
+        if not line.endswith("\\ "):
+            line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        yield line
+
+# ============================================================================
+# File Filter
+# ============================================================================
+
+class FileFilter:
+    """
+    Decides which ingested files are worth sending to the LLM.
+
+    path_reason() uses only the path (so archive members can be skipped before
+    they are decompressed); content_reason() applies minified / generated /
+    high-entropy heuristics to decoded text. Both return a skip reason or None.
+    """
+
+    def __init__(self, use_default_rules: bool = True):
+        self.use_default_rules = use_default_rules
+        self._ignore: List[Tuple[int, GitPattern]] = []  # (depth, pattern)
+        self._attributes: List[Tuple[int, GitPattern, Dict[str, bool]]] = []
+
+    @staticmethod
+    def is_metadata_file(path: str) -> bool:
+        return posixpath.basename(path) in IGNORE_FILES + ATTRIBUTE_FILES
+
+    def add_metadata_file(self, path: str, text: str):
+        """Register a .gitignore or .gitattributes found in the upload"""
+        base = posixpath.dirname(path)
+        depth = len([p for p in base.split("/") if p])
+        name = posixpath.basename(path)
+        if name in IGNORE_FILES:
+            for line in _pattern_lines(text):
+                self._ignore.append((depth, GitPattern(base, line)))
+        elif name in ATTRIBUTE_FILES:
+            for line in _pattern_lines(text):
+                parts = line.split()
+                if len(parts) < 2:
+                    continue
+                attrs = self._parse_attributes(parts[1:])
+                if attrs:
+                    self._attributes.append(
+                        (depth, GitPattern(base, parts[0], allow_negation=False), attrs)
+                    )
+        # Deeper files take precedence; stable sort keeps line order within a file
+        self._ignore.sort(key=lambda item: item[0])
+        self._attributes.sort(key=lambda item: item[0])
+
+    @staticmethod
+    def _parse_attributes(tokens: List[str]) -> Dict[str, bool]:
+        attrs = {}
+        for token in tokens:
+            value = True
+            if token.startswith("-") or token.startswith("!"):
+                token, value = token[1:], False
+            elif "=" in token:
+                token, raw = token.split("=", 1)
+                value = raw.lower() not in ("false", "0", "no")
+            if token in ("linguist-generated", "linguist-vendored"):
+                attrs[token] = value
+        return attrs
+
+    # -- path rules ------------------------------------------------------------
+
+    def _is_ignored(self, path: str) -> bool:
+        parts = path.split("/")
+        # A file inside an ignored directory cannot be re-included
+        for i in range(1, len(parts)):
+            if self._match_ignore("/".join(parts[:i]), is_dir=True):
+                return True
+        return self._match_ignore(path, is_dir=False)
+
+    def _match_ignore(self, path: str, is_dir: bool) -> bool:
+        ignored = False
+        for _, pattern in self._ignore:
+            if pattern.matches(path, is_dir):
+                ignored = not pattern.negated
+        return ignored
+
+    def _attribute(self, path: str, name: str) -> Optional[bool]:
+        value = None
+        for _, pattern, attrs in self._attributes:
+            if name in attrs and pattern.matches(path, is_dir=False):
+                value = attrs[name]
+        return value
+
+    def path_reason(self, path: str, size: Optional[int] = None) -> Optional[str]:
+        if self._ignore and self._is_ignored(path):
+            return "gitignored"
+
+        generated = self._attribute(path, "linguist-generated")
+        vendored = self._attribute(path, "linguist-vendored")
+        if generated:
+            return "linguist_generated"
+        if vendored:
+            return "linguist_vendored"
+        if not self.use_default_rules:
+            return None
+
+        parts = path.split("/")
+        name = parts[-1]
+        # An explicit linguist-*=false overrides the built-in heuristics
+        if vendored is None and any(part in VENDOR_DIRS for part in parts[:-1]):
+            return "vendored"
+        if generated is None:
+            if any(part in BUILD_DIRS for part in parts[:-1]):
+                return "build_output"
+            if name in LOCKFILE_NAMES:
+                return "lockfile"
+            if name.lower().endswith(GENERATED_SUFFIXES):
+                return "generated_name"
+        extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+        if size is not None and extension in DATA_EXTENSIONS and size > MAX_DATA_FILE_BYTES:
+            return "large_data_file"
+        return None
+
+    # -- content rules ---------------------------------------------------------
+
+    def content_reason(self, path: str, text: str) -> Optional[str]:
+        if not self.use_default_rules or self._attribute(path, "linguist-generated") is False:
+            return None
+        if looks_minified(text):
+            return "minified"
+        if GENERATED_MARKERS.search(text[:1500]):
+            return "generated_header"
+        if looks_encoded(text):
+            return "high_entropy"
+        return None
+
+def looks_minified(text: str) -> bool:
+    """Very long lines with little line structure"""
+    if len(text) < 2000:
+        return False
+    lines = text.split("\n")
+    longest = max(len(line) for line in lines)
+    average = len(text) / len(lines)
+    return longest > 1000 and average > 300
+
+def shannon_entropy(sample: str) -> float:
+    counts = Counter(sample)
+    total = len(sample)
+    return -sum(c / total * math.log2(c / total) for c in counts.values())
+
+def looks_encoded(text: str) -> bool:
+    """Embedded base64/hex blobs: high character entropy and almost no whitespace"""
+    if len(text) < 4096:
+        return False
+    sample = text[:65536]
+    whitespace = sum(1 for ch in sample if ch.isspace()) / len(sample)
+    return whitespace < 0.02 and shannon_entropy(sample) > 5.0
+
+def build_default_filter() -> Optional[FileFilter]:
+    """Filter used by the upload paths; INGESTION_SMART_FILTER=false disables it"""
+    if os.getenv("INGESTION_SMART_FILTER", "true").lower() != "true":
+        return None
+    return FileFilter()
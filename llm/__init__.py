@@ -0,0 +1,27 @@
+"""Tekshila LLM Client Package"""
+
+from .cache import (
+    ResponseCache,
+    MemoryLRUCache,
+    SQLiteCache,
+    RedisCache,
+    make_cache_key,
+    get_response_cache
+)
+from .client import (
+    get_http_client,
+    init_http_client,
+    close_http_client
+)
+
+__all__ = [
+    "ResponseCache",
+    "MemoryLRUCache",
+    "SQLiteCache",
+    "RedisCache",
+    "make_cache_key",
+    "get_response_cache",
+    "get_http_client",
+    "init_http_client",
+    "close_http_client"
+]
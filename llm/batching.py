@@ -0,0 +1,143 @@
+"""
+Multi-file Batch Packing for Comment Generation
+Packs small files into one request with per-file delimiters and splits the response back out
+"""
+
+from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass
+import os
+import re
+import logging
+
+from .planner import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+# Files at or below this size are eligible for batching
+BATCH_MAX_FILE_TOKENS = int(os.getenv("COMMENT_BATCH_MAX_FILE_TOKENS", "1500"))
+# Budget for the code of all files in one batch (output is roughly the same size again)
+BATCH_MAX_TOKENS = int(os.getenv("COMMENT_BATCH_MAX_TOKENS", "12000"))
+BATCH_MAX_FILES = int(os.getenv("COMMENT_BATCH_MAX_FILES", "20"))
+
+_SECTION_PATTERN = re.compile(
+    r"<<<FILE (\d+)>>>[^\n]*\n(.*?)\n?<<<END FILE \1>>>", re.DOTALL
+)
+_FENCE_PATTERN = re.compile(r"^\s*```[\w+-]*\n(.*?)\n?```\s*$", re.DOTALL)
+_WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|[^\sA-Za-z0-9_]")
+
+@dataclass
+class BatchPlan:
+    """Which files are sent together and which go out individually"""
+    batches: List[List[str]]
+    singles: List[str]
+
+    @property
+    def request_count(self) -> int:
+        return len(self.batches) + len(self.singles)
+
+def plan_comment_batches(
+    files: Dict[str, str],
+    max_file_tokens: Optional[int] = None,
+    max_batch_tokens: Optional[int] = None,
+    max_batch_files: Optional[int] = None
+) -> BatchPlan:
+    """Group small files into batches under the token and file-count limits"""
+    max_file_tokens = max_file_tokens or BATCH_MAX_FILE_TOKENS
+    max_batch_tokens = max_batch_tokens or BATCH_MAX_TOKENS
+    max_batch_files = max_batch_files or BATCH_MAX_FILES
+    counter = get_token_counter()
+
+    batches: List[List[str]] = []
+    singles: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for filename, content in files.items():
+        tokens = counter.count(content)
+        if tokens > max_file_tokens:
+            singles.append(filename)
+            continue
+        if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_files):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(filename)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+
+    # A batch of one gains nothing over an individual request
+    for batch in [b for b in batches if len(b) == 1]:
+        batches.remove(batch)
+        singles.extend(batch)
+    return BatchPlan(batches=batches, singles=singles)
+
+def build_comment_batch_prompt(
+    files: Dict[str, str],
+    languages: Dict[str, str],
+    custom_instructions: str = ""
+) -> str:
+    """One prompt for several files, each wrapped in numbered delimiters"""
+    sections = []
+    for index, (filename, content) in enumerate(files.items(), start=1):
+        sections.append(
+            f"<<<FILE {index}>>> {filename} ({languages.get(filename, 'Unknown')})\n{content}\n<<<END FILE {index}>>>"
+        )
+    prompt = (
+        "You are an AI assistant. Add comments to each of the following source files.\n"
+        "Return every file, commented, wrapped in exactly the same delimiter lines as the input "
+        "(\"<<<FILE n>>> path\" before and \"<<<END FILE n>>>\" after). Keep the code itself unchanged, "
+        "do not use Markdown code fences and do not add any text outside the delimiters."
+    )
+    if custom_instructions:
+        prompt += f"\n\nAdditional instructions: {custom_instructions}"
+    return prompt + "\n\n" + "\n\n".join(sections)
+
+def _code_coverage(original: str, commented: str) -> float:
+    """Share of the original's tokens still present in the commented version"""
+    original_words = _WORD_PATTERN.findall(original)
+    if not original_words:
+        return 1.0
+    remaining: Dict[str, int] = {}
+    for word in _WORD_PATTERN.findall(commented):
+        remaining[word] = remaining.get(word, 0) + 1
+    kept = 0
+    for word in original_words:
+        if remaining.get(word, 0) > 0:
+            remaining[word] -= 1
+            kept += 1
+    return kept / len(original_words)
+
+def split_comment_batch_response(
+    files: Dict[str, str],
+    text: str,
+    min_coverage: float = 0.9
+) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Split a batch response back into per-file outputs.
+
+    Returns (results, failed) where failed lists files whose section is
+    missing, duplicated, empty, or dropped too much of the original code.
+    """
+    names = list(files)
+    found: Dict[int, List[str]] = {}
+    for match in _SECTION_PATTERN.finditer(text):
+        found.setdefault(int(match.group(1)), []).append(match.group(2))
+
+    results: Dict[str, str] = {}
+    failed: List[str] = []
+    for index, filename in enumerate(names, start=1):
+        bodies = found.get(index, [])
+        if len(bodies) != 1:
+            failed.append(filename)
+            continue
+        body = bodies[0]
+        fenced = _FENCE_PATTERN.match(body)
+        if fenced:
+            body = fenced.group(1)
+        if not body.strip() or _code_coverage(files[filename], body) < min_coverage:
+            failed.append(filename)
+            continue
+        results[filename] = body
+
+    if failed:
+        logger.info(f"Batch response incomplete for {len(failed)}/{len(names)} files; falling back")
+    return results, failed
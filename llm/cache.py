@@ -0,0 +1,365 @@
+"""
+LLM Response Cache
+Content-addressed cache for Gemini responses with an in-process LRU tier
+and a persistent tier (SQLite file or Redis)
+"""
+
+from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from dataclasses import dataclass
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Keys & Stats
+# ============================================================================
+
+def make_cache_key(api_url: str, prompt: str, purpose: str) -> str:
+    """SHA-256 over (model URL, final prompt, purpose)"""
+    digest = hashlib.sha256()
+    for part in (api_url or "", purpose or "", prompt or ""):
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") != ("a", "bc")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+# ============================================================================
+# Cache Tiers
+# ============================================================================
+
+class MemoryLRUCache:
+    """In-process LRU tier bounded by entry count and total bytes"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            expires_at = time.time() + ttl if ttl else None
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            self.stats.sets += 1
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            **self.stats.as_dict()
+        }
+
+    def _remove(self, key: str):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+class SQLiteCache:
+    """Persistent tier in a local SQLite file, bounded by total bytes"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl if ttl else None, now)
+            )
+            self.stats.sets += 1
+            self._evict(now)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            **self.stats.as_dict()
+        }
+
+    def _evict(self, now: float):
+        """Drop expired rows, then least-recently-used rows until under max_bytes"""
+        expired = self._conn.execute(
+            "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+        ).rowcount
+        self.stats.expirations += max(expired, 0)
+
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+        ).fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+        self.stats.evictions += len(doomed)
+
+class RedisCache:
+    """Persistent tier backed by Redis; eviction is left to Redis maxmemory-policy"""
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl_seconds: Optional[float] = None, prefix: str = "tekshila:llm:"):
+        import redis
+
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.stats = CacheStats()
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self.prefix + key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        self._client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+        self.stats.sets += 1
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "url": self.url, **self.stats.as_dict()}
+
+# ============================================================================
+# Tiered Cache
+# ============================================================================
+
+class ResponseCache:
+    """
+    Read-through cache over an ordered list of tiers.
+
+    Lookups go fastest tier first; a hit in a slower tier is promoted into the
+    faster ones. Tier failures are logged and treated as misses so the cache
+    never breaks a generation request.
+    """
+
+    def __init__(self, tiers: List[Any], ttl_seconds: Optional[float] = None):
+        self.tiers = tiers
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[str]:
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache tier {tier.name} get failed: {e}")
+                continue
+            if value is not None:
+                for faster in self.tiers[:index]:
+                    self._safe_set(faster, key, value)
+                self.stats.hits += 1
+                return value
+        self.stats.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        self.stats.sets += 1
+        for tier in self.tiers:
+            self._safe_set(tier, key, value)
+
+    # Async callers: SQLite reads and writes (lock, WAL fsync) and Redis round
+    # trips run on a worker thread instead of the event loop
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **self.stats.as_dict(),
+            "ttl_seconds": self.ttl_seconds,
+            "tiers": [tier.info() for tier in self.tiers]
+        }
+
+    def _safe_set(self, tier, key: str, value: str):
+        try:
+            tier.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"LLM cache tier {tier.name} set failed: {e}")
+
+def build_response_cache_from_env() -> Optional[ResponseCache]:
+    """Build the cache described by the LLM_CACHE_* environment variables"""
+    backend = os.getenv("LLM_CACHE_BACKEND", "sqlite").lower()
+    if backend in ("none", "off", "disabled", ""):
+        return None
+
+    ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))) or None
+    tiers: List[Any] = [
+        MemoryLRUCache(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+            max_bytes=int(os.getenv("LLM_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+            ttl_seconds=ttl
+        )
+    ]
+
+    try:
+        if backend == "sqlite":
+            tiers.append(SQLiteCache(
+                os.getenv("LLM_CACHE_PATH", "./.cache/llm_cache.sqlite3"),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024,
+                ttl_seconds=ttl
+            ))
+        elif backend == "redis":
+            tiers.append(RedisCache(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl_seconds=ttl))
+    except Exception as e:
+        # Keep the in-process tier even if the persistent one is unavailable
+        logger.warning(f"LLM cache backend {backend} unavailable, using memory only: {e}")
+
+    return ResponseCache(tiers, ttl_seconds=ttl)
+
+# Singleton instance
+_response_cache = None
+_response_cache_initialized = False
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get or create the process-wide response cache (None when disabled)"""
+    global _response_cache, _response_cache_initialized
+    if not _response_cache_initialized:
+        _response_cache = build_response_cache_from_env()
+        _response_cache_initialized = True
+    return _response_cache
@@ -0,0 +1,76 @@
+"""
+Shared Async HTTP Client for Gemini
+One pooled, keep-alive httpx.AsyncClient per process, opened and closed in the app lifespan
+"""
+
+from typing import Optional
+import os
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def build_http_client(
+    timeout: Optional[float] = None,
+    connect_timeout: Optional[float] = None,
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    http2: Optional[bool] = None
+) -> httpx.AsyncClient:
+    """Create a pooled AsyncClient configured from arguments or GEMINI_HTTP_* env vars"""
+    timeout = timeout if timeout is not None else float(os.getenv("GEMINI_HTTP_TIMEOUT", "60"))
+    connect_timeout = connect_timeout if connect_timeout is not None else float(
+        os.getenv("GEMINI_HTTP_CONNECT_TIMEOUT", "10")
+    )
+    max_connections = max_connections or int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "200"))
+    max_keepalive_connections = max_keepalive_connections or int(
+        os.getenv("GEMINI_HTTP_MAX_KEEPALIVE", "50")
+    )
+    if http2 is None:
+        http2 = os.getenv("GEMINI_HTTP2", "true").lower() == "true"
+    if http2 and not _http2_available():
+        logger.warning("h2 not installed; Gemini client falling back to HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY", "30"))
+        ),
+        headers={"Content-Type": "application/json"}
+    )
+
+# Singleton instance
+_http_client: Optional[httpx.AsyncClient] = None
+
+async def init_http_client(**kwargs) -> httpx.AsyncClient:
+    """Create the shared client (call from the app lifespan startup)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client(**kwargs)
+    return _http_client
+
+async def close_http_client():
+    """Close the shared client and its pooled connections (lifespan shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared client, creating it lazily outside of an app lifespan"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+    return _http_client
@@ -0,0 +1,220 @@
+"""
+Single-flight Request Coalescing
+Identical in-flight requests share one upstream call; all waiters receive the same result
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+def fingerprint(*parts: Any) -> str:
+    """Stable SHA-256 fingerprint of JSON-serializable parts"""
+    encoded = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+# ============================================================================
+# In-process coalescing
+# ============================================================================
+
+class SingleFlight:
+    """
+    Async single-flight group.
+
+    The first caller for a key runs the work; concurrent callers with the same
+    key await the same task. The shared task is shielded, so one waiter being
+    cancelled (e.g. a client disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def info(self) -> Dict[str, Any]:
+        return {"inflight": len(self._inflight), "leaders": self.leaders, "followers": self.followers}
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class ThreadSingleFlight:
+    """Blocking single-flight group for sync callers running on threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._inflight[key] = call
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def info(self) -> Dict[str, Any]:
+        return {"inflight": len(self._inflight), "leaders": self.leaders, "followers": self.followers}
+
+# ============================================================================
+# Cross-worker coalescing (Redis)
+# ============================================================================
+
+class RedisSingleFlight:
+    """
+    Coalesce identical requests across uvicorn workers with a Redis lock.
+
+    The worker that wins SET NX on the lock runs the call and publishes the
+    JSON-encoded result under a short-lived result key; the others poll for it.
+    If the leader's lock expires or is released without a result (it failed or
+    died), a follower takes over and runs the call itself.
+    """
+
+    def __init__(self, url: str, lock_ttl_seconds: float = 120, result_ttl_seconds: float = 30,
+                 poll_interval: float = 0.1, prefix: str = "tekshila:singleflight:"):
+        import redis.asyncio as aioredis
+
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._client = aioredis.Redis.from_url(url)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Redis errors before fn() runs fall back to running it locally; once
+        fn() has returned, its result is returned even if publishing it or
+        releasing the lock fails, so the call never runs twice.
+        """
+        from redis.exceptions import RedisError
+
+        lock_key = f"{self.prefix}lock:{key}"
+        result_key = f"{self.prefix}result:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ttl_seconds
+
+        while True:
+            try:
+                cached = await self._client.get(result_key)
+                if cached is not None:
+                    return json.loads(cached)
+                leader = await self._client.set(lock_key, token, nx=True, px=int(self.lock_ttl_seconds * 1000))
+            except RedisError as e:
+                logger.warning(f"Cross-worker coalescing unavailable, running locally: {e}")
+                return await fn()
+
+            if leader:
+                try:
+                    result = await fn()
+                except BaseException:
+                    await self._release(lock_key, token)
+                    raise
+                # Publish before releasing, so followers never see the lock gone without a result
+                await self._publish(result_key, result)
+                await self._release(lock_key, token)
+                return result
+
+            if time.monotonic() > deadline:
+                # Leader is stuck beyond the lock TTL; stop waiting and run locally
+                return await fn()
+            await asyncio.sleep(self.poll_interval)
+
+    async def _publish(self, result_key: str, result: Any):
+        from redis.exceptions import RedisError
+
+        try:
+            await self._client.set(result_key, json.dumps(result), px=int(self.result_ttl_seconds * 1000))
+        except (RedisError, TypeError, ValueError) as e:
+            # Followers take over once the lock is released or expires
+            logger.warning(f"Publishing coalesced result failed: {e}")
+
+    async def _release(self, lock_key: str, token: str):
+        from redis.exceptions import RedisError
+
+        try:
+            # Release only our own lock
+            if await self._client.get(lock_key) == token.encode():
+                await self._client.delete(lock_key)
+        except RedisError as e:
+            logger.warning(f"Releasing coalescing lock failed, it expires on its own: {e}")
+
+class CoalescingGroup:
+    """In-process single-flight, optionally layered over a cross-worker Redis lock"""
+
+    def __init__(self, redis_flight: Optional[RedisSingleFlight] = None):
+        self.local = SingleFlight()
+        self.redis = redis_flight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.redis is None:
+            return await self.local.do(key, fn)
+        return await self.local.do(key, lambda: self.redis.do(key, fn))
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.local.info(), "cross_worker": self.redis is not None}
+
+# Singleton instances
+_coalescing_group = None
+_thread_single_flight = ThreadSingleFlight()
+
+def get_coalescing_group() -> CoalescingGroup:
+    """Get or create the process-wide async coalescing group"""
+    global _coalescing_group
+    if _coalescing_group is None:
+        redis_flight = None
+        redis_url = os.getenv("LLM_COALESCE_REDIS_URL")
+        if redis_url:
+            try:
+                redis_flight = RedisSingleFlight(redis_url)
+            except Exception as e:
+                logger.warning(f"Redis coalescing disabled: {e}")
+        _coalescing_group = CoalescingGroup(redis_flight)
+    return _coalescing_group
+
+def get_thread_single_flight() -> ThreadSingleFlight:
+    """Get the process-wide single-flight group for sync callers"""
+    return _thread_single_flight
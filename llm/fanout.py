@@ -0,0 +1,133 @@
+"""
+Bounded-Concurrency Fan-out for Multi-file Generation
+Runs per-file LLM calls in parallel under a per-request and a process-wide limit
+"""
+
+from typing import Dict, Callable, Awaitable, AsyncIterator, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import weakref
+import logging
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_CONCURRENCY = int(os.getenv("GEMINI_GLOBAL_CONCURRENCY", "32"))
+REQUEST_CONCURRENCY = int(os.getenv("GEMINI_REQUEST_CONCURRENCY", "8"))
+
+# Process-wide limits shared by every request (async and threaded callers).
+# An asyncio.Semaphore binds to the loop that first waits on it, so there is
+# one per running loop (each asyncio.run in scripts, tests and subprocesses).
+_global_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_global_semaphores_lock = threading.Lock()
+_global_thread_semaphore = threading.BoundedSemaphore(GLOBAL_CONCURRENCY)
+
+def _get_global_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    with _global_semaphores_lock:
+        semaphore = _global_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _global_semaphores[loop] = asyncio.Semaphore(GLOBAL_CONCURRENCY)
+        return semaphore
+
+def comment_error_fallback(filename: str, content: str, error: Exception) -> str:
+    """Original file prefixed with an error note, used when one file fails"""
+    return f"// Error adding comments to {filename}: {str(error)}\n\n{content}"
+
+async def map_files_concurrently(
+    files: Dict[str, str],
+    worker: Callable[[str, str], Awaitable[str]],
+    limit: Optional[int] = None,
+    on_error: Callable[[str, str, Exception], str] = comment_error_fallback
+) -> Dict[str, str]:
+    """
+    Apply an async worker to every (filename, content) pair in parallel.
+
+    At most `limit` files of this request and GEMINI_GLOBAL_CONCURRENCY files
+    process-wide are in flight at once. A failing file is replaced with
+    on_error(...) instead of failing the batch, and the result preserves the
+    input order.
+    """
+    request_semaphore = asyncio.Semaphore(limit or REQUEST_CONCURRENCY)
+    global_semaphore = _get_global_semaphore()
+
+    async def run_one(filename: str, content: str) -> str:
+        async with request_semaphore:
+            async with global_semaphore:
+                try:
+                    return await worker(filename, content)
+                except Exception as e:
+                    logger.warning(f"Generation failed for {filename}: {e}")
+                    return on_error(filename, content, e)
+
+    results = await asyncio.gather(*(run_one(name, content) for name, content in files.items()))
+    return dict(zip(files.keys(), results))
+
+def map_files_threaded(
+    files: Dict[str, str],
+    worker: Callable[[str, str], Any],
+    limit: Optional[int] = None,
+    on_error: Callable[[str, str, Exception], str] = comment_error_fallback
+) -> Dict[str, str]:
+    """Blocking counterpart of map_files_concurrently for sync (Flask) handlers"""
+
+    def run_one(item):
+        filename, content = item
+        with _global_thread_semaphore:
+            try:
+                return worker(filename, content)
+            except Exception as e:
+                logger.warning(f"Generation failed for {filename}: {e}")
+                return on_error(filename, content, e)
+
+    if not files:
+        return {}
+    workers = min(limit or REQUEST_CONCURRENCY, len(files))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_one, files.items()))
+    return dict(zip(files.keys(), results))
+
+async def merge_file_streams(
+    files: Dict[str, str],
+    stream_factory: Callable[[str, str], AsyncIterator[Dict[str, Any]]],
+    limit: Optional[int] = None,
+    on_error: Callable[[str, str, Exception], str] = comment_error_fallback
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run one event stream per file concurrently and interleave their events.
+
+    Every event is tagged with its "file". Each file ends with exactly one
+    {"type": "done"} event; a failing file ends with on_error(...) as content.
+    Uses the same per-request and process-wide limits as map_files_concurrently.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    request_semaphore = asyncio.Semaphore(limit or REQUEST_CONCURRENCY)
+    global_semaphore = _get_global_semaphore()
+
+    async def pump(filename: str, content: str):
+        async with request_semaphore:
+            async with global_semaphore:
+                try:
+                    async for event in stream_factory(filename, content):
+                        await queue.put({**event, "file": filename})
+                except Exception as e:
+                    logger.warning(f"Streaming generation failed for {filename}: {e}")
+                    await queue.put({
+                        "type": "done",
+                        "file": filename,
+                        "content": on_error(filename, content, e),
+                        "error": str(e)
+                    })
+
+    tasks = [asyncio.create_task(pump(name, content)) for name, content in files.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await queue.get()
+            if event.get("type") == "done":
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
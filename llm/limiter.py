@@ -0,0 +1,399 @@
+"""
+Adaptive Rate Limiter and Retry Engine for LLM Calls
+Token bucket per API key, AIMD concurrency window, jittered exponential retry honoring Retry-After
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_STATUSES = {429, 503}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# ============================================================================
+# Retry helpers
+# ============================================================================
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server Retry-After is a lower bound"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, base)
+    return delay
+
+# ============================================================================
+# Token Bucket
+# ============================================================================
+
+class TokenBucket:
+    """
+    Reservation-based token bucket usable from both threads and coroutines.
+
+    reserve() always takes a token (the balance may go negative) and returns
+    how long the caller must wait before sending, so waiting callers are served
+    in arrival order without holding the lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return min(self.burst, self._tokens + elapsed * self.rate)
+
+# ============================================================================
+# AIMD Concurrency Window
+# ============================================================================
+
+class AdaptiveLimiter:
+    """
+    Token bucket plus an AIMD concurrency window for one API key.
+
+    The window grows by ~1 slot per window's worth of successes (additive
+    increase) and halves on 429/503 (multiplicative decrease), at most once
+    per cooldown so a single burst of rejections only shrinks it once.
+    """
+
+    def __init__(self, rate: float, burst: float, initial_window: float = 8,
+                 min_window: float = 1, max_window: float = 64, decrease_factor: float = 0.5,
+                 cooldown_seconds: float = 1.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.min_window = min_window
+        self.max_window = max_window
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+
+        self._window = float(initial_window)
+        self._inflight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters = []  # (loop, future)
+
+        self.successes = 0
+        self.overloads = 0
+        self.retries = 0
+        self.failures = 0
+
+    # -- window accounting ---------------------------------------------------
+
+    def _try_take_locked(self) -> bool:
+        if self._inflight < max(int(self._window), 1):
+            self._inflight += 1
+            return True
+        return False
+
+    def _wake_locked(self):
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def acquire(self):
+        """Block until a window slot is free (sync callers)"""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._try_take_locked():
+                    self._cond.wait(timeout=1.0)
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self):
+        """Wait until a window slot is free without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_take_locked():
+                return
+            self._waiting += 1
+        try:
+            while True:
+                future = loop.create_future()
+                with self._lock:
+                    if self._try_take_locked():
+                        return
+                    self._async_waiters.append((loop, future))
+                try:
+                    await asyncio.wait_for(future, timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self):
+        with self._lock:
+            self._inflight -= 1
+            self._wake_locked()
+
+    def on_success(self):
+        with self._lock:
+            self.successes += 1
+            self._window = min(self.max_window, self._window + 1.0 / max(self._window, 1.0))
+            self._wake_locked()
+
+    def on_overload(self):
+        with self._lock:
+            self.overloads += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown_seconds:
+                self._window = max(self.min_window, self._window * self.decrease_factor)
+                self._last_decrease = now
+
+    # -- slots -----------------------------------------------------------------
+
+    @contextmanager
+    def slot(self):
+        """Rate-limited, window-bounded section for one sync request"""
+        delay = self.bucket.reserve()
+        if delay:
+            time.sleep(delay)
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Rate-limited, window-bounded section for one async request"""
+        delay = self.bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        await self.acquire_async()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window": round(self._window, 2),
+                "inflight": self._inflight,
+                "queue_depth": self._waiting,
+                "tokens_available": round(self.bucket.tokens, 2),
+                "rate_per_second": self.bucket.rate,
+                "successes": self.successes,
+                "overloads": self.overloads,
+                "retries": self.retries,
+                "failures": self.failures
+            }
+
+# ============================================================================
+# Retry Engine
+# ============================================================================
+
+class RetryPolicy:
+    def __init__(self, max_attempts: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None):
+        self.max_attempts = max_attempts or int(os.getenv("GEMINI_MAX_ATTEMPTS", "5"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "30"))
+
+def _retry_delay(policy: RetryPolicy, attempt: int, response: Any = None) -> float:
+    retry_after = None
+    if response is not None:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    return backoff_delay(attempt, policy.base_delay, policy.max_delay, retry_after)
+
+def run_with_limits(
+    api_key: str,
+    send: Callable[[], Any],
+    retry_on: Tuple[Type[BaseException], ...] = (OSError,),
+    policy: Optional[RetryPolicy] = None
+) -> Any:
+    """
+    Send a request through the key's limiter, retrying overloads and transient errors.
+
+    send() must return a response with .status_code and .headers. The final
+    response is returned whatever its status; callers keep their own handling
+    of non-200 results.
+    """
+    limiter = get_limiter(api_key)
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        try:
+            with limiter.slot():
+                response = send()
+        except retry_on as e:
+            if last_attempt:
+                limiter.failures += 1
+                raise
+            limiter.retries += 1
+            delay = _retry_delay(policy, attempt)
+            logger.warning(f"Gemini request failed ({e}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code in OVERLOAD_STATUSES:
+            limiter.on_overload()
+        elif response.status_code < 400:
+            limiter.on_success()
+            return response
+
+        if response.status_code not in RETRYABLE_STATUSES or last_attempt:
+            limiter.failures += 1
+            return response
+        limiter.retries += 1
+        delay = _retry_delay(policy, attempt, response)
+        logger.warning(f"Gemini returned {response.status_code}; retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+async def arun_with_limits(
+    api_key: str,
+    send: Callable[[], Awaitable[Any]],
+    retry_on: Tuple[Type[BaseException], ...] = (OSError,),
+    policy: Optional[RetryPolicy] = None
+) -> Any:
+    """Async counterpart of run_with_limits"""
+    limiter = get_limiter(api_key)
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        try:
+            async with limiter.aslot():
+                response = await send()
+        except retry_on as e:
+            if last_attempt:
+                limiter.failures += 1
+                raise
+            limiter.retries += 1
+            delay = _retry_delay(policy, attempt)
+            logger.warning(f"Gemini request failed ({e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code in OVERLOAD_STATUSES:
+            limiter.on_overload()
+        elif response.status_code < 400:
+            limiter.on_success()
+            return response
+
+        if response.status_code not in RETRYABLE_STATUSES or last_attempt:
+            limiter.failures += 1
+            return response
+        limiter.retries += 1
+        delay = _retry_delay(policy, attempt, response)
+        logger.warning(f"Gemini returned {response.status_code}; retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK exception (google-genai, google-api-core, httpx), if any"""
+    for attribute in ("code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    value = getattr(getattr(error, "response", None), "status_code", None)
+    return value if isinstance(value, int) else None
+
+async def ainvoke_with_limits(
+    limiter: AdaptiveLimiter,
+    call: Callable[[], Awaitable[Any]],
+    retry_on: Tuple[Type[BaseException], ...] = (OSError,),
+    policy: Optional[RetryPolicy] = None
+) -> Any:
+    """
+    arun_with_limits for SDK calls, which raise on HTTP errors instead of
+    returning a response: the status is read from the exception.
+    """
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_attempts):
+        last_attempt = attempt == policy.max_attempts - 1
+        try:
+            async with limiter.aslot():
+                result = await call()
+        except Exception as e:
+            status = error_status(e)
+            if status in OVERLOAD_STATUSES:
+                limiter.on_overload()
+            if not (status in RETRYABLE_STATUSES or isinstance(e, retry_on)) or last_attempt:
+                limiter.failures += 1
+                raise
+            limiter.retries += 1
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            delay = backoff_delay(attempt, policy.base_delay, policy.max_delay,
+                                  parse_retry_after(headers.get("Retry-After")))
+            logger.warning(f"Gemini call failed ({status or e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        limiter.on_success()
+        return result
+
+# ============================================================================
+# Registry
+# ============================================================================
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def _key_id(api_key: str) -> str:
+    # Never keep raw API keys in metrics
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+def get_limiter(api_key: str) -> AdaptiveLimiter:
+    """Get or create the shared limiter for an API key"""
+    key_id = _key_id(api_key)
+    with _limiters_lock:
+        limiter = _limiters.get(key_id)
+        if limiter is None:
+            limiter = AdaptiveLimiter(
+                rate=float(os.getenv("GEMINI_RATE_PER_SECOND", "5")),
+                burst=float(os.getenv("GEMINI_RATE_BURST", "10")),
+                initial_window=float(os.getenv("GEMINI_WINDOW_INITIAL", "8")),
+                min_window=float(os.getenv("GEMINI_WINDOW_MIN", "1")),
+                max_window=float(os.getenv("GEMINI_WINDOW_MAX", "64"))
+            )
+            _limiters[key_id] = limiter
+        return limiter
+
+def limiter_metrics() -> Dict[str, Any]:
+    """Current window, queue depth and counters for every API key"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {key_id: limiter.metrics() for key_id, limiter in limiters.items()}
@@ -0,0 +1,193 @@
+"""
+Token-budgeted Prompt Planner
+Counts tokens per file section and packs sections into chunks under a budget
+for map-reduce README generation
+"""
+
+from typing import Dict, List, Optional, Any
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+import hashlib
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Input tokens allowed in a single prompt before switching to map-reduce
+PROMPT_TOKEN_BUDGET = int(os.getenv("README_PROMPT_TOKEN_BUDGET", "120000"))
+# Expected size of each chunk summary, used to estimate the synthesis prompt
+SUMMARY_TOKEN_ESTIMATE = int(os.getenv("README_SUMMARY_TOKEN_ESTIMATE", "800"))
+
+# ============================================================================
+# Token Counting
+# ============================================================================
+
+class TokenCounter:
+    """
+    Token counter with a content-hash keyed LRU cache.
+
+    Uses tiktoken's cl100k_base encoding as an approximation of the Gemini
+    tokenizer, falling back to ~4 characters per token when unavailable.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._encoding = None
+        self._encoding_loaded = False
+
+    def _encode_len(self, text: str) -> int:
+        if not self._encoding_loaded:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+                self._encoding = None
+            self._encoding_loaded = True
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def count(self, text: str) -> int:
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        tokens = self._encode_len(text)
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return tokens
+
+# Singleton instance
+_token_counter = None
+
+def get_token_counter() -> TokenCounter:
+    """Get or create the process-wide token counter"""
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter()
+    return _token_counter
+
+# ============================================================================
+# Planning
+# ============================================================================
+
+@dataclass
+class PromptChunk:
+    """A group of file sections sent together in one map call"""
+    sections: List[str]  # section ids, in prompt order
+    tokens: int
+
+@dataclass
+class PromptPlan:
+    """Token plan for a README generation, computed before anything is sent"""
+    mode: str  # "single" or "map_reduce"
+    budget: int
+    preamble_tokens: int
+    section_tokens: Dict[str, int]
+    chunks: List[PromptChunk] = field(default_factory=list)
+
+    @property
+    def total_input_tokens(self) -> int:
+        return sum(self.section_tokens.values())
+
+    @property
+    def llm_calls(self) -> int:
+        if self.mode == "single":
+            return 1
+        return len(self.chunks) + 1  # map calls + final synthesis
+
+    @property
+    def estimated_prompt_tokens(self) -> int:
+        """Input tokens across every call in the plan"""
+        if self.mode == "single":
+            return self.preamble_tokens + self.total_input_tokens
+        map_tokens = sum(self.preamble_tokens + chunk.tokens for chunk in self.chunks)
+        reduce_tokens = self.preamble_tokens + SUMMARY_TOKEN_ESTIMATE * len(self.chunks)
+        return map_tokens + reduce_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "budget": self.budget,
+            "llm_calls": self.llm_calls,
+            "total_input_tokens": self.total_input_tokens,
+            "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            # Map calls run in parallel, so latency is ~2 sequential rounds
+            "sequential_rounds": 1 if self.mode == "single" else 2,
+            "section_tokens": self.section_tokens,
+            "chunks": [asdict(chunk) for chunk in self.chunks]
+        }
+
+def split_oversized_section(section: str, budget: int, counter: TokenCounter) -> List[str]:
+    """Split one section by lines into parts that each fit in the budget"""
+    parts, current, current_tokens = [], [], 0
+    for line in section.splitlines(keepends=True):
+        line_tokens = counter.count(line)
+        if current and current_tokens + line_tokens > budget:
+            parts.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        parts.append("".join(current))
+    return parts
+
+def plan_prompt(
+    sections: Dict[str, str],
+    preamble: str = "",
+    budget: Optional[int] = None,
+    counter: Optional[TokenCounter] = None
+) -> PromptPlan:
+    """
+    Pack rendered file sections into chunks under a token budget.
+
+    Sections are packed in the given order (callers pass them sorted by path
+    so files from the same directory land in the same chunk). If everything
+    fits in one prompt the plan is "single" and nothing changes for callers.
+    Sections larger than the budget must be split beforehand with
+    split_oversized_section.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    counter = counter or get_token_counter()
+
+    preamble_tokens = counter.count(preamble) if preamble else 0
+    section_tokens = {name: counter.count(text) for name, text in sections.items()}
+    available = max(budget - preamble_tokens, 1)
+
+    if sum(section_tokens.values()) <= available:
+        return PromptPlan(
+            mode="single",
+            budget=budget,
+            preamble_tokens=preamble_tokens,
+            section_tokens=section_tokens,
+            chunks=[PromptChunk(sections=list(sections), tokens=sum(section_tokens.values()))]
+        )
+
+    chunks: List[PromptChunk] = []
+    current: List[str] = []
+    current_tokens = 0
+    for name in sections:
+        tokens = section_tokens[name]
+        if current and current_tokens + tokens > available:
+            chunks.append(PromptChunk(sections=current, tokens=current_tokens))
+            current, current_tokens = [], 0
+        current.append(name)
+        current_tokens += tokens
+    if current:
+        chunks.append(PromptChunk(sections=current, tokens=current_tokens))
+
+    return PromptPlan(
+        mode="map_reduce",
+        budget=budget,
+        preamble_tokens=preamble_tokens,
+        section_tokens=section_tokens,
+        chunks=chunks
+    )
@@ -0,0 +1,137 @@
+"""
+Gemini Token Streaming
+Relays streamGenerateContent output as incremental text and extracts fenced code on the fly
+"""
+
+from typing import AsyncIterator, Dict, Any
+import asyncio
+import json
+import logging
+
+from httpx_sse import aconnect_sse
+
+from .client import get_http_client
+from .limiter import (
+    get_limiter, RetryPolicy, backoff_delay, parse_retry_after,
+    OVERLOAD_STATUSES, RETRYABLE_STATUSES
+)
+
+logger = logging.getLogger(__name__)
+
+def to_stream_url(api_url: str) -> str:
+    """Map a :generateContent model URL to its :streamGenerateContent twin"""
+    if api_url.endswith(":streamGenerateContent"):
+        return api_url
+    if api_url.endswith(":generateContent"):
+        return api_url[: -len(":generateContent")] + ":streamGenerateContent"
+    return api_url
+
+def sse_event(data: Dict[str, Any]) -> str:
+    """Format one server-sent event frame"""
+    return f"data: {json.dumps(data)}\n\n"
+
+async def astream_gemini_text(prompt: str, api_key: str, api_url: str) -> AsyncIterator[str]:
+    """
+    Yield text deltas from Gemini's streamGenerateContent (alt=sse) endpoint.
+
+    The stream holds a slot in the key's adaptive limiter; 429/5xx responses
+    are retried with backoff before the first delta is produced.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    limiter = get_limiter(api_key)
+    policy = RetryPolicy()
+
+    for attempt in range(policy.max_attempts):
+        retry_delay = None
+        async with limiter.aslot():
+            async with aconnect_sse(
+                get_http_client(),
+                "POST",
+                to_stream_url(api_url),
+                params={"key": api_key, "alt": "sse"},
+                json=payload
+            ) as event_source:
+                response = event_source.response
+                if response.status_code in OVERLOAD_STATUSES:
+                    limiter.on_overload()
+                if response.status_code != 200:
+                    body = await response.aread()
+                    last_attempt = attempt == policy.max_attempts - 1
+                    if response.status_code not in RETRYABLE_STATUSES or last_attempt:
+                        limiter.failures += 1
+                        raise Exception(f"Gemini API Error: {response.status_code} {body.decode('utf-8', 'replace')}")
+                    limiter.retries += 1
+                    retry_delay = backoff_delay(
+                        attempt, policy.base_delay, policy.max_delay,
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
+                else:
+                    limiter.on_success()
+                    async for event in event_source.aiter_sse():
+                        if not event.data:
+                            continue
+                        data = json.loads(event.data)
+                        for candidate in data.get("candidates", [])[:1]:
+                            for part in candidate.get("content", {}).get("parts", []):
+                                text = part.get("text")
+                                if text:
+                                    yield text
+                    return
+        logger.warning(f"Gemini stream returned {response.status_code}; retrying in {retry_delay:.2f}s")
+        await asyncio.sleep(retry_delay)
+
+class CodeBlockExtractor:
+    """
+    Incrementally extract the body of the first fenced code block.
+
+    Mirrors the non-streaming r"```[\\w]*\\n(.*?)```" extraction: feed() returns
+    the newly available code text, holding back anything that could still turn
+    out to be part of the closing fence.
+    """
+
+    FENCE = "```"
+
+    def __init__(self):
+        self.state = "before"  # before -> inside -> after
+        self._buffer = ""
+        self.found = False
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta
+        emitted = ""
+        if self.state == "before":
+            start = self._buffer.find(self.FENCE)
+            if start < 0:
+                return ""
+            newline = self._buffer.find("\n", start + len(self.FENCE))
+            if newline < 0:
+                return ""
+            language = self._buffer[start + len(self.FENCE):newline]
+            if not all(ch.isalnum() or ch == "_" for ch in language):
+                # Not an opening fence of the expected shape; keep scanning after it
+                self._buffer = self._buffer[start + len(self.FENCE):]
+                return self.feed("")
+            self._buffer = self._buffer[newline + 1:]
+            self.state = "inside"
+            self.found = True
+
+        if self.state == "inside":
+            end = self._buffer.find(self.FENCE)
+            if end >= 0:
+                emitted = self._buffer[:end]
+                self._buffer = ""
+                self.state = "after"
+            else:
+                # Hold back a trailing run of backticks that may start the closing fence
+                keep = len(self._buffer) - len(self._buffer.rstrip("`"))
+                keep = min(keep, len(self.FENCE) - 1)
+                emitted = self._buffer[: len(self._buffer) - keep]
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+        return emitted
+
+    def flush(self) -> str:
+        """Return any held-back text once the stream has ended"""
+        if self.state == "inside":
+            remainder, self._buffer = self._buffer, ""
+            return remainder
+        return ""
@@ -0,0 +1,24 @@
+"""Tekshila Retrieval Package"""
+
+from .chunking import CodeChunk, chunk_source, chunk_files
+from .embeddings import EmbeddingService, get_embedding_service
+from .index import CodeIndex, collection_name, get_code_index
+from .context import (
+    ContextAssembler, assemble_code_context, prepare_retrieval, sync_code_index, SECTION_QUERIES
+)
+
+__all__ = [
+    "CodeChunk",
+    "chunk_source",
+    "chunk_files",
+    "EmbeddingService",
+    "get_embedding_service",
+    "CodeIndex",
+    "collection_name",
+    "get_code_index",
+    "ContextAssembler",
+    "assemble_code_context",
+    "prepare_retrieval",
+    "sync_code_index",
+    "SECTION_QUERIES"
+]
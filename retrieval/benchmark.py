@@ -0,0 +1,115 @@
+"""
+Embedding Benchmark
+Compares the old per-call model construction with the long-lived embedding service
+(fp32, int8-quantized and ONNX) on the chunks of a directory or archive
+
+Usage:
+    python -m retrieval.benchmark path/to/repo [--requests 16] [--concurrency 8]
+    python -m retrieval.benchmark project.zip --modes per-call,service
+"""
+
+from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+
+from analysis.benchmark import load_sources
+from .chunking import chunk_files
+from .embeddings import EMBEDDING_MODEL, EmbeddingService, load_model
+
+MODES = {
+    "per-call": None,
+    "service": ("torch", False),
+    "service-int8": ("torch", True),
+    "service-onnx": ("onnx", False),
+    "service-onnx-int8": ("onnx", True),
+}
+# Vectors returned per mode for the agreement check against fp32
+SAMPLE_SIZE = 64
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def run_mode(mode: str, requests: List[List[str]], concurrency: int) -> Dict[str, Any]:
+    """Embed every request with one strategy; runs in a fresh process so peak RSS is its own"""
+    baseline = _peak_rss_mb()
+    texts = sum(len(request) for request in requests)
+    start = time.perf_counter()
+
+    if mode == "per-call":
+        # What vectorize_code used to do: build the model for every call
+        vectors = []
+        for request in requests:
+            model = load_model(EMBEDDING_MODEL, "torch", False)
+            vectors.extend(model.encode(request, normalize_embeddings=True).tolist())
+        service_info = None
+    else:
+        backend, quantize = MODES[mode]
+        service = EmbeddingService(EMBEDDING_MODEL, backend, quantize)
+        service.load()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(service.embed, requests))
+        vectors = [vector for result in results for vector in result]
+        service_info = service.info()
+        service.shutdown()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 3),
+        "texts_per_second": round(texts / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+        "service": service_info,
+        "sample": vectors[:SAMPLE_SIZE],
+    }
+
+def _agreement(reference: List[List[float]], other: List[List[float]]) -> float:
+    """Mean cosine similarity of normalized vectors (1.0 = identical)"""
+    pairs = list(zip(reference, other))
+    if not pairs:
+        return 0.0
+    return round(sum(sum(a * b for a, b in zip(u, v)) for u, v in pairs) / len(pairs), 4)
+
+def run_benchmark(files: Dict[str, str], modes: List[str], request_count: int = 16,
+                  concurrency: int = 8) -> Dict[str, Any]:
+    texts = [chunk.text for chunk in chunk_files(files)]
+    size = max(len(texts) // max(request_count, 1), 1)
+    requests = [texts[i:i + size] for i in range(0, len(texts), size)]
+    report: Dict[str, Any] = {
+        "files": len(files), "chunks": len(texts), "requests": len(requests),
+        "concurrency": concurrency, "model": EMBEDDING_MODEL, "modes": {}
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for mode in modes:
+        with context.Pool(1) as pool:
+            try:
+                report["modes"][mode] = pool.apply(run_mode, (mode, requests, concurrency))
+            except Exception as e:
+                report["modes"][mode] = {"error": str(e)}
+
+    reference = (report["modes"].get("service") or report["modes"].get("per-call") or {}).get("sample")
+    for result in report["modes"].values():
+        sample = result.pop("sample", None)
+        if reference and sample:
+            result["agreement_vs_fp32"] = _agreement(reference, sample)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding strategies")
+    parser.add_argument("path", help="Directory or archive to chunk and embed")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated subset of: " + ", ".join(MODES))
+    parser.add_argument("--requests", type=int, default=16, help="Split the chunks into this many requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers of the service")
+    args = parser.parse_args()
+
+    files = load_sources(args.path)
+    modes = [mode for mode in args.modes.split(",") if mode in MODES]
+    print(json.dumps(run_benchmark(files, modes, args.requests, args.concurrency), indent=2))
+
+if __name__ == "__main__":
+    main()
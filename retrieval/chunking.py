@@ -0,0 +1,189 @@
+"""
+Syntax-aware Code Chunking
+Splits source files at function/class boundaries with tree-sitter, merging module-level
+statements and falling back to line windows for other languages
+"""
+
+from typing import Any, Dict, List
+from dataclasses import dataclass
+import hashlib
+import os
+
+from analysis.structure import LANGUAGE_SPECS, detect_language, get_parser
+
+CHUNK_MAX_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+
+@dataclass
+class CodeChunk:
+    """A contiguous span of one file; lines are 1-based and inclusive"""
+    filename: str
+    start_line: int
+    end_line: int
+    kind: str  # function | class | module | lines
+    name: str
+    text: str
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the chunk (file-qualified, so identical code in two files stays distinct)"""
+        return hashlib.sha256(f"{self.filename}\0{self.text}".encode("utf-8")).hexdigest()
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "filename": self.filename,
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "kind": self.kind,
+            "name": self.name,
+            "chars": len(self.text),
+        }
+
+# ============================================================================
+# Line Windows
+# ============================================================================
+
+def _line_windows(lines: List[str], start: int, end: int, max_chars: int):
+    """Yield (first, last) 0-based line ranges of at most ~max_chars, preferring blank-line breaks"""
+    first = start
+    size = 0
+    last_blank = None
+    for index in range(start, end + 1):
+        size += len(lines[index])
+        if not lines[index].strip():
+            last_blank = index
+        if size > max_chars and index > first:
+            cut = last_blank if last_blank is not None and last_blank > first else index - 1
+            yield first, cut
+            first = cut + 1
+            size = sum(len(line) for line in lines[first:index + 1])
+            last_blank = None
+    if first <= end:
+        yield first, end
+
+def chunk_lines(content: str, filename: str, max_chars: int = CHUNK_MAX_CHARS) -> List[CodeChunk]:
+    """Fallback for languages without a grammar: windows of whole lines"""
+    lines = content.splitlines(keepends=True)
+    chunks = []
+    for first, last in _line_windows(lines, 0, len(lines) - 1, max_chars):
+        text = "".join(lines[first:last + 1])
+        if text.strip():
+            chunks.append(CodeChunk(filename, first + 1, last + 1, "lines", "", text))
+    return chunks
+
+# ============================================================================
+# Tree-sitter Chunking
+# ============================================================================
+
+def _definition(node, spec: Dict[str, Any]):
+    """
+    The function/class a top-level statement defines, if any. Looks through
+    wrappers such as decorators, `export ...` and `const f = () => ...`.
+    """
+    kinds = spec["functions"] | spec["classes"]
+    frontier = [node]
+    for _ in range(3):
+        for candidate in frontier:
+            if candidate.type in kinds:
+                return candidate
+        frontier = [child for candidate in frontier for child in candidate.named_children]
+    return None
+
+def _name(definition) -> str:
+    name = definition.child_by_field_name("name")
+    if name is None and definition.parent is not None:
+        name = definition.parent.child_by_field_name("name")
+    return name.text.decode("utf-8", "replace") if name is not None else "<anonymous>"
+
+class _Chunker:
+    def __init__(self, filename: str, lines: List[str], spec: Dict[str, Any], max_chars: int):
+        self.filename = filename
+        self.lines = lines
+        self.spec = spec
+        self.max_chars = max_chars
+        self.chunks: List[CodeChunk] = []
+
+    def _size(self, first: int, last: int) -> int:
+        return sum(len(line) for line in self.lines[first:last + 1])
+
+    def _emit(self, first: int, last: int, kind: str, name: str):
+        if first > last:
+            return
+        if self._size(first, last) <= self.max_chars:
+            spans = [(first, last)]
+        else:
+            spans = list(_line_windows(self.lines, first, last, self.max_chars))
+        for part, (a, b) in enumerate(spans):
+            text = "".join(self.lines[a:b + 1])
+            if text.strip():
+                label = name if len(spans) == 1 else f"{name} (part {part + 1})"
+                self.chunks.append(CodeChunk(self.filename, a + 1, b + 1, kind, label, text))
+
+    def _flush(self, pending: List[Any], prefix: str):
+        """Merge consecutive module-level statements into chunks of up to max_chars"""
+        first = last = None
+        for node in pending:
+            start, end = node.start_point[0], node.end_point[0]
+            if first is not None and self._size(first, end) > self.max_chars:
+                self._emit(first, last, "module", prefix)
+                first = None
+            if first is None:
+                first = start
+            last = end
+        if first is not None:
+            self._emit(first, last, "module", prefix)
+        pending.clear()
+
+    def block(self, nodes: List[Any], prefix: str = ""):
+        pending: List[Any] = []
+        for node in nodes:
+            definition = _definition(node, self.spec)
+            if definition is None:
+                pending.append(node)
+                continue
+            # Comments directly above a definition belong to it
+            start = node.start_point[0]
+            while pending and pending[-1].type == "comment" and pending[-1].end_point[0] >= start - 1:
+                start = pending.pop().start_point[0]
+            self._flush(pending, prefix)
+            self.definition(node, definition, start, prefix)
+        self._flush(pending, prefix)
+
+    def definition(self, node, definition, start: int, prefix: str):
+        name = f"{prefix}.{_name(definition)}" if prefix else _name(definition)
+        end = node.end_point[0]
+        is_class = definition.type in self.spec["classes"]
+        kind = "class" if is_class else "function"
+        body = definition.child_by_field_name("body")
+        if self._size(start, end) <= self.max_chars or not is_class or body is None or not body.named_children:
+            self._emit(start, end, kind, name)
+            return
+        # Large class: a header chunk (signature, docstring, attributes up to
+        # the first method) and then its members, each method on its own
+        members = body.named_children
+        first_method = next(
+            (i for i, member in enumerate(members) if _definition(member, self.spec) is not None),
+            len(members)
+        )
+        header_end = members[first_method].start_point[0] - 1 if first_method < len(members) else end
+        self._emit(start, header_end, "class", name)
+        self.block(members[first_method:], name)
+
+def chunk_source(content: str, filename: str, max_chars: int = CHUNK_MAX_CHARS) -> List[CodeChunk]:
+    """Split a file into retrieval chunks along function and class boundaries"""
+    _, language = detect_language(filename)
+    parser = get_parser(language) if language else None
+    if parser is None:
+        return chunk_lines(content, filename, max_chars)
+    try:
+        tree = parser.parse(content.encode("utf-8"))
+    except Exception:
+        return chunk_lines(content, filename, max_chars)
+    chunker = _Chunker(filename, content.splitlines(keepends=True), LANGUAGE_SPECS[language], max_chars)
+    chunker.block(tree.root_node.named_children)
+    return chunker.chunks
+
+def chunk_files(files: Dict[str, str], max_chars: int = CHUNK_MAX_CHARS) -> List[CodeChunk]:
+    chunks: List[CodeChunk] = []
+    for filename, content in files.items():
+        chunks.extend(chunk_source(content, filename, max_chars))
+    return chunks
@@ -0,0 +1,375 @@
+"""
+Retrieval Context Assembly
+Selects the code chunks most relevant to each documentation section under a token
+budget, ranking by vector similarity, BM25 and structural importance
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import hashlib
+import math
+import os
+import re
+import threading
+import logging
+
+from analysis.cache import content_hash
+from llm.planner import get_token_counter
+from .chunking import CodeChunk, chunk_files
+from .index import CodeIndex, get_code_index
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each ranking signal; signals that are unavailable (no
+# project index, no embedding model) are dropped and the rest renormalized
+RETRIEVAL_WEIGHTS = os.getenv("RETRIEVAL_WEIGHTS", "vector=0.5,bm25=0.3,structure=0.2")
+# Nearest neighbours fetched from the vector index per query
+VECTOR_CANDIDATES = int(os.getenv("RETRIEVAL_VECTOR_CANDIDATES", "50"))
+# Assemblers kept for reuse by the later nodes of a job (one per file set)
+ASSEMBLER_CACHE_SIZE = int(os.getenv("RETRIEVAL_ASSEMBLER_CACHE", "8"))
+
+# Default queries per documentation type (one per section the document needs)
+SECTION_QUERIES = {
+    "readme": [
+        "project purpose overview main entry point application startup",
+        "installation setup dependencies requirements configuration environment",
+        "usage example command line interface public api",
+        "core features main classes functions",
+    ],
+    "api_docs": [
+        "api endpoint route handler request response",
+        "request parameters validation schema model",
+        "authentication authorization token",
+        "error handling exception status code",
+    ],
+    "architecture": [
+        "application startup main entry point wiring",
+        "core components services modules classes",
+        "data flow pipeline processing state",
+        "database storage persistence models",
+        "external integrations clients http",
+    ],
+    "inline_comments": [
+        "complex logic algorithm branching loops",
+        "public functions classes methods parameters return values",
+    ],
+}
+
+KIND_WEIGHTS = {"class": 1.0, "function": 0.8, "module": 0.5, "lines": 0.4}
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for pair in spec.split(","):
+        if "=" in pair:
+            name, value = pair.split("=", 1)
+            weights[name.strip()] = float(value)
+    return weights
+
+# ============================================================================
+# Keyword Scoring
+# ============================================================================
+
+_WORD = re.compile(r"[A-Za-z0-9]+")
+_CAMEL = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms with identifiers split on snake_case and camelCase"""
+    terms = []
+    for word in _WORD.findall(text):
+        parts = _CAMEL.findall(word)
+        terms.extend(part.lower() for part in parts if len(part) > 1)
+        if len(parts) > 1:
+            terms.append(word.lower())
+    return terms
+
+class BM25:
+    """Okapi BM25 over tokenized documents"""
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.frequencies: List[Dict[str, int]] = []
+        self.lengths: List[int] = []
+        document_frequency: Dict[str, int] = {}
+        for terms in documents:
+            counts: Dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            self.frequencies.append(counts)
+            self.lengths.append(len(terms))
+            for term in counts:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        count = len(self.lengths)
+        self.average_length = sum(self.lengths) / count if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: Sequence[str]) -> List[float]:
+        results = []
+        for counts, length in zip(self.frequencies, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            for term in set(query):
+                frequency = counts.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+# ============================================================================
+# Structural Importance
+# ============================================================================
+
+def reference_importance(analysis_results: Dict[str, Any]) -> Dict[str, float]:
+    """Per file, in [0, 1]: how many other files' imports mention its module name"""
+    counts = {}
+    for filename in analysis_results:
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        if stem in ("__init__", "index"):
+            stem = os.path.basename(os.path.dirname(filename)) or stem
+        counts[filename] = sum(
+            1 for other, result in analysis_results.items()
+            if other != filename and any(stem in imported for imported in result.get("imports", []))
+        )
+    top = max(counts.values(), default=0)
+    return {filename: count / top for filename, count in counts.items()} if top else {}
+
+def structural_scores(chunks: Sequence[CodeChunk], analysis_results: Dict[str, Any],
+                      importance: Optional[Dict[str, float]] = None) -> List[float]:
+    """
+    Prior relevance of each chunk regardless of the query: definitions over
+    loose statements, public over private names, complex functions and files
+    that the rest of the project depends on.
+    """
+    if importance is None:
+        importance = reference_importance(analysis_results)
+    complexity = {
+        (filename, function["name"]): function.get("complexity", 1)
+        for filename, result in analysis_results.items()
+        for function in result.get("functions", [])
+    }
+    scores = []
+    for chunk in chunks:
+        name = chunk.name.split(" (part")[0].split(".")[-1]
+        score = KIND_WEIGHTS.get(chunk.kind, 0.4)
+        score += 0.0 if name.startswith("_") else 0.2
+        score += 0.3 * min(complexity.get((chunk.filename, name), 1) / 10, 1.0)
+        score += importance.get(chunk.filename, 0.0)
+        scores.append(score)
+    return scores
+
+def _normalize(values: Sequence[float]) -> List[float]:
+    low, high = min(values, default=0.0), max(values, default=0.0)
+    if high <= low:
+        return [0.0] * len(values)
+    return [(value - low) / (high - low) for value in values]
+
+# ============================================================================
+# Assembler
+# ============================================================================
+
+class ContextAssembler:
+    """
+    Ranks a file set's chunks per query and packs the best into a token budget.
+
+    Each query (one per documentation section) gets an equal share of the
+    selection: sections take turns picking their next best unpicked chunk
+    until nothing else fits, so the prompt stays the same size however large
+    the repository is, and no single section crowds out the others.
+    """
+
+    def __init__(self, files: Dict[str, str], analysis_results: Optional[Dict[str, Any]] = None,
+                 project_id: Optional[str] = None, index: Optional[CodeIndex] = None,
+                 importance: Optional[Dict[str, float]] = None, weights: Optional[Dict[str, float]] = None,
+                 sync_index: bool = True):
+        self.files = files
+        self.project_id = project_id
+        self.index = index
+        self.sync_index = sync_index
+        self.weights = weights or parse_weights(RETRIEVAL_WEIGHTS)
+        self.chunks = chunk_files(files)
+        self._positions = {chunk.digest: i for i, chunk in enumerate(self.chunks)}
+        self._bm25 = BM25([tokenize(f"{chunk.filename} {chunk.name} {chunk.text}") for chunk in self.chunks])
+        self._structure = _normalize(structural_scores(self.chunks, analysis_results or {}, importance))
+        self._tokens = [None] * len(self.chunks)
+        self._vectors_ready = self._prepare_vectors()
+
+    def _prepare_vectors(self) -> bool:
+        """
+        Bring the project's index up to date, unless the caller already synced
+        it (sync_index=False); vectors are skipped when that is not possible
+        """
+        if not self.project_id or self.weights.get("vector", 0) <= 0:
+            return False
+        try:
+            self.index = self.index or get_code_index()
+            if self.sync_index:
+                self.index.index(self.project_id, self.files)
+            return True
+        except Exception as e:
+            logger.warning(f"Vector retrieval unavailable, ranking by keywords and structure: {e}")
+            return False
+
+    def _vector_scores(self, query: str) -> Optional[List[float]]:
+        if not self._vectors_ready:
+            return None
+        try:
+            hits = self.index.query(self.project_id, query, k=VECTOR_CANDIDATES, filenames=list(self.files))
+        except Exception as e:
+            logger.warning(f"Vector query failed: {e}")
+            return None
+        scores = [0.0] * len(self.chunks)
+        for hit in hits:
+            position = self._positions.get(hit["id"])
+            if position is not None:
+                scores[position] = max(0.0, 1.0 - hit["distance"])
+        return scores
+
+    def rank(self, query: str, use_vectors: bool = True) -> List[Tuple[float, int]]:
+        """(score, chunk position) pairs, best first"""
+        signals = {
+            "bm25": _normalize(self._bm25.scores(tokenize(query))),
+            "structure": self._structure,
+        }
+        vector = self._vector_scores(query) if use_vectors else None
+        if vector is not None:
+            signals["vector"] = vector
+        total_weight = sum(self.weights.get(name, 0.0) for name in signals) or 1.0
+        combined = [
+            sum(self.weights.get(name, 0.0) * values[i] for name, values in signals.items()) / total_weight
+            for i in range(len(self.chunks))
+        ]
+        return sorted(((score, i) for i, score in enumerate(combined)), reverse=True)
+
+    def _token_count(self, position: int) -> int:
+        if self._tokens[position] is None:
+            self._tokens[position] = get_token_counter().count(self.render_chunk(self.chunks[position]))
+        return self._tokens[position]
+
+    def select(self, queries: Sequence[str], max_tokens: int, use_vectors: bool = True) -> List[CodeChunk]:
+        """Round-robin over the queries' rankings, packing chunks until the budget is spent"""
+        rankings = [iter(self.rank(query, use_vectors)) for query in queries if query.strip()]
+        chosen: List[int] = []
+        picked = set()
+        remaining = max_tokens
+        while rankings and remaining > 0:
+            for ranking in list(rankings):
+                for _, position in ranking:
+                    if position in picked:
+                        continue
+                    tokens = self._token_count(position)
+                    if tokens <= remaining:
+                        picked.add(position)
+                        chosen.append(position)
+                        remaining -= tokens
+                        break
+                else:
+                    rankings.remove(ranking)
+        # Present chunks in file order so related code reads top to bottom
+        return sorted((self.chunks[i] for i in chosen), key=lambda c: (c.filename, c.start_line))
+
+    @staticmethod
+    def render_chunk(chunk: CodeChunk) -> str:
+        label = f" ({chunk.name})" if chunk.name else ""
+        return (
+            f"=== {chunk.filename} lines {chunk.start_line}-{chunk.end_line}{label} ===\n"
+            f"{chunk.text.rstrip()}\n"
+        )
+
+    def assemble(self, queries: Sequence[str], max_tokens: int, use_vectors: bool = True) -> str:
+        """use_vectors=False ranks by keywords and structure only, e.g. while the index is still syncing"""
+        selected = self.select(queries, max_tokens, use_vectors)
+        logger.info(
+            f"Context: {len(selected)}/{len(self.chunks)} chunks from "
+            f"{len({chunk.filename for chunk in selected})}/{len(self.files)} files "
+            f"for {len(queries)} sections (vector: {self._vectors_ready and use_vectors})"
+        )
+        return "\n".join(self.render_chunk(chunk) for chunk in selected)
+
+# ============================================================================
+# Per-job Retrieval
+# ============================================================================
+
+_assemblers: "OrderedDict[str, ContextAssembler]" = OrderedDict()
+_assemblers_lock = threading.Lock()
+
+def retrieval_key(project_id: Optional[str], files: Dict[str, str]) -> str:
+    """Identifies a job's file set (and project) for the shared assembler"""
+    digest = hashlib.sha256(str(project_id or "").encode("utf-8"))
+    for filename in sorted(files):
+        digest.update(f"\0{filename}\0{content_hash(files[filename])}".encode("utf-8"))
+    return digest.hexdigest()
+
+def sync_code_index(project_id: Optional[str], files: Dict[str, str]) -> bool:
+    """
+    Bring the project's code index up to date with the files (embedding new
+    chunks). Returns whether vector retrieval is usable afterwards.
+    """
+    if not project_id or parse_weights(RETRIEVAL_WEIGHTS).get("vector", 0) <= 0:
+        return False
+    try:
+        get_code_index().index(project_id, files)
+        return True
+    except Exception as e:
+        logger.warning(f"Vector retrieval unavailable, ranking by keywords and structure: {e}")
+        return False
+
+def prepare_retrieval(project_id: Optional[str], files: Dict[str, str], sync: bool = True) -> Dict[str, Any]:
+    """
+    Once per job: the job's retrieval handle, a key identifying the file set
+    and whether the vector index is usable. assemble_code_context() calls
+    that pass it only query the index and reuse one assembler (chunks, BM25,
+    token counts) across the job's nodes.
+
+    With sync=False the index is left alone and vectors are off; the caller
+    runs sync_code_index() itself (e.g. in the background) and sets
+    "vectors" from its result.
+    """
+    return {
+        "key": retrieval_key(project_id, files),
+        "vectors": sync_code_index(project_id, files) if sync else False
+    }
+
+def _shared_assembler(key: str, build) -> ContextAssembler:
+    with _assemblers_lock:
+        assembler = _assemblers.get(key)
+        if assembler is not None:
+            _assemblers.move_to_end(key)
+            return assembler
+    assembler = build()
+    with _assemblers_lock:
+        _assemblers[key] = assembler
+        while len(_assemblers) > ASSEMBLER_CACHE_SIZE:
+            _assemblers.popitem(last=False)
+    return assembler
+
+def assemble_code_context(files: Dict[str, str], analysis_results: Optional[Dict[str, Any]],
+                          queries: Sequence[str], max_tokens: int,
+                          project_id: Optional[str] = None,
+                          file_ranks: Optional[Dict[str, Dict[str, Any]]] = None,
+                          retrieval: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Most relevant code for the given section queries, within max_tokens.
+
+    file_ranks (from the import graph) restricts the candidates to files in
+    the "full" tier and replaces the import heuristic as file importance.
+    retrieval (from prepare_retrieval) skips the index sync and reuses the
+    job's assembler, querying the index only if retrieval["vectors"] is set;
+    without it every call chunks the files and syncs the index itself.
+    """
+    importance = None
+    if file_ranks:
+        files = {name: content for name, content in files.items()
+                 if file_ranks.get(name, {}).get("tier", "full") == "full"}
+        importance = {name: file_ranks[name]["score"] for name in files if name in file_ranks}
+    if not files:
+        return ""
+    if not retrieval:
+        return ContextAssembler(files, analysis_results, project_id, importance=importance).assemble(queries, max_tokens)
+
+    assembler = _shared_assembler(retrieval["key"], lambda: ContextAssembler(
+        files, analysis_results, project_id, importance=importance, sync_index=False
+    ))
+    return assembler.assemble(queries, max_tokens, use_vectors=bool(retrieval.get("vectors")))
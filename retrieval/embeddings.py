@@ -0,0 +1,191 @@
+"""
+Embedding Service
+One sentence-transformers model per worker process, micro-batching concurrent requests
+from all jobs, with optional ONNX / int8-quantized CPU inference
+"""
+
+from typing import Any, Dict, List, Optional
+from concurrent.futures import Future
+import asyncio
+import os
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# torch | onnx
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# torch: dynamic int8 quantization of the Linear layers; onnx: load EMBEDDING_ONNX_FILE
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true"
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+# How long the first request of a batch waits for others to join
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+
+def load_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND,
+               quantize: bool = EMBEDDING_QUANTIZE):
+    """Build a CPU SentenceTransformer for the given backend"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        model_kwargs = {"file_name": EMBEDDING_ONNX_FILE} if quantize else {}
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    model = SentenceTransformer(model_name, device="cpu")
+    if quantize:
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+class _Request:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+class EmbeddingService:
+    """
+    Long-lived embedding model shared by every job in the process.
+
+    Callers submit lists of texts; a single worker thread drains the queue,
+    waiting up to EMBEDDING_BATCH_WAIT_MS for concurrent requests so that
+    several small requests are encoded as one batch of up to
+    EMBEDDING_MAX_BATCH texts. The model is loaded on first use, or
+    up front with load().
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND,
+                 quantize: bool = EMBEDDING_QUANTIZE, max_batch: int = EMBEDDING_MAX_BATCH,
+                 batch_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self._model = None
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "batches": 0, "encode_seconds": 0.0, "load_seconds": None}
+
+    def load(self):
+        """Load the model if needed (idempotent, thread-safe)"""
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = load_model(self.model_name, self.backend, self.quantize)
+                self._stats["load_seconds"] = round(time.perf_counter() - start, 3)
+                logger.info(
+                    f"Loaded embedding model {self.model_name} ({self.backend}"
+                    f"{', int8' if self.quantize else ''}) in {self._stats['load_seconds']}s"
+                )
+            return self._model
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for embedding; the future resolves to one vector per text"""
+        request = _Request(list(texts))
+        if not request.texts:
+            request.future.set_result([])
+            return request.future
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.submit(texts).result()
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    # ------------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            size = len(first.texts)
+            deadline = time.monotonic() + self.batch_wait
+            stop = False
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._encode(batch)
+            if stop:
+                return
+
+    def _encode(self, batch: List[_Request]):
+        texts = [text for request in batch for text in request.texts]
+        try:
+            model = self.load()
+            start = time.perf_counter()
+            vectors = model.encode(
+                texts, batch_size=self.max_batch, convert_to_numpy=True, normalize_embeddings=True
+            ).tolist()
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        with self._lock:
+            self._stats["requests"] += len(batch)
+            self._stats["texts"] += len(texts)
+            self._stats["batches"] += 1
+            self._stats["encode_seconds"] += elapsed
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "quantized": self.quantize,
+            "loaded": self._model is not None,
+            **stats,
+            "encode_seconds": round(stats["encode_seconds"], 3),
+            "avg_batch_texts": round(stats["texts"] / stats["batches"], 1) if stats["batches"] else 0,
+            "texts_per_second": round(stats["texts"] / stats["encode_seconds"], 1) if stats["encode_seconds"] else None,
+        }
+
+    def shutdown(self):
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(timeout=5)
+
+# Singleton
+_embedding_service = None
+
+def get_embedding_service() -> EmbeddingService:
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService()
+    return _embedding_service
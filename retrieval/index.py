@@ -0,0 +1,189 @@
+"""
+Persistent Code Index
+Per-project Chroma collections of syntax-aware chunks, upserted incrementally by chunk
+content hash with batched embedding
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import os
+import re
+import threading
+import time
+import logging
+
+from .chunking import CodeChunk, chunk_files
+from .embeddings import EMBEDDING_MODEL, get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+EMBED_BATCH_SIZE = int(os.getenv("RETRIEVAL_EMBED_BATCH", "64"))
+
+EmbedFunction = Callable[[List[str]], List[List[float]]]
+
+def collection_name(project_id: Any) -> str:
+    """Chroma collection names are 3-63 chars of [a-zA-Z0-9._-]"""
+    return "project_" + re.sub(r"[^a-zA-Z0-9_-]", "_", str(project_id))[:55]
+
+def _directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class CodeIndex:
+    """
+    Semantic index of a project's code, one persistent collection per project.
+
+    Chunk IDs are content hashes, so re-indexing a project only embeds chunks
+    whose text changed. Chunks that disappeared from the indexed files are
+    deleted; files not passed to index() are left untouched.
+    """
+
+    def __init__(self, path: str = INDEX_DIR, embed: Optional[EmbedFunction] = None,
+                 batch_size: int = EMBED_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._embed = embed
+        self._client = None
+        self._lock = threading.Lock()
+        self._project_locks: Dict[str, threading.Lock] = {}
+        self._last_runs: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import chromadb
+                os.makedirs(self.path, exist_ok=True)
+                self._client = chromadb.PersistentClient(path=self.path)
+            return self._client
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embed = self._embed or get_embedding_service().embed
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(embed(texts[start:start + self.batch_size]))
+        return vectors
+
+    def collection(self, project_id: Any):
+        return self.client.get_or_create_collection(
+            collection_name(project_id),
+            metadata={"hnsw:space": "cosine", "embedding_model": EMBEDDING_MODEL}
+        )
+
+    def _project_lock(self, project_id: Any) -> threading.Lock:
+        with self._lock:
+            return self._project_locks.setdefault(str(project_id), threading.Lock())
+
+    def index(self, project_id: Any, files: Dict[str, str]) -> Dict[str, Any]:
+        """Bring the project's index up to date for these files; returns run statistics"""
+        start = time.perf_counter()
+        chunks: Dict[str, CodeChunk] = {}
+        for chunk in chunk_files(files):
+            chunks.setdefault(chunk.digest, chunk)
+
+        with self._project_lock(project_id):
+            collection = self.collection(project_id)
+            existing: Dict[str, str] = {}
+            if files:
+                stored = collection.get(where={"filename": {"$in": list(files)}}, include=["metadatas"])
+                existing = {
+                    chunk_id: metadata["filename"]
+                    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+                }
+
+            new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing]
+            kept_ids = [chunk_id for chunk_id in chunks if chunk_id in existing]
+            stale_ids = [chunk_id for chunk_id in existing if chunk_id not in chunks]
+
+            embed_start = time.perf_counter()
+            for batch_start in range(0, len(new_ids), self.batch_size):
+                batch = new_ids[batch_start:batch_start + self.batch_size]
+                documents = [chunks[chunk_id].text for chunk_id in batch]
+                collection.upsert(
+                    ids=batch,
+                    documents=documents,
+                    embeddings=self.embed(documents),
+                    metadatas=[chunks[chunk_id].metadata() for chunk_id in batch]
+                )
+            embed_seconds = time.perf_counter() - embed_start
+
+            # Unchanged chunks may have moved within their file
+            if kept_ids:
+                collection.update(ids=kept_ids, metadatas=[chunks[chunk_id].metadata() for chunk_id in kept_ids])
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+
+        run = {
+            "files": len(files),
+            "chunks": len(chunks),
+            "embedded": len(new_ids),
+            "unchanged": len(kept_ids),
+            "deleted": len(stale_ids),
+            "seconds": round(time.perf_counter() - start, 3),
+            "chunks_per_second": round(len(new_ids) / embed_seconds, 1) if new_ids and embed_seconds else None,
+        }
+        self._last_runs[str(project_id)] = run
+        logger.info(f"Indexed {project_id}: {run}")
+        return {**run, "index": self.stats(project_id)}
+
+    def query(self, project_id: Any, text: str, k: int = 8,
+              filenames: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Top-k chunks for a query: [{"id", "text", "distance", **metadata}]"""
+        collection = self.collection(project_id)
+        if collection.count() == 0:
+            return []
+        where = {"filename": {"$in": list(filenames)}} if filenames else None
+        result = collection.query(
+            query_embeddings=self.embed([text]), n_results=min(k, collection.count()), where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            {"id": chunk_id, "text": document, "distance": distance, **metadata}
+            for chunk_id, document, metadata, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+            )
+        ]
+
+    def stats(self, project_id: Any) -> Dict[str, Any]:
+        """Index size for a project plus its last indexing run"""
+        collection = self.collection(project_id)
+        count = collection.count()
+        text_chars = 0
+        dimensions = 0
+        if count:
+            stored = collection.get(include=["metadatas"])
+            text_chars = sum(metadata.get("chars", 0) for metadata in stored["metadatas"])
+            sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            dimensions = len(sample[0]) if len(sample) else 0
+        return {
+            "project_id": str(project_id),
+            "chunks": count,
+            "text_chars": text_chars,
+            "vector_bytes": count * dimensions * 4,
+            "dimensions": dimensions,
+            # The Chroma store is shared by all projects
+            "store_disk_bytes": _directory_bytes(self.path),
+            "last_run": self._last_runs.get(str(project_id)),
+        }
+
+    def delete_project(self, project_id: Any):
+        try:
+            self.client.delete_collection(collection_name(project_id))
+        except Exception as e:
+            logger.debug(f"No index to delete for {project_id}: {e}")
+        self._last_runs.pop(str(project_id), None)
+
+# Singleton
+_code_index = None
+
+def get_code_index() -> CodeIndex:
+    global _code_index
+    if _code_index is None:
+        _code_index = CodeIndex()
+    return _code_index
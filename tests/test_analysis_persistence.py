@@ -0,0 +1,89 @@
+"""
+Structural analyses written back to ProjectFile rows by one process are served
+from Postgres by AnalysisCache.warm() in another, without parsing again.
+Needs a disposable Postgres database in TEST_DATABASE_URL (postgresql+asyncpg://...)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import uuid
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FILES = {
+    "app/main.py": "from app.greeting import greet\n\nprint(greet('world'))\n",
+    "app/greeting.py": "def greet(name):\n    if not name:\n        return 'Hello'\n    return f'Hello {name}'\n",
+}
+
+SETUP = """
+from db.connection import init_db, get_db_session
+from db.models import User, Project
+
+async def main():
+    await init_db()
+    async with get_db_session() as db:
+        user = User(email=f"{ARGS['tag']}@example.com", username=ARGS["tag"])
+        db.add(user)
+        await db.flush()
+        project = Project(owner_id=user.id, name="analysis-persistence")
+        db.add(project)
+        await db.flush()
+        return str(project.id)
+"""
+
+PERSIST = """
+from analysis.cache import AnalysisCache
+
+async def main():
+    cache = AnalysisCache()
+    await cache.warm(ARGS["files"])
+    results, analyzed = cache.analyze(ARGS["files"])
+    await cache.persist(ARGS["project_id"], ARGS["files"], results)
+    return analyzed
+"""
+
+WARM = """
+from analysis.cache import AnalysisCache
+
+async def main():
+    cache = AnalysisCache()
+    await cache.warm(ARGS["files"])
+    results, analyzed = cache.analyze(ARGS["files"])
+    return {"db_hits": cache.db_hits, "analyzed": analyzed, "success": all(r["success"] for r in results.values())}
+"""
+
+def run_in_process(script: str, **args):
+    """Run script's main() in a fresh interpreter (empty memory tier) and return its result"""
+    program = "import asyncio, json, sys\nARGS = json.loads(sys.argv[1])\n" + textwrap.dedent(script) + \
+        "\nprint(json.dumps(asyncio.run(main())))\n"
+    completed = subprocess.run(
+        [sys.executable, "-c", program, json.dumps(args)],
+        cwd=ROOT, env={**os.environ, "DATABASE_URL": TEST_DATABASE_URL},
+        capture_output=True, text=True, timeout=120
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_persisted_analysis_is_warmed_in_another_process():
+    tag = f"analysis-{uuid.uuid4().hex[:12]}"
+    project_id = run_in_process(SETUP, tag=tag)
+    # Analyses are shared by content across projects: make this run's content unique
+    files = {path: f"# {tag}\n{content}" for path, content in FILES.items()}
+
+    assert run_in_process(PERSIST, project_id=project_id, files=files) == len(files)
+    assert run_in_process(WARM, files=files) == {"db_hits": len(files), "analyzed": 0, "success": True}
+
+    # Only the changed file is parsed again; its row is updated in place
+    changed = {**files, "app/greeting.py": files["app/greeting.py"] + "\ndef farewell():\n    return 'Bye'\n"}
+    assert run_in_process(PERSIST, project_id=project_id, files=changed) == 1
+    assert run_in_process(WARM, files=changed) == {"db_hits": len(files), "analyzed": 0, "success": True}
@@ -0,0 +1,103 @@
+"""
+Documentation generation must not block the event loop: while a job waits on the
+LLM, other endpoints keep answering, and structural analysis runs off the loop
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import AIMessage
+
+from agents.documentation_agent import AgentOrchestrator, DocumentationType
+from agents.routing import ModelRouter
+
+# Simulated Gemini latency per call; a blocking call would stall /health this long
+LLM_DELAY = 0.3
+# /health must answer well within one LLM call while generation is pending
+HEALTH_BOUND = 0.1
+
+README = """# Sample
+
+A small sample project used to exercise the documentation workflow end to end.
+
+## Installation
+
+Install the dependencies with `pip install -r requirements.txt` and configure the
+environment variables described in the configuration section below.
+
+## Usage
+
+Run the application with `python main.py` and open the printed address in a
+browser. The `greet` function returns a greeting for the given name.
+"""
+
+class SlowChatModel:
+    """Chat model stub whose ainvoke sleeps like a network call"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(LLM_DELAY)
+        system = str(messages[0].content)
+        if "documentation planner" in system:
+            content = json.dumps({"doc_structure": ["Installation", "Usage"], "key_components": []})
+        elif "quality reviewer" in system:
+            content = json.dumps({"score": 95, "issues": [], "suggestions": []})
+        else:
+            content = README
+        return AIMessage(content=content)
+
+FILES = {
+    "main.py": "from greeting import greet\n\nif __name__ == '__main__':\n    print(greet('world'))\n",
+    "greeting.py": "def greet(name):\n    if not name:\n        return 'Hello'\n    return f'Hello {name}'\n",
+}
+
+def test_health_responds_while_generation_is_pending(monkeypatch):
+    from api.main import app
+
+    model = SlowChatModel()
+    orchestrator = AgentOrchestrator()
+    orchestrator.registry.routers["balanced"] = ModelRouter(lambda name: model)
+
+    offloaded = []
+    original_to_thread = asyncio.to_thread
+
+    async def recording_to_thread(func, *args, **kwargs):
+        offloaded.append(getattr(func, "__name__", repr(func)))
+        return await original_to_thread(func, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "to_thread", recording_to_thread)
+
+    async def scenario():
+        generation = asyncio.create_task(orchestrator.generate_documentation(
+            FILES, DocumentationType.README, user_preferences={"model_profile": "balanced"}
+        ))
+        latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            while not generation.done():
+                start = time.perf_counter()
+                response = await client.get("/health")
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+                await asyncio.sleep(0.05)
+        return await generation, latencies
+
+    result, latencies = asyncio.run(scenario())
+
+    assert result["success"], result.get("error")
+    assert model.calls >= 3
+    # Several health checks ran during the LLM calls, each answered promptly
+    assert len(latencies) >= 5
+    assert max(latencies) < HEALTH_BOUND
+    # The structure step parses files on a worker thread, not on the loop
+    assert "analyze" in offloaded